@@ -1,105 +1,484 @@
 """AI game routes: Claude Haiku conversation proxy via AWS Bedrock."""
 
-from typing import Any, Dict, List, Optional
+import json
+import math
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
+from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from pydantic import BaseModel
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.core.security import get_current_user
-from app.models.user import User
+from app.core.security import (
+    Principal,
+    get_current_principal,
+    require_teacher_or_admin,
+)
+from app.schemas.conversation import ConversationResponse, SuggestionItem
+from app.services import (
+    admission,
+    conversation_sessions,
+    conversation_tree,
+    response_cache,
+    response_parser,
+)
 from app.services.claude import (
+    DEFAULT_OPEN_TOPIC,
+    MAX_TOKENS,
+    PROMPT_VERSIONS,
+    build_system_prompt,
+    cached_reply,
+    converse,
     generate_conversation_response,
     generate_open_conversation,
+    replay_reply,
+    stream_conversation_response,
+    stream_converse,
+    stream_open_conversation,
 )
 
+
 router = APIRouter(prefix="/ai", tags=["ai"])
 
 
+def _cached_or_charge(
+    current_user: Principal,
+    system_prompt: str,
+    history: List[Dict[str, str]],
+    message: str,
+    level: str,
+) -> Optional[Dict[str, Any]]:
+    """Return the cached reply to this turn, or charge the user's rate limit.
+
+    Turns answered without the model (response cache, and the conversation
+    tree checked before this) cost nothing; any other turn takes a token
+    from the user's bucket, or fails with 429 when it is empty.
+    """
+    cached = cached_reply(system_prompt, history, message, level)
+    if cached is not None:
+        return cached
+    retry_after = admission.get_rate_limiter().acquire(current_user.id)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many AI requests, please slow down",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    return None
+
+
 class ConversationTurn(BaseModel):
     role: str
     content: str
 
 
-class SuggestionItem(BaseModel):
-    arabic: str = ""
-    latin: str = ""
-    english: str = ""
-
-
 class ConversationRequest(BaseModel):
-    message: str
+    message: str = Field(max_length=settings.AI_MAX_MESSAGE_CHARS)
     history: List[ConversationTurn] = []
     scenario: Optional[Dict[str, Any]] = None
 
 
-class ConversationResponse(BaseModel):
-    arabic: str = ""
-    latin: str = ""
-    english: str = ""
-    correction: str | None = None
-    suggestions: List[SuggestionItem] = []
-    error: str | None = None
+def _to_response(result: Dict[str, Any]) -> ConversationResponse:
+    return ConversationResponse(
+        arabic=result.get("arabic", ""),
+        latin=result.get("latin", ""),
+        english=result.get("english", ""),
+        correction=result.get("correction"),
+        suggestions=[SuggestionItem(**s) for s in result.get("suggestions", [])],
+        error=result.get("error"),
+        usage=result.get("usage"),
+    )
+
+
+def _event_stream(
+    events: AsyncIterator[Tuple[str, Dict[str, Any]]],
+    respond: Callable[[Dict[str, Any]], BaseModel] = _to_response,
+) -> StreamingResponse:
+    """Send conversation events as Server-Sent Events.
+
+    ``field`` events carry ``{"name", "value"}`` for each reply field as it
+    completes; the final ``done`` event carries the full response built by
+    *respond* (a ``ConversationResponse`` by default).
+    """
+
+    async def encode():
+        async for event, data in events:
+            if event == "done":
+                data = respond(data).model_dump(mode="json")
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        encode(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/conversation", response_model=ConversationResponse)
 async def conversation(
     payload: ConversationRequest,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    """Proxy a conversation turn to Claude Haiku acting as a Darija partner."""
+    """Proxy a conversation turn to Claude Haiku acting as a Darija partner.
+
+    Clicked suggestions of the scripted scenarios are answered from the
+    pre-generated conversation tree when one is loaded.  Only turns that
+    reach the model count against the per-user AI rate limit.
+    """
     history_dicts: List[Dict[str, str]] = [
         {"role": t.role, "content": t.content} for t in payload.history
     ]
 
+    ready = conversation_tree.lookup(
+        current_user.level, payload.scenario, history_dicts, payload.message
+    ) or _cached_or_charge(
+        current_user,
+        build_system_prompt("scenario", current_user.level, payload.scenario),
+        history_dicts,
+        payload.message,
+        current_user.level,
+    )
+    if ready is not None:
+        return _to_response(ready)
+
     result = await generate_conversation_response(
         user_level=current_user.level,
         conversation_history=history_dicts,
         user_message=payload.message,
         scenario=payload.scenario,
+        check_cache=False,
     )
 
-    return ConversationResponse(
-        arabic=result.get("arabic", ""),
-        latin=result.get("latin", ""),
-        english=result.get("english", ""),
-        correction=result.get("correction"),
-        suggestions=[SuggestionItem(**s) for s in result.get("suggestions", [])],
-        error=result.get("error"),
+    return _to_response(result)
+
+
+@router.post("/conversation/stream")
+async def conversation_stream(
+    payload: ConversationRequest,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Streaming variant of ``/conversation`` (Server-Sent Events).
+
+    Tree and cached replies are replayed as events, but identical turns in
+    flight are not coalesced as in ``/conversation``: each stream that
+    misses the cache calls the model.
+    """
+    history_dicts: List[Dict[str, str]] = [
+        {"role": t.role, "content": t.content} for t in payload.history
+    ]
+
+    ready = conversation_tree.lookup(
+        current_user.level, payload.scenario, history_dicts, payload.message
+    ) or _cached_or_charge(
+        current_user,
+        build_system_prompt("scenario", current_user.level, payload.scenario),
+        history_dicts,
+        payload.message,
+        current_user.level,
+    )
+    if ready is not None:
+        return _event_stream(replay_reply(ready))
+
+    return _event_stream(
+        stream_conversation_response(
+            user_level=current_user.level,
+            conversation_history=history_dicts,
+            user_message=payload.message,
+            scenario=payload.scenario,
+            check_cache=False,
+        )
     )
 
 
 class OpenConversationRequest(BaseModel):
-    message: str
+    message: str = Field(max_length=settings.AI_MAX_MESSAGE_CHARS)
     history: List[ConversationTurn] = []
-    topic: str = "General everyday conversation"
+    topic: str = DEFAULT_OPEN_TOPIC
 
 
 @router.post("/open-conversation", response_model=ConversationResponse)
 async def open_conversation(
     payload: OpenConversationRequest,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Open-ended Darija conversation practice (standalone page)."""
     history_dicts: List[Dict[str, str]] = [
         {"role": t.role, "content": t.content} for t in payload.history
     ]
 
+    cached = _cached_or_charge(
+        current_user,
+        build_system_prompt("open", current_user.level, topic=payload.topic),
+        history_dicts,
+        payload.message,
+        current_user.level,
+    )
+    if cached is not None:
+        return _to_response(cached)
+
     result = await generate_open_conversation(
         user_level=current_user.level,
         conversation_history=history_dicts,
         user_message=payload.message,
         topic=payload.topic,
+        check_cache=False,
     )
 
-    return ConversationResponse(
-        arabic=result.get("arabic", ""),
-        latin=result.get("latin", ""),
-        english=result.get("english", ""),
-        correction=result.get("correction"),
-        suggestions=[SuggestionItem(**s) for s in result.get("suggestions", [])],
-        error=result.get("error"),
+    return _to_response(result)
+
+
+@router.post("/open-conversation/stream")
+async def open_conversation_stream(
+    payload: OpenConversationRequest,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Streaming variant of ``/open-conversation`` (Server-Sent Events).
+
+    Cached replies are replayed as events; identical turns in flight are
+    not coalesced (see ``/conversation/stream``).
+    """
+    history_dicts: List[Dict[str, str]] = [
+        {"role": t.role, "content": t.content} for t in payload.history
+    ]
+
+    cached = _cached_or_charge(
+        current_user,
+        build_system_prompt("open", current_user.level, topic=payload.topic),
+        history_dicts,
+        payload.message,
+        current_user.level,
+    )
+    if cached is not None:
+        return _event_stream(replay_reply(cached))
+
+    return _event_stream(
+        stream_open_conversation(
+            user_level=current_user.level,
+            conversation_history=history_dicts,
+            user_message=payload.message,
+            topic=payload.topic,
+            check_cache=False,
+        )
     )
+
+
+# ---------------------------------------------------------------------------
+# Server-side sessions
+# ---------------------------------------------------------------------------
+
+
+class SessionCreateRequest(BaseModel):
+    kind: Literal["scenario", "open"] = "scenario"
+    scenario: Optional[Dict[str, Any]] = None
+    topic: str = DEFAULT_OPEN_TOPIC
+    # Scripted opening turns already shown to the learner, if any
+    history: List[ConversationTurn] = []
+
+
+class SessionResponse(BaseModel):
+    session_id: UUID
+    kind: str
+    turn_count: int
+    history: List[ConversationTurn]
+
+
+class SessionMessageRequest(BaseModel):
+    message: str = Field(max_length=settings.AI_MAX_MESSAGE_CHARS)
+
+
+SESSION_CONFLICT = "Another message was sent to this conversation; reload it"
+
+
+class SessionMessageResponse(ConversationResponse):
+    session_id: UUID
+    turn_count: int
+
+
+def _session_response(
+    state: conversation_sessions.SessionState,
+) -> SessionResponse:
+    return SessionResponse(
+        session_id=state.id,
+        kind=state.kind,
+        turn_count=state.turn_count,
+        history=[ConversationTurn(**turn) for turn in state.history],
+    )
+
+
+def _session_reply(
+    state: conversation_sessions.SessionState, result: Dict[str, Any]
+) -> SessionMessageResponse:
+    return SessionMessageResponse(
+        **_to_response(result).model_dump(),
+        session_id=state.id,
+        turn_count=state.turn_count,
+    )
+
+
+async def _get_session(
+    db: AsyncSession, session_id: UUID, user_id: UUID
+) -> conversation_sessions.SessionState:
+    state = await conversation_sessions.get_user_session(db, session_id, user_id)
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found"
+        )
+    return state
+
+
+@router.post(
+    "/sessions", response_model=SessionResponse, status_code=status.HTTP_201_CREATED
+)
+async def create_session(
+    payload: SessionCreateRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Start a server-side conversation; later turns only send new messages."""
+    state = await conversation_sessions.start_session(
+        db,
+        user_id=current_user.id,
+        level=current_user.level,
+        kind=payload.kind,
+        scenario=payload.scenario,
+        topic=payload.topic if payload.kind == "open" else None,
+        history=[turn.model_dump() for turn in payload.history],
+    )
+    return _session_response(state)
+
+
+@router.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(
+    session_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Return a conversation's stored history and turn count."""
+    return _session_response(await _get_session(db, session_id, current_user.id))
+
+
+@router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(
+    session_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """End a conversation and discard its history."""
+    await _get_session(db, session_id, current_user.id)
+    await conversation_sessions.get_session_store().delete(db, session_id)
+
+
+@router.post(
+    "/sessions/{session_id}/messages", response_model=SessionMessageResponse
+)
+async def session_message(
+    session_id: UUID,
+    payload: SessionMessageRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Send the next learner message of a server-side conversation.
+
+    Only answered turns are added to the session; failed ones can be
+    retried with the same message.  A message overlapping another one on
+    the same session (double click, early retry) gets 409 and is not
+    recorded.
+    """
+    state = await _get_session(db, session_id, current_user.id)
+    # Release the database connection while the model answers
+    await db.commit()
+
+    result = _cached_or_charge(
+        current_user, state.system_prompt, state.history, payload.message, state.level
+    )
+    if result is None:
+        result = await converse(
+            state.system_prompt,
+            state.history,
+            payload.message,
+            max_tokens=MAX_TOKENS[state.kind],
+            level=state.level,
+            prompt_version=PROMPT_VERSIONS[state.kind],
+            check_cache=False,
+        )
+    if result.get("error") is None:
+        try:
+            await conversation_sessions.record_turn(
+                db, state, payload.message, result
+            )
+        except conversation_sessions.SessionConflict:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail=SESSION_CONFLICT
+            ) from None
+    return _session_reply(state, result)
+
+
+@router.post("/sessions/{session_id}/messages/stream")
+async def session_message_stream(
+    session_id: UUID,
+    payload: SessionMessageRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Streaming variant of ``/sessions/{session_id}/messages`` (SSE).
+
+    Identical turns in flight are not coalesced (see
+    ``/conversation/stream``).
+    """
+    state = await _get_session(db, session_id, current_user.id)
+    await db.commit()
+    # The stream outlives this handler, so the turn is saved in its own session
+    session_factory = async_sessionmaker(
+        db.bind, class_=AsyncSession, expire_on_commit=False
+    )
+    cached = _cached_or_charge(
+        current_user, state.system_prompt, state.history, payload.message, state.level
+    )
+    if cached is not None:
+        replies = replay_reply(cached)
+    else:
+        replies = stream_converse(
+            state.system_prompt,
+            state.history,
+            payload.message,
+            max_tokens=MAX_TOKENS[state.kind],
+            level=state.level,
+            prompt_version=PROMPT_VERSIONS[state.kind],
+            check_cache=False,
+        )
+
+    async def events():
+        async for event, data in replies:
+            if event == "done" and data.get("error") is None:
+                async with session_factory() as session:
+                    try:
+                        await conversation_sessions.record_turn(
+                            session, state, payload.message, data
+                        )
+                    except conversation_sessions.SessionConflict:
+                        data = {**data, "error": SESSION_CONFLICT}
+                    await session.commit()
+            yield event, data
+
+    return _event_stream(events(), lambda result: _session_reply(state, result))
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+
+@router.get("/metrics")
+async def ai_metrics(current_user=Depends(require_teacher_or_admin)):
+    """Queue depth, wait times, coalescing, rate limiting, cache, tree and
+    reply parsing counters of this worker. Requires teacher or admin role."""
+    return {
+        **admission.metrics(),
+        "response_cache": response_cache.stats(),
+        "conversation_tree": conversation_tree.stats(),
+        "reply_parsing": response_parser.stats(),
+    }
@@ -8,17 +8,21 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
 from app.core.security import (
+    cache_user_on_commit,
     create_access_token,
     create_refresh_token,
     decode_token,
     get_current_user,
     hash_password,
+    invalidate_user_on_commit,
     require_teacher_or_admin,
+    user_claims,
     verify_password,
 )
 from app.models.user import User
 from app.schemas.auth import (
     CreateUserRequest,
+    ProfileUpdateResponse,
     RefreshTokenRequest,
     Token,
     UserLogin,
@@ -30,6 +34,18 @@ from app.schemas.auth import (
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _issue_tokens(user: User) -> Token:
+    """Create an access/refresh token pair carrying the user's claims."""
+    return Token(
+        access_token=create_access_token(
+            subject=str(user.id), extra_claims=user_claims(user)
+        ),
+        refresh_token=create_refresh_token(
+            subject=str(user.id), extra_claims={"tv": user.token_version}
+        ),
+    )
+
+
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
 async def register(payload: UserRegister, db: AsyncSession = Depends(get_db)):
     """Create a new user account and return JWT tokens."""
@@ -42,17 +58,14 @@ async def register(payload: UserRegister, db: AsyncSession = Depends(get_db)):
 
     user = User(
         email=payload.email,
-        password_hash=hash_password(payload.password),
+        password_hash=await hash_password(payload.password),
         display_name=payload.display_name,
     )
     db.add(user)
     await db.flush()
     await db.refresh(user)
 
-    access_token = create_access_token(subject=str(user.id))
-    refresh_token = create_refresh_token(subject=str(user.id))
-
-    return Token(access_token=access_token, refresh_token=refresh_token)
+    return _issue_tokens(user)
 
 
 @router.post("/login", response_model=Token)
@@ -61,19 +74,18 @@ async def login(payload: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == payload.email))
     user = result.scalar_one_or_none()
 
-    if user is None or not verify_password(payload.password, user.password_hash):
+    if user is None or not await verify_password(
+        payload.password, user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         )
 
-    access_token = create_access_token(subject=str(user.id))
-    refresh_token = create_refresh_token(subject=str(user.id))
-
-    return Token(access_token=access_token, refresh_token=refresh_token)
+    return _issue_tokens(user)
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh(payload: RefreshTokenRequest):
+async def refresh(payload: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
     """Exchange a valid refresh token for a new token pair."""
     token_payload = decode_token(payload.refresh_token)
 
@@ -89,10 +101,18 @@ async def refresh(payload: RefreshTokenRequest):
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing subject"
         )
 
-    access_token = create_access_token(subject=user_id)
-    refresh_token = create_refresh_token(subject=user_id)
+    # Load the user so new tokens carry current claims and revoked or
+    # deleted accounts cannot refresh
+    try:
+        user = await db.get(User, UUID(user_id))
+    except ValueError:
+        user = None
+    if user is None or token_payload.get("tv", 0) < user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+        )
 
-    return Token(access_token=access_token, refresh_token=refresh_token)
+    return _issue_tokens(user)
 
 
 @router.get("/me", response_model=UserResponse)
@@ -101,14 +121,21 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-@router.put("/me", response_model=UserResponse)
+@router.put("/me", response_model=ProfileUpdateResponse)
 async def update_me(
     payload: UserUpdateRequest,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Update the authenticated user's profile."""
+    """Update the authenticated user's profile.
+
+    A level change revokes the user's tokens (bumping ``token_version``)
+    and returns fresh ones: the old ones still carry the old level, which
+    read-only endpoints trust until they are ``AUTH_CLAIMS_TRUST_SECONDS``
+    old.
+    """
     valid_levels = {"a2", "b1", "b2"}
+    claims = user_claims(current_user)
 
     if payload.display_name is not None:
         current_user.display_name = payload.display_name
@@ -121,9 +148,16 @@ async def update_me(
             )
         current_user.level = level
 
+    claims_changed = user_claims(current_user) != claims
+    if claims_changed:
+        current_user.token_version += 1
     await db.flush()
     await db.refresh(current_user)
-    return current_user
+    cache_user_on_commit(db, current_user)
+    response = ProfileUpdateResponse.model_validate(current_user)
+    if claims_changed:
+        response.tokens = _issue_tokens(current_user)
+    return response
 
 
 @router.delete("/me", status_code=status.HTTP_200_OK)
@@ -133,6 +167,7 @@ async def delete_me(
     """Permanently delete the authenticated user's account and all related data."""
     await db.delete(current_user)
     await db.flush()
+    invalidate_user_on_commit(db, current_user.id)
     return {"status": "deleted"}
 
 
@@ -176,7 +211,7 @@ async def create_user(
 
     user = User(
         email=payload.email,
-        password_hash=hash_password(payload.password),
+        password_hash=await hash_password(payload.password),
         display_name=payload.display_name,
         role=payload.role,
     )
@@ -212,4 +247,5 @@ async def delete_user(
 
     await db.delete(user)
     await db.flush()
+    invalidate_user_on_commit(db, user_id)
     return {"status": "deleted", "id": str(user_id)}
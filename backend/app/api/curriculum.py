@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.core.security import require_teacher_or_admin
 from app.models.lesson import Lesson
+from app.services.curriculum_index import mark_curriculum_changed
 
 router = APIRouter(prefix="/curriculum", tags=["curriculum"])
 
@@ -94,6 +95,7 @@ async def load_curriculum(request: Request, db: AsyncSession = Depends(get_db)):
         created += 1
 
     await db.flush()
+    mark_curriculum_changed(db)
 
     return {
         "status": "ok",
@@ -219,6 +221,7 @@ async def update_lesson(
         lesson.content_json = data["content_json"]
 
     await db.flush()
+    mark_curriculum_changed(db)
     await db.refresh(lesson)
 
     return {
@@ -266,6 +269,7 @@ async def create_lesson(
     )
     db.add(lesson)
     await db.flush()
+    mark_curriculum_changed(db)
     await db.refresh(lesson)
 
     return {
@@ -292,5 +296,6 @@ async def delete_lesson(
 
     await db.delete(lesson)
     await db.flush()
+    mark_curriculum_changed(db)
 
     return {"status": "deleted", "id": str(lesson_id)}
@@ -5,17 +5,19 @@ from typing import List
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.security import Principal, get_current_principal, get_current_user
 from app.models.flashcard import Flashcard
 from app.models.user import User
 from app.schemas.flashcard import (
+    CardReviewOutcome,
     DeckResponse,
     FlashcardCreate,
     FlashcardResponse,
+    ReviewResponse,
     ReviewSubmission,
 )
 
@@ -77,35 +79,71 @@ async def get_due_cards(
     return [_card_to_response(c, current_user.display_name) for c in cards]
 
 
-@router.post("/review")
+@router.post("/review", response_model=ReviewResponse)
 async def submit_review(
     submission: ReviewSubmission,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Submit review results and update spaced repetition schedule."""
-    now = datetime.now(timezone.utc)
-    updated = 0
+    """Submit review results and update spaced repetition schedule.
 
-    for item in submission.results:
+    The reviewed cards are read with one query and written with one
+    executemany UPDATE, whatever the batch size.  A card reviewed twice in
+    the batch moves twice.  Cards that do not exist or belong to someone
+    else are reported as not updated.
+    """
+    now = datetime.now(timezone.utc)
+    card_ids = {item.card_id for item in submission.results}
+    boxes = {}
+    if card_ids:
         result = await db.execute(
-            select(Flashcard).where(
-                Flashcard.id == item.card_id, Flashcard.user_id == current_user.id
+            select(Flashcard.id, Flashcard.box).where(
+                Flashcard.id.in_(card_ids), Flashcard.user_id == current_user.id
             )
         )
-        card = result.scalar_one_or_none()
-        if not card:
+        boxes = dict(result.all())
+
+    outcomes = []
+    schedule = {}
+    for item in submission.results:
+        if item.card_id not in boxes:
+            outcomes.append(CardReviewOutcome(card_id=item.card_id, updated=False))
             continue
+        new_box, next_review = _calculate_next_review(boxes[item.card_id], item.known)
+        boxes[item.card_id] = new_box
+        reviews = schedule.get(item.card_id, {}).get("reviews", 0) + 1
+        schedule[item.card_id] = {
+            "card_id": item.card_id,
+            "new_box": new_box,
+            "due": next_review,
+            "reviews": reviews,
+        }
+        outcomes.append(
+            CardReviewOutcome(
+                card_id=item.card_id,
+                updated=True,
+                box=new_box,
+                next_review=next_review,
+            )
+        )
 
-        new_box, next_review = _calculate_next_review(card.box, item.known)
-        card.box = new_box
-        card.next_review = next_review
-        card.review_count += 1
-        card.last_reviewed = now
-        updated += 1
+    if schedule:
+        table = Flashcard.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("card_id"))
+            .values(
+                box=bindparam("new_box"),
+                next_review=bindparam("due"),
+                review_count=table.c.review_count + bindparam("reviews"),
+                last_reviewed=now,
+            ),
+            list(schedule.values()),
+        )
 
-    await db.flush()
-    return {"updated": updated}
+    return ReviewResponse(
+        updated=sum(outcome.updated for outcome in outcomes), results=outcomes
+    )
 
 
 @router.post("", response_model=FlashcardResponse, status_code=status.HTTP_201_CREATED)
@@ -151,7 +189,8 @@ async def delete_flashcard(
 
 @router.get("/suggestions", response_model=List[FlashcardResponse])
 async def get_suggestions(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Get random public flashcards from other users."""
     result = await db.execute(
@@ -167,7 +206,8 @@ async def get_suggestions(
 
 @router.get("/explore", response_model=List[DeckResponse])
 async def explore_decks(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Browse other students' public decks."""
     # Find users who have public flashcards (exclude current user)
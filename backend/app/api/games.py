@@ -1,14 +1,18 @@
 """Game routes: session generation and result submission."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.security import Principal, get_current_principal, get_current_user
 from app.models.progress import GameResult
 from app.models.user import User
 from app.schemas.game import GameSessionResponse, GameSubmitRequest, GameSubmitResponse
-from app.services.adaptive import generate_session, track_answer
+from app.services import session_pool
+from app.services.adaptive import generate_session, track_answers
+from app.services.curriculum_index import get_curriculum_index
+from app.services.ranking import award_xp
+from app.services.stats import record_game
 from app.services.xp import GAME_COMPLETE_XP, calculate_xp, check_badges, update_streak
 
 router = APIRouter(prefix="/games", tags=["games"])
@@ -24,11 +28,26 @@ LEVEL_LABELS = {
 
 @router.get("/session", response_model=GameSessionResponse)
 async def get_game_session(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    """Generate a daily game session tailored to the user's level and weaknesses."""
+    """Generate a daily game session tailored to the user's level and weaknesses.
+
+    With the session pool enabled, a pre-generated session is served when
+    available and the pool is topped up after the response is sent.
+    """
     level = current_user.level
-    games = await generate_session(db, current_user.id, level)
+    games = None
+    if session_pool.is_enabled():
+        index = await get_curriculum_index(db)
+        games = session_pool.pop_session(current_user.id, level, index.version)
+        if session_pool.needs_refill(current_user.id, level):
+            background_tasks.add_task(
+                session_pool.refill, current_user.id, level, db.bind
+            )
+    if games is None:
+        games = await generate_session(db, current_user.id, level)
     return GameSessionResponse(
         games=games, level=level, level_label=LEVEL_LABELS.get(level, level.upper())
     )
@@ -77,9 +96,10 @@ async def submit_game(
     }
     skill_area = skill_map.get(game_type, game_type)
 
-    for answer in payload.answers:
-        is_correct = answer.get("correct", False)
-        await track_answer(db, current_user.id, skill_area, is_correct)
+    if payload.answers:
+        await track_answers(db, current_user.id, skill_area, payload.answers)
+        # Weaknesses changed: pre-generated sessions may target the wrong games
+        session_pool.mark_user_changed(db, current_user.id)
 
     # Update streak
     streak = await update_streak(db, current_user.id)
@@ -101,6 +121,8 @@ async def submit_game(
     # Update user XP
     current_user.xp += xp_earned
     await db.flush()
+    await record_game(db, current_user.id, game_type, payload.score)
+    award_xp(db, current_user.id, xp_earned)
 
     # Check badges
     badges = await check_badges(db, current_user.id, latest_score=payload.score)
@@ -1,19 +1,147 @@
 """Leaderboard routes."""
 
-from typing import Optional
+import logging
+from typing import List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_user
-from app.models.progress import LeaderboardEntry
+from app.models.progress import LeaderboardEntry, LeaderboardState
 from app.models.user import User
 from app.schemas.progress import LeaderboardResponse, LeaderboardUserEntry
+from app.services import ranking
+from app.services.leaderboard import PERIODS
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
+VALID_PERIODS = set(PERIODS)
+LEADERBOARD_SIZE = 50
+
+# period -> (entries, precomputed?); identical for every viewer
+_top_cache = TTLCache(
+    maxsize=len(VALID_PERIODS), ttl=settings.LEADERBOARD_CACHE_TTL_SECONDS
+)
+
+
+async def _top_entries(
+    db: AsyncSession, period: str
+) -> Tuple[List[LeaderboardUserEntry], bool]:
+    """Return the top entries for *period* and whether they are precomputed."""
+    cached = _top_cache.get(period)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(
+            LeaderboardEntry.user_id,
+            User.display_name,
+            LeaderboardEntry.xp_total,
+            # Ties share a rank, as with the count in _user_rank
+            func.rank().over(order_by=LeaderboardEntry.xp_total.desc()),
+        )
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .where(LeaderboardEntry.period == period)
+        .order_by(LeaderboardEntry.xp_total.desc())
+        .limit(LEADERBOARD_SIZE)
+    )
+    entries = [
+        LeaderboardUserEntry(
+            user_id=user_id, display_name=display_name, xp_total=xp_total, rank=rank
+        )
+        for user_id, display_name, xp_total, rank in result.all()
+    ]
+    # An empty materialized period (e.g. a week that just started) is
+    # still precomputed; the live fallback is for never-materialized ones
+    precomputed = bool(entries) or (
+        await db.get(LeaderboardState, period) is not None
+    )
+
+    if not precomputed:
+        # Fallback: live ranking from users table
+        users_result = await db.execute(
+            select(User.id, User.display_name, User.xp)
+            .order_by(User.xp.desc())
+            .limit(LEADERBOARD_SIZE)
+        )
+        entries = [
+            LeaderboardUserEntry(
+                user_id=user_id, display_name=display_name, xp_total=xp, rank=idx
+            )
+            for idx, (user_id, display_name, xp) in enumerate(
+                users_result.all(), start=1
+            )
+        ]
+
+    _top_cache.set(period, (entries, precomputed))
+    return entries, precomputed
+
+
+async def _user_rank(
+    db: AsyncSession, period: str, user: User, precomputed: bool
+) -> Optional[int]:
+    """Look up *user*'s rank outside the top list (indexed range counts)."""
+    if precomputed:
+        result = await db.execute(
+            select(LeaderboardEntry.xp_total).where(
+                LeaderboardEntry.period == period,
+                LeaderboardEntry.user_id == user.id,
+            )
+        )
+        xp_total = result.scalar()
+        if xp_total is None:
+            return None
+        result = await db.execute(
+            select(func.count())
+            .select_from(LeaderboardEntry)
+            .where(
+                LeaderboardEntry.period == period,
+                LeaderboardEntry.xp_total > xp_total,
+            )
+        )
+        return (result.scalar() or 0) + 1
+
+    result = await db.execute(
+        select(func.count()).select_from(User).where(User.xp > user.xp)
+    )
+    return (result.scalar() or 0) + 1
+
+
+async def _ranked_leaderboard(
+    db: AsyncSession, period: str, user: User
+) -> Optional[LeaderboardResponse]:
+    """Serve *period* from the sorted-set backend, or None to use SQL."""
+    if ranking.get_ranking_backend() is None:
+        return None
+    try:
+        top, user_rank = await ranking.top_and_rank(
+            db, period, user.id, LEADERBOARD_SIZE
+        )
+    except Exception:
+        logger.warning("Leaderboard backend unavailable, using SQL", exc_info=True)
+        return None
+
+    names_result = await db.execute(
+        select(User.id, User.display_name).where(User.id.in_([u for u, _ in top]))
+    )
+    names = dict(names_result.all())
+    entries = [
+        LeaderboardUserEntry(
+            user_id=user_id,
+            display_name=names.get(user_id, "Unknown"),
+            xp_total=int(round(xp)),
+            rank=idx,
+        )
+        for idx, (user_id, xp) in enumerate(top, start=1)
+    ]
+    return LeaderboardResponse(period=period, entries=entries, user_rank=user_rank)
+
 
 @router.get("/", response_model=LeaderboardResponse)
 async def get_leaderboard(
@@ -23,56 +151,25 @@ async def get_leaderboard(
 ):
     """Return the leaderboard for the given period.
 
-    Falls back to computing a live ranking from user XP if no
-    pre-computed leaderboard entries exist for the requested period.
+    Served from the sorted-set backend when ``LEADERBOARD_BACKEND`` is not
+    ``sql``; otherwise entries are written by the materializer
+    (``app.services.leaderboard``).
+    Falls back to computing a live ranking from user XP if the requested
+    period has never been materialized.
+    The top entries are cached per period for
+    ``LEADERBOARD_CACHE_TTL_SECONDS``; only ``user_rank`` is per viewer.
     """
-    valid_periods = {"weekly", "monthly", "all-time"}
-    if period not in valid_periods:
+    if period not in VALID_PERIODS:
         period = "weekly"
 
-    # Try pre-computed entries first
-    result = await db.execute(
-        select(LeaderboardEntry)
-        .where(LeaderboardEntry.period == period)
-        .order_by(LeaderboardEntry.rank.asc())
-        .limit(50)
-    )
-    entries = list(result.scalars().all())
+    ranked = await _ranked_leaderboard(db, period, current_user)
+    if ranked is not None:
+        return ranked
 
-    user_rank: Optional[int] = None
+    entries, precomputed = await _top_entries(db, period)
 
-    if entries:
-        response_entries = []
-        for entry in entries:
-            # Fetch display name
-            user_result = await db.execute(
-                select(User.display_name).where(User.id == entry.user_id)
-            )
-            display_name = user_result.scalar() or "Unknown"
-            response_entries.append(
-                LeaderboardUserEntry(
-                    user_id=entry.user_id,
-                    display_name=display_name,
-                    xp_total=entry.xp_total,
-                    rank=entry.rank,
-                )
-            )
-            if entry.user_id == current_user.id:
-                user_rank = entry.rank
-    else:
-        # Fallback: live ranking from users table
-        users_result = await db.execute(select(User).order_by(User.xp.desc()).limit(50))
-        users = list(users_result.scalars().all())
-        response_entries = []
-        for idx, u in enumerate(users, start=1):
-            response_entries.append(
-                LeaderboardUserEntry(
-                    user_id=u.id, display_name=u.display_name, xp_total=u.xp, rank=idx
-                )
-            )
-            if u.id == current_user.id:
-                user_rank = idx
+    user_rank = next((e.rank for e in entries if e.user_id == current_user.id), None)
+    if user_rank is None:
+        user_rank = await _user_rank(db, period, current_user, precomputed)
 
-    return LeaderboardResponse(
-        period=period, entries=response_entries, user_rank=user_rank
-    )
+    return LeaderboardResponse(period=period, entries=entries, user_rank=user_rank)
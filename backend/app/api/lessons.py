@@ -8,11 +8,14 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.security import Principal, get_current_principal, get_current_user
 from app.models.lesson import Lesson
 from app.models.progress import UserProgress
 from app.models.user import User
 from app.schemas.lesson import LessonCompleteRequest, LessonListResponse, LessonResponse
+from app.services import session_pool
+from app.services.ranking import award_xp
+from app.services.stats import record_lesson
 from app.services.xp import (
     LESSON_COMPLETE_XP,
     calculate_xp,
@@ -28,7 +31,7 @@ async def list_lessons(
     level: Optional[str] = Query(None, description="Filter by level (a1, a2, b1, b2)"),
     module: Optional[str] = Query(None, description="Filter by module name"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """List available lessons, optionally filtered by level and module."""
     stmt = select(Lesson)
@@ -50,7 +53,8 @@ async def list_lessons(
 
 @router.get("/recommended", response_model=LessonResponse)
 async def get_recommended_lesson(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Get the next recommended lesson based on user level and progress."""
     completed_result = await db.execute(
@@ -101,7 +105,7 @@ async def get_recommended_lesson(
 async def get_lesson(
     lesson_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Retrieve a single lesson by its ID."""
     result = await db.execute(select(Lesson).where(Lesson.id == lesson_id))
@@ -141,13 +145,21 @@ async def complete_lesson(
 
     # Record progress
     progress = UserProgress(
-        user_id=current_user.id, lesson_id=lesson_id, score=payload.score
+        user_id=current_user.id,
+        lesson_id=lesson_id,
+        score=payload.score,
+        xp_earned=xp_earned,
     )
     db.add(progress)
 
     # Update user XP
     current_user.xp += xp_earned
     await db.flush()
+    await record_lesson(db, current_user.id, payload.score)
+    award_xp(db, current_user.id, xp_earned)
+
+    # Completed lessons feed session content: drop pre-generated sessions
+    session_pool.mark_user_changed(db, current_user.id)
 
     # Check badges
     badges = await check_badges(db, current_user.id, latest_score=payload.score)
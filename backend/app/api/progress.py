@@ -1,13 +1,14 @@
 """Progress routes: summary, weaknesses, and recent activity."""
 
 from datetime import datetime, timedelta, timezone
+from uuid import UUID
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import cast, Date, func, select
+from sqlalchemy import Float, String, cast, func, literal, select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.security import Principal, get_current_principal, get_current_user
 from app.models.lesson import Lesson
 from app.models.progress import Badge, GameResult, UserBadge, UserProgress
 from app.models.user import User
@@ -20,144 +21,84 @@ from app.schemas.progress import (
     XPHistoryEntry,
 )
 from app.services.adaptive import get_weaknesses
+from app.services.stats import SKILLS, get_user_stats, skill_average
 
 router = APIRouter(prefix="/progress", tags=["progress"])
 
-# Maps game_type -> skill category for the radar chart
-GAME_SKILL_MAP = {
-    "word_match": "vocabulary",
-    "memory_match": "vocabulary",
-    "word_scramble": "vocabulary",
-    "flashcard_sprint": "vocabulary",
-    "fill_blank": "grammar",
-    "translation": "phrases",
-    "cultural_quiz": "culture",
-    "conversation": "conversation",
-    "listening": "phrases",
-}
 
+def _history_query(user_id: UUID, since: datetime):
+    """Build one UNION ALL of per-module lesson counts and per-day XP.
 
-@router.get("/", response_model=ProgressSummary)
-async def get_progress(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
-):
-    """Return a summary of the authenticated user's learning progress."""
-    # Count completed lessons
-    lessons_result = await db.execute(
-        select(func.count(UserProgress.id)).where(
-            UserProgress.user_id == current_user.id
+    Rows are ``(kind, key, value)`` with kind ``"module"`` (key = module id,
+    value = lessons completed) or ``"day"`` (key = ISO date, value = XP from
+    games or lessons that day; lessons count 50 XP * score).
+    """
+    modules = (
+        select(
+            literal("module").label("kind"),
+            Lesson.module.label("key"),
+            cast(func.count(UserProgress.id), Float).label("value"),
         )
+        .join(Lesson, UserProgress.lesson_id == Lesson.id)
+        .where(UserProgress.user_id == user_id)
+        .group_by(Lesson.module)
     )
-    total_lessons = lessons_result.scalar() or 0
-
-    # Count games played
-    games_result = await db.execute(
-        select(func.count(GameResult.id)).where(GameResult.user_id == current_user.id)
+    game_day = cast(func.date(GameResult.played_at), String)
+    game_xp = (
+        select(
+            literal("day"),
+            game_day,
+            cast(func.sum(GameResult.xp_earned), Float),
+        )
+        .where(GameResult.user_id == user_id, GameResult.played_at >= since)
+        .group_by(game_day)
     )
-    total_games = games_result.scalar() or 0
-
-    # Average score across lessons
-    avg_result = await db.execute(
-        select(func.avg(UserProgress.score)).where(
-            UserProgress.user_id == current_user.id
+    lesson_day = cast(func.date(UserProgress.completed_at), String)
+    lesson_xp = (
+        select(
+            literal("day"),
+            lesson_day,
+            cast(func.sum(UserProgress.score * 50), Float),
         )
+        .where(UserProgress.user_id == user_id, UserProgress.completed_at >= since)
+        .group_by(lesson_day)
     )
-    avg_score = avg_result.scalar() or 0.0
+    return union_all(modules, game_xp, lesson_xp)
 
-    # Lessons grouped by module (via lesson join)
-    module_result = await db.execute(
-        select(Lesson.module, func.count(UserProgress.id))
-        .join(Lesson, UserProgress.lesson_id == Lesson.id)
-        .where(UserProgress.user_id == current_user.id)
-        .group_by(Lesson.module)
-    )
-    lessons_by_module = {row[0]: row[1] for row in module_result.all()}
 
-    # --- Skill Breakdown: average score per skill from game results ---
-    skill_result = await db.execute(
-        select(
-            GameResult.game_type, func.avg(GameResult.score), func.count(GameResult.id)
-        )
-        .where(GameResult.user_id == current_user.id)
-        .group_by(GameResult.game_type)
+@router.get("/", response_model=ProgressSummary)
+async def get_progress(
+    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+):
+    """Return a summary of the authenticated user's learning progress."""
+    stats = await get_user_stats(db, current_user.id)
+    avg_score = (
+        stats.lesson_score_sum / stats.lessons_completed
+        if stats.lessons_completed
+        else 0.0
     )
-    # Aggregate scores by skill category
-    skill_totals: dict[str, list[float]] = {
-        "vocabulary": [],
-        "grammar": [],
-        "phrases": [],
-        "culture": [],
-        "conversation": [],
-    }
-    for game_type, avg_sc, count in skill_result.all():
-        skill = GAME_SKILL_MAP.get(game_type)
-        if skill and skill in skill_totals:
-            skill_totals[skill].extend([float(avg_sc)] * int(count))
 
+    # --- Skill Breakdown: average game score per skill ---
     skills = SkillBreakdown(
-        vocabulary=round(
-            sum(skill_totals["vocabulary"]) / len(skill_totals["vocabulary"]) * 100, 1
-        )
-        if skill_totals["vocabulary"]
-        else 0,
-        grammar=round(
-            sum(skill_totals["grammar"]) / len(skill_totals["grammar"]) * 100, 1
-        )
-        if skill_totals["grammar"]
-        else 0,
-        phrases=round(
-            sum(skill_totals["phrases"]) / len(skill_totals["phrases"]) * 100, 1
-        )
-        if skill_totals["phrases"]
-        else 0,
-        culture=round(
-            sum(skill_totals["culture"]) / len(skill_totals["culture"]) * 100, 1
-        )
-        if skill_totals["culture"]
-        else 0,
-        conversation=round(
-            sum(skill_totals["conversation"]) / len(skill_totals["conversation"]) * 100,
-            1,
-        )
-        if skill_totals["conversation"]
-        else 0,
+        **{
+            skill: round(avg * 100, 1)
+            for skill in SKILLS
+            if (avg := skill_average(stats, skill)) is not None
+        }
     )
 
-    # --- XP History: daily XP earned over last 14 days ---
+    # --- Lessons per module and daily XP over the last 14 days ---
     fourteen_days_ago = datetime.now(timezone.utc) - timedelta(days=14)
-
-    # XP from games
-    game_xp_result = await db.execute(
-        select(
-            cast(GameResult.played_at, Date).label("day"),
-            func.sum(GameResult.xp_earned),
-        )
-        .where(
-            GameResult.user_id == current_user.id,
-            GameResult.played_at >= fourteen_days_ago,
-        )
-        .group_by("day")
-    )
+    lessons_by_module: dict[str, int] = {}
     daily_xp: dict[str, int] = {}
-    for day, xp_sum in game_xp_result.all():
-        key = day.isoformat() if hasattr(day, "isoformat") else str(day)
-        daily_xp[key] = daily_xp.get(key, 0) + int(xp_sum or 0)
-
-    # XP from lesson completions (estimate 50 XP * score per lesson)
-    lesson_xp_result = await db.execute(
-        select(
-            cast(UserProgress.completed_at, Date).label("day"),
-            func.sum(UserProgress.score * 50),
-        )
-        .where(
-            UserProgress.user_id == current_user.id,
-            UserProgress.completed_at >= fourteen_days_ago,
-        )
-        .group_by("day")
+    history_result = await db.execute(
+        _history_query(current_user.id, fourteen_days_ago)
     )
-    for day, xp_sum in lesson_xp_result.all():
-        key = day.isoformat() if hasattr(day, "isoformat") else str(day)
-        daily_xp[key] = daily_xp.get(key, 0) + int(xp_sum or 0)
+    for kind, key, value in history_result.all():
+        if kind == "module":
+            lessons_by_module[key] = int(value)
+        else:
+            daily_xp[key] = daily_xp.get(key, 0) + int(value or 0)
 
     # Build full 14-day timeline (fill in zero days)
     xp_history = []
@@ -188,8 +129,8 @@ async def get_progress(
     ]
 
     return ProgressSummary(
-        total_lessons_completed=total_lessons,
-        total_games_played=total_games,
+        total_lessons_completed=stats.lessons_completed,
+        total_games_played=stats.games_played,
         total_xp=current_user.xp,
         current_level=current_user.level,
         current_streak=current_user.streak,
@@ -203,7 +144,8 @@ async def get_progress(
 
 @router.get("/weaknesses", response_model=list[WeaknessResponse])
 async def get_user_weaknesses(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Return the user's weakness areas sorted by error count."""
     weaknesses = await get_weaknesses(db, current_user.id)
@@ -214,7 +156,7 @@ async def get_user_weaknesses(
 async def get_recent_activity(
     limit: int = Query(10, le=50),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Return recent lessons completed and games played."""
     activities = []
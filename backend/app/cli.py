@@ -0,0 +1,151 @@
+"""Maintenance commands for the DarijaLingo backend.
+
+Usage (from the backend directory)::
+
+    python -m app.cli backfill-stats [--user-id UUID]
+    python -m app.cli materialize-leaderboard [--period PERIOD] [--every SECONDS]
+    python -m app.cli prune-conversation-sessions [--idle-days DAYS]
+    python -m app.cli build-conversation-trees [--output PATH] [--depth N]
+        [--level LEVEL]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.user import User
+from app.services import conversation_tree
+from app.services.adaptive import CONVERSATION_SCENARIOS
+from app.services.conversation_sessions import prune_sessions
+from app.services.leaderboard import PERIODS, materialize_leaderboards
+from app.services.stats import rebuild_user_stats
+
+# Users rebuilt per transaction by backfill-stats
+BACKFILL_BATCH_SIZE = 200
+
+
+async def backfill_stats(user_id: Optional[UUID] = None) -> int:
+    """Rebuild ``user_stats`` rows from the fact tables; return the user count."""
+    async with async_session() as db:
+        if user_id is not None:
+            user_ids: List[UUID] = [user_id]
+        else:
+            result = await db.execute(select(User.id).order_by(User.created_at))
+            user_ids = list(result.scalars().all())
+
+        for start in range(0, len(user_ids), BACKFILL_BATCH_SIZE):
+            for uid in user_ids[start : start + BACKFILL_BATCH_SIZE]:
+                await rebuild_user_stats(db, uid)
+            await db.commit()
+            done = min(start + BACKFILL_BATCH_SIZE, len(user_ids))
+            print(f"Rebuilt stats for {done}/{len(user_ids)} users")
+    return len(user_ids)
+
+
+async def materialize_leaderboard(
+    periods: List[str], every: Optional[float] = None
+) -> None:
+    """Materialize leaderboard periods once, or every *every* seconds."""
+    while True:
+        async with async_session() as db:
+            updated = await materialize_leaderboards(db, periods)
+        print(
+            "Leaderboard updated: "
+            + ", ".join(f"{period}={count}" for period, count in updated.items())
+        )
+        if not every:
+            return
+        await asyncio.sleep(every)
+
+
+async def prune_conversation_sessions(idle_days: float) -> int:
+    """Delete AI conversation sessions idle for *idle_days*; return the count."""
+    idle_before = datetime.now(timezone.utc) - timedelta(days=idle_days)
+    async with async_session() as db:
+        deleted = await prune_sessions(db, idle_before)
+        await db.commit()
+    print(f"Deleted {deleted} conversation sessions idle since {idle_before:%Y-%m-%d}")
+    return deleted
+
+
+async def build_conversation_trees(
+    path: str,
+    levels: Optional[List[str]] = None,
+    depth: int = conversation_tree.DEFAULT_DEPTH,
+) -> int:
+    """Pre-generate the scenario conversation trees into *path*.
+
+    Returns the number of replies generated.
+    """
+    artifact = await conversation_tree.build_trees(levels, depth)
+    conversation_tree.save(artifact, path)
+    print(
+        f"Wrote {len(artifact['nodes'])} replies for {artifact['scenarios']} "
+        f"scenarios to {path} (version {artifact['version']}, "
+        f"{artifact['failed']} failed)"
+    )
+    return len(artifact["nodes"])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-stats", help="Rebuild per-user counters from progress history"
+    )
+    backfill.add_argument("--user-id", type=UUID, help="Only rebuild this user")
+
+    leaderboard = commands.add_parser(
+        "materialize-leaderboard", help="Add new XP to the ranked leaderboard tables"
+    )
+    leaderboard.add_argument(
+        "--period", choices=PERIODS, action="append", help="Default: all periods"
+    )
+    leaderboard.add_argument(
+        "--every", type=float, help="Keep running, once every SECONDS"
+    )
+
+    prune = commands.add_parser(
+        "prune-conversation-sessions", help="Delete idle AI conversation sessions"
+    )
+    prune.add_argument("--idle-days", type=float, default=30)
+
+    trees = commands.add_parser(
+        "build-conversation-trees",
+        help="Pre-generate replies to the scripted scenarios' suggestions",
+    )
+    trees.add_argument(
+        "--output",
+        default=settings.CONVERSATION_TREE_PATH,
+        help="Default: CONVERSATION_TREE_PATH",
+    )
+    trees.add_argument("--depth", type=int, default=conversation_tree.DEFAULT_DEPTH)
+    trees.add_argument(
+        "--level",
+        choices=list(CONVERSATION_SCENARIOS),
+        action="append",
+        help="Default: all levels",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "backfill-stats":
+        asyncio.run(backfill_stats(args.user_id))
+    elif args.command == "materialize-leaderboard":
+        asyncio.run(materialize_leaderboard(args.period or list(PERIODS), args.every))
+    elif args.command == "prune-conversation-sessions":
+        asyncio.run(prune_conversation_sessions(args.idle_days))
+    elif args.command == "build-conversation-trees":
+        if not args.output:
+            parser.error("--output or CONVERSATION_TREE_PATH is required")
+        asyncio.run(build_conversation_trees(args.output, args.level, args.depth))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,12 +25,79 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 43200  # 30 days
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 90
+    # bcrypt cost factor for new hashes, and hashes running at once per
+    # worker (in a thread pool, off the event loop)
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_MAX_CONCURRENCY: int = 4
+    # Token signature verifier: "jose" (python-jose) or "hmac" (stdlib, HS* only)
+    JWT_VERIFIER: str = "jose"
+    # Verified tokens cached per worker (by hash, until they expire)
+    JWT_DECODE_CACHE_SIZE: int = 10000
+    # Read-only endpoints trust a token's role/level claims for this long
+    # after issue; older tokens are checked against the users table
+    AUTH_CLAIMS_TRUST_SECONDS: int = 300
+    # Per-worker cache of authenticated principals (id, role, level)
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60
+    AUTH_USER_CACHE_SIZE: int = 10000
 
     # Claude / Anthropic (kept for backwards compatibility)
     ANTHROPIC_API_KEY: str = ""
 
     # AWS (Bedrock for AI conversations)
     AWS_REGION: str = "eu-west-3"
+    BEDROCK_MODEL_ID: str = (
+        "arn:aws:bedrock:eu-west-3:557720455286:inference-profile/"
+        "eu.anthropic.claude-haiku-4-5-20251001-v1:0"
+    )
+    # Model calls in flight at once per worker (Bedrock runs them in a
+    # thread pool of this size)
+    BEDROCK_MAX_CONCURRENCY: int = 8
+    # LLM behind the AI endpoints: "bedrock", or "local" for a deterministic
+    # offline stand-in (load tests) answering after a log-normal latency
+    # with median LLM_LOCAL_LATENCY_MS
+    LLM_PROVIDER: str = "bedrock"
+    LLM_LOCAL_LATENCY_MS: float = 800
+    LLM_LOCAL_LATENCY_SIGMA: float = 0.4
+    LLM_LOCAL_ERROR_RATE: float = 0.0
+    LLM_LOCAL_SEED: int = 0
+    # Beyond that, up to AI_MAX_QUEUE calls wait for a slot, each for at
+    # most AI_QUEUE_TIMEOUT_SECONDS before the turn fails as "busy"
+    AI_MAX_QUEUE: int = 200
+    AI_QUEUE_TIMEOUT_SECONDS: float = 30
+    # Throttled or unavailable Bedrock calls are retried with jittered
+    # exponential backoff, up to AI_MAX_ATTEMPTS attempts in total
+    AI_MAX_ATTEMPTS: int = 4
+    AI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    # Per-user token bucket for /api/ai/* requests (0 disables)
+    AI_RATE_LIMIT_PER_MINUTE: int = 30
+    AI_RATE_LIMIT_BURST: int = 10
+    # Replies to identical early conversation turns are reused (0 disables);
+    # only conversations with at most MAX_HISTORY previous turns are cached.
+    # With a path set, the cache is saved there on shutdown and reloaded.
+    RESPONSE_CACHE_SIZE: int = 5000
+    RESPONSE_CACHE_TTL_SECONDS: int = 86400
+    RESPONSE_CACHE_MAX_HISTORY: int = 2
+    RESPONSE_CACHE_PATH: str = ""
+    # Pre-generated replies to the scripted scenarios' suggestion paths,
+    # built by `python -m app.cli build-conversation-trees` and loaded on
+    # startup ("" disables)
+    CONVERSATION_TREE_PATH: str = ""
+    # Conversation history sent to the model: the last KEEP_TURNS turns
+    # verbatim, older ones condensed into a summary, history plus message
+    # kept within about TOKEN_BUDGET tokens
+    AI_HISTORY_KEEP_TURNS: int = 6
+    AI_HISTORY_TOKEN_BUDGET: int = 1500
+    # Longest learner message accepted, in characters
+    AI_MAX_MESSAGE_CHARS: int = 2000
+    # Mark the static system prompt for Bedrock prompt caching
+    AI_PROMPT_CACHING: bool = True
+    # Server-side conversation sessions: "sql" or "memory" (per worker).
+    # Sessions keep their newest MAX_TURNS turns; memory sessions expire
+    # after TTL_SECONDS idle (SQL ones via the prune CLI command).
+    AI_SESSION_BACKEND: str = "sql"
+    AI_SESSION_MAX_TURNS: int = 40
+    AI_SESSION_TTL_SECONDS: int = 86400
+    AI_SESSION_MAX_SESSIONS: int = 10000
 
     # CORS - comma-separated string
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
@@ -45,5 +112,23 @@ class Settings(BaseSettings):
     BACKEND_HOST: str = "0.0.0.0"
     BACKEND_PORT: int = 8000
 
+    # Curriculum index: seconds before a worker rebuilds its in-memory copy
+    # even without a local edit (0 = only rebuild on edits)
+    CURRICULUM_INDEX_TTL_SECONDS: int = 300
+
+    # Harder, look-alike distractors at b1/b2 (see
+    # app.services.adaptive.LEVEL_DISTRACTOR_SIMILARITY); off = random
+    SIMILAR_DISTRACTORS: bool = False
+
+    # Pre-generated game sessions per (user, level); 0 disables the pool
+    SESSION_POOL_SIZE: int = 0
+    SESSION_POOL_MAX_USERS: int = 10000
+
+    # Seconds the top of each leaderboard period is cached per worker
+    LEADERBOARD_CACHE_TTL_SECONDS: int = 30
+    # Real-time ranking: "sql" (materialized tables), "memory" or "redis"
+    LEADERBOARD_BACKEND: str = "sql"
+    REDIS_URL: str = "redis://localhost:6379/0"
+
 
 settings = Settings()
@@ -1,6 +1,7 @@
 import os
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
@@ -25,6 +26,20 @@ class Base(DeclarativeBase):
     pass
 
 
+def upsert(db: AsyncSession, table: Any):
+    """Return an INSERT for *table* supporting ``on_conflict_do_update``.
+
+    Production runs on PostgreSQL and tests on SQLite; both dialects expose
+    the same ``ON CONFLICT`` API.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upsert is not supported on {dialect}")
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """FastAPI dependency that yields an async database session."""
     async with async_session() as session:
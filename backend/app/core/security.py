@@ -1,14 +1,25 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Dict, Optional
 from uuid import UUID
 
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.database import get_db
 
@@ -20,15 +31,33 @@ bearer_scheme = HTTPBearer()
 # ---------------------------------------------------------------------------
 
 
-def hash_password(password: str) -> str:
-    """Hash a plain-text password using bcrypt."""
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+# bcrypt releases the GIL, so hashing in worker threads keeps the event loop
+# responsive; the pool size caps how many hashes run at once
+_bcrypt_executor: Optional[ThreadPoolExecutor] = None
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain-text password against its bcrypt hash."""
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+def _run_bcrypt(fn: Callable, *args):
+    global _bcrypt_executor
+    if _bcrypt_executor is None:
+        _bcrypt_executor = ThreadPoolExecutor(
+            max_workers=settings.BCRYPT_MAX_CONCURRENCY, thread_name_prefix="bcrypt"
+        )
+    return asyncio.get_running_loop().run_in_executor(_bcrypt_executor, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a plain-text password using bcrypt (off the event loop)."""
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    hashed = await _run_bcrypt(bcrypt.hashpw, password.encode("utf-8"), salt)
+    return hashed.decode("utf-8")
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain-text password against its bcrypt hash (off the event loop)."""
+    return await _run_bcrypt(
+        bcrypt.checkpw,
+        plain_password.encode("utf-8"),
+        hashed_password.encode("utf-8"),
     )
 
 
@@ -42,7 +71,12 @@ def create_access_token(subject: str, extra_claims: Optional[dict] = None) -> st
     expire = datetime.now(timezone.utc) + timedelta(
         minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
     )
-    payload = {"sub": subject, "exp": expire, "type": "access"}
+    payload = {
+        "sub": subject,
+        "exp": expire,
+        "iat": datetime.now(timezone.utc),
+        "type": "access",
+    }
     if extra_claims:
         payload.update(extra_claims)
     return jwt.encode(
@@ -64,18 +98,228 @@ def create_refresh_token(subject: str, extra_claims: Optional[dict] = None) -> s
 
 
 def decode_token(token: str) -> dict:
-    """Decode and validate a JWT, returning its payload."""
+    """Decode and validate a JWT, returning its payload.
+
+    Verified payloads are cached by token hash until the token's ``exp``,
+    so a client re-sending the same token skips signature verification.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _token_cache.get(key)
+    if payload is None:
+        try:
+            payload = get_token_verifier()(token)
+        except InvalidToken:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)) and exp > time.time():
+            _token_cache.set(key, payload, ttl=exp - time.time())
+    return dict(payload)
+
+
+def token_cache_stats() -> dict:
+    """Return size, hit, miss and eviction counters of the decode cache."""
+    return _token_cache.stats()
+
+
+# ---------------------------------------------------------------------------
+# JWT verifiers
+# ---------------------------------------------------------------------------
+
+
+class InvalidToken(Exception):
+    """Raised by a token verifier for a malformed, forged or expired token."""
+
+
+# sha256(token) -> verified payload, kept until the token expires
+_token_cache = TTLCache(maxsize=settings.JWT_DECODE_CACHE_SIZE, ttl=0)
+
+
+def _jose_verify(token: str) -> dict:
     try:
-        payload = jwt.decode(
+        return jwt.decode(
             token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
         )
-        return payload
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    except JWTError as exc:
+        raise InvalidToken(str(exc)) from exc
+
+
+_HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _hmac_verify(token: str) -> dict:
+    """Verify an HS256/384/512 JWT with the standard library only."""
+    digest = _HMAC_DIGESTS.get(settings.JWT_ALGORITHM)
+    if digest is None:
+        raise InvalidToken(f"Unsupported algorithm {settings.JWT_ALGORITHM}")
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64url_decode(header_b64))
+        if header.get("alg") != settings.JWT_ALGORITHM:
+            raise InvalidToken("Unexpected algorithm")
+        expected = hmac.new(
+            settings.JWT_SECRET_KEY.encode("utf-8"),
+            f"{header_b64}.{payload_b64}".encode("ascii"),
+            digest,
+        ).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature_b64)):
+            raise InvalidToken("Signature verification failed")
+        payload = json.loads(_b64url_decode(payload_b64))
+    except (ValueError, TypeError, AttributeError, binascii.Error) as exc:
+        raise InvalidToken("Malformed token") from exc
+
+    if not isinstance(payload, dict):
+        raise InvalidToken("Malformed token")
+    now = time.time()
+    exp = payload.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp <= now):
+        raise InvalidToken("Signature has expired")
+    nbf = payload.get("nbf")
+    if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+        raise InvalidToken("Token is not yet valid")
+    return payload
+
+
+# Implementations selectable with JWT_VERIFIER; each takes the raw token and
+# returns its payload or raises InvalidToken
+TOKEN_VERIFIERS: Dict[str, Callable[[str], dict]] = {
+    "jose": _jose_verify,
+    "hmac": _hmac_verify,
+}
+
+
+def get_token_verifier() -> Callable[[str], dict]:
+    try:
+        return TOKEN_VERIFIERS[settings.JWT_VERIFIER]
+    except KeyError:
+        raise ValueError(f"Unknown JWT_VERIFIER: {settings.JWT_VERIFIER}")
+
+
+# ---------------------------------------------------------------------------
+# Token claims and principal cache
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated identity resolved without loading the full User row."""
+
+    id: UUID
+    role: str
+    level: str
+    token_version: int
+
+
+# user id -> Principal, refreshed whenever a request loads the User row
+_principal_cache = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS
+)
+
+
+def user_claims(user) -> dict:
+    """Return the signed claims embedded in a user's tokens."""
+    return {"role": user.role, "level": user.level, "tv": user.token_version}
+
+
+def cache_user(user) -> Principal:
+    """Store (or refresh) the cached principal of *user*."""
+    principal = Principal(
+        id=user.id, role=user.role, level=user.level, token_version=user.token_version
+    )
+    _principal_cache.set(user.id, principal)
+    return principal
+
+
+def invalidate_user(user_id: UUID) -> None:
+    """Drop the cached principal of *user_id* (profile change, deletion)."""
+    _principal_cache.pop(user_id)
+
+
+# Session.info key: user id -> Principal to cache (or None to drop) on commit
+PENDING_PRINCIPALS = "pending_principals"
+
+
+def cache_user_on_commit(db: AsyncSession, user) -> None:
+    """Drop *user*'s cached principal now and cache its new one once *db* commits.
+
+    Caching straight away would let other requests see a profile that is
+    later rolled back.
+    """
+    invalidate_user(user.id)
+    principal = Principal(
+        id=user.id, role=user.role, level=user.level, token_version=user.token_version
+    )
+    db.info.setdefault(PENDING_PRINCIPALS, {})[user.id] = principal
+
+
+def invalidate_user_on_commit(db: AsyncSession, user_id: UUID) -> None:
+    """Drop *user_id*'s cached principal now and again once *db* commits.
+
+    The second drop covers requests that cache the old row in between.
+    """
+    invalidate_user(user_id)
+    db.info.setdefault(PENDING_PRINCIPALS, {})[user_id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    for user_id, principal in session.info.pop(PENDING_PRINCIPALS, {}).items():
+        if principal is None:
+            invalidate_user(user_id)
+        else:
+            _principal_cache.set(user_id, principal)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session) -> None:
+    session.info.pop(PENDING_PRINCIPALS, None)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _access_subject(payload: dict) -> UUID:
+    """Validate an access token payload and return its user id."""
+    if payload.get("type") != "access":
+        raise _unauthorized("Invalid token type")
+
+    user_id_str: Optional[str] = payload.get("sub")
+    if user_id_str is None:
+        raise _unauthorized("Token missing subject")
+
+    try:
+        return UUID(user_id_str)
+    except ValueError:
+        raise _unauthorized("Invalid user id in token")
+
+
+def _check_token_version(payload: dict, token_version: int) -> None:
+    if payload.get("tv", 0) < token_version:
+        raise _unauthorized("Token has been revoked")
+
+
+def _claims_trusted(payload: dict) -> bool:
+    """Whether the token's role/level claims are recent enough to trust."""
+    if not all(key in payload for key in ("role", "level", "tv", "iat")):
+        return False
+    age = datetime.now(timezone.utc).timestamp() - payload["iat"]
+    return age < settings.AUTH_CLAIMS_TRUST_SECONDS
 
 
 # ---------------------------------------------------------------------------
@@ -89,48 +333,74 @@ async def get_current_user(
 ):
     """Extract the current user from a Bearer JWT.
 
-    Returns the User ORM instance or raises 401.
+    Returns the User ORM instance or raises 401.  Use this for endpoints that
+    modify the user or need more than ``get_current_principal`` provides.
     """
     # Import here to avoid circular imports
     from app.models.user import User
 
     payload = decode_token(credentials.credentials)
-
-    if payload.get("type") != "access":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token type",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    user_id_str: Optional[str] = payload.get("sub")
-    if user_id_str is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token missing subject",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    try:
-        user_id = UUID(user_id_str)
-    except ValueError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid user id in token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    user_id = _access_subject(payload)
 
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
+        raise _unauthorized("User not found")
+    # Cache before the version check so a revocation seen here also
+    # applies to get_current_principal
+    cache_user(user)
+    _check_token_version(payload, user.token_version)
+    return user
+
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    """Resolve the caller's id, role and level, usually without a query.
+
+    The cached principal is used when present (and rejects tokens older than
+    the user's token version).  Otherwise the token's signed claims are
+    trusted for ``AUTH_CLAIMS_TRUST_SECONDS`` after issue, and only older
+    tokens fall back to a single-row lookup.
+
+    Hence the revocation window: a role change or a deleted account may go
+    unnoticed here for up to ``AUTH_CLAIMS_TRUST_SECONDS`` (the token's own
+    claims) and, on workers other than the one making the change,
+    ``AUTH_USER_CACHE_TTL_SECONDS`` (their cached principal).  A level
+    change reissues the user's tokens instead (``PUT /auth/me``).
+    Endpoints that must see the change at once use ``get_current_user``.
+    """
+    from app.models.user import User
+
+    payload = decode_token(credentials.credentials)
+    user_id = _access_subject(payload)
+
+    principal = _principal_cache.get(user_id)
+    if principal is not None:
+        _check_token_version(payload, principal.token_version)
+        return principal
+
+    if _claims_trusted(payload):
+        return Principal(
+            id=user_id,
+            role=payload["role"],
+            level=payload["level"],
+            token_version=payload["tv"],
         )
 
-    return user
+    result = await db.execute(
+        select(User.id, User.role, User.level, User.token_version).where(
+            User.id == user_id
+        )
+    )
+    user = result.one_or_none()
+    if user is None:
+        raise _unauthorized("User not found")
+    principal = cache_user(user)
+    _check_token_version(payload, principal.token_version)
+    return principal
 
 
 async def require_teacher_or_admin(current_user=Depends(get_current_user)):
@@ -17,17 +17,32 @@ from app.api import (
     progress,
 )
 from app.core.config import settings
-from app.core.database import Base, engine
+from app.core.database import Base, async_session, engine
+from app.services import conversation_tree, response_cache
+from app.services.curriculum_index import get_curriculum_index
+from app.services.xp import load_badge_ids
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Create database tables on startup."""
+    """Create database tables and warm in-process caches on startup.
+
+    The AI response cache is persisted on shutdown if a path is configured;
+    the pre-generated conversation tree is loaded if one is configured.
+    """
     async with engine.begin() as conn:
         import app.models  # noqa: F401
 
         await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as db:
+        await get_curriculum_index(db)
+        await load_badge_ids(db)
+        await db.commit()
+    response_cache.load()
+    conversation_tree.load()
     yield
+    response_cache.save()
 
 
 application = FastAPI(
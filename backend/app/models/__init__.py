@@ -1,23 +1,29 @@
 from app.models.user import User
 from app.models.lesson import Lesson
 from app.models.flashcard import Flashcard
+from app.models.conversation import ConversationSession
 from app.models.progress import (
     UserProgress,
     GameResult,
     Badge,
     UserBadge,
     UserWeakness,
+    UserStats,
     LeaderboardEntry,
+    LeaderboardState,
 )
 
 __all__ = [
     "User",
     "Lesson",
     "Flashcard",
+    "ConversationSession",
     "UserProgress",
     "GameResult",
     "Badge",
     "UserBadge",
     "UserWeakness",
+    "UserStats",
     "LeaderboardEntry",
+    "LeaderboardState",
 ]
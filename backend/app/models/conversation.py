@@ -0,0 +1,43 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy.dialects.postgresql import JSON, UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class ConversationSession(Base):
+    """Server-side state of one AI conversation.
+
+    ``history`` holds the turns forwarded to the model as ``{"role",
+    "content"}`` dicts; ``system_prompt`` is built once when the session
+    starts.  ``turn_count`` counts answered learner messages, including
+    turns trimmed from ``history``.
+    """
+
+    __tablename__ = "conversation_sessions"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    level: Mapped[str] = mapped_column(String(10), nullable=False)
+    system_prompt: Mapped[str] = mapped_column(Text, nullable=False)
+    scenario: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    topic: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    history: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    turn_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
+    )
@@ -1,7 +1,16 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, func
+from sqlalchemy import (
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.dialects.postgresql import JSON, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -24,6 +33,7 @@ class UserProgress(Base):
         UUID(as_uuid=True), ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False
     )
     score: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    xp_earned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     completed_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
@@ -83,6 +93,9 @@ class UserBadge(Base):
 
 class UserWeakness(Base):
     __tablename__ = "user_weaknesses"
+    __table_args__ = (
+        UniqueConstraint("user_id", "skill_area", name="uq_user_weaknesses_skill"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -100,8 +113,50 @@ class UserWeakness(Base):
     )
 
 
+class UserStats(Base):
+    """Running per-user counters, kept in step with the progress fact tables.
+
+    Maintained by ``app.services.stats`` in the same transaction as the
+    ``UserProgress`` / ``GameResult`` rows they summarise.
+    """
+
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    lessons_completed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lesson_score_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    games_played: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    perfect_scores: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Game score sum / count per skill category (see stats.GAME_SKILL_MAP)
+    vocabulary_score_sum: Mapped[float] = mapped_column(
+        Float, nullable=False, default=0.0
+    )
+    vocabulary_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    grammar_score_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    grammar_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    phrases_score_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    phrases_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    culture_score_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    culture_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    conversation_score_sum: Mapped[float] = mapped_column(
+        Float, nullable=False, default=0.0
+    )
+    conversation_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_activity: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
 class LeaderboardEntry(Base):
     __tablename__ = "leaderboard_entries"
+    __table_args__ = (
+        Index("ix_leaderboard_entries_period_xp", "period", "xp_total"),
+        UniqueConstraint("period", "user_id", name="uq_leaderboard_entries_user"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -114,4 +169,25 @@ class LeaderboardEntry(Base):
     )
     period: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
     xp_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    rank: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class LeaderboardState(Base):
+    """Materialization progress of one leaderboard period.
+
+    ``window_start`` is the start of the period the entries currently cover
+    (None for all-time) and ``watermark`` the activity time up to which
+    XP has been added to them.
+    """
+
+    __tablename__ = "leaderboard_state"
+
+    period: Mapped[str] = mapped_column(String(20), primary_key=True)
+    window_start: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    watermark: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
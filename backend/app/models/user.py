@@ -21,8 +21,10 @@ class User(Base):
     display_name: Mapped[str] = mapped_column(String(100), nullable=False)
     level: Mapped[str] = mapped_column(String(10), nullable=False, default="a2")
     role: Mapped[str] = mapped_column(String(20), nullable=False, default="student")
-    xp: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    xp: Mapped[int] = mapped_column(Integer, nullable=False, default=0, index=True)
     streak: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Bumped to revoke every token issued before (level change via PUT /me)
+    token_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     last_active: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
@@ -39,6 +39,12 @@ class UserResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class ProfileUpdateResponse(UserResponse):
+    # Fresh tokens when a change affects their signed claims (level), since
+    # read-only endpoints trust the claims of the token they are sent
+    tokens: Optional[Token] = None
+
+
 class UserUpdateRequest(BaseModel):
     display_name: Optional[str] = Field(None, min_length=1, max_length=100)
     level: Optional[str] = Field(None)
@@ -0,0 +1,27 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class SuggestionItem(BaseModel):
+    arabic: str = ""
+    latin: str = ""
+    english: str = ""
+
+
+class TokenUsage(BaseModel):
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+
+
+class ConversationResponse(BaseModel):
+    arabic: str = ""
+    latin: str = ""
+    english: str = ""
+    correction: str | None = None
+    suggestions: List[SuggestionItem] = []
+    error: str | None = None
+    # Tokens used by this turn (None when answered from cache or on failure)
+    usage: TokenUsage | None = None
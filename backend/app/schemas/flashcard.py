@@ -38,6 +38,19 @@ class ReviewSubmission(BaseModel):
     results: List[CardReviewResult]
 
 
+class CardReviewOutcome(BaseModel):
+    card_id: UUID
+    # False if the card does not exist or is not the caller's
+    updated: bool
+    box: Optional[int] = None
+    next_review: Optional[datetime] = None
+
+
+class ReviewResponse(BaseModel):
+    updated: int
+    results: List[CardReviewOutcome]
+
+
 class DeckResponse(BaseModel):
     user_id: UUID
     display_name: str
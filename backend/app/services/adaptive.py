@@ -7,15 +7,20 @@ content always reinforces what the learner has already studied.
 """
 
 import random
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import List, Set
+from typing import FrozenSet, Iterable, List, NamedTuple, Optional, Set
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import DateTime, Integer, String, cast, literal, null, select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.lesson import Lesson
+from app.core.config import settings
+from app.core.database import upsert
 from app.models.progress import UserProgress, UserWeakness
+from app.services.conjugation import ConjugationSet
+from app.services.curriculum_index import CurriculumIndex, get_curriculum_index
+from app.services.distractors import DistractorPool
 
 
 # ---------------------------------------------------------------------------
@@ -31,6 +36,18 @@ LEVEL_DIFFICULTY = {
 
 DEFAULT_DIFFICULTY = LEVEL_DIFFICULTY["a2"]
 
+# With SIMILAR_DISTRACTORS on, wrong options at these levels look like the
+# right answer (see app.services.distractors.SIMILARITY_MODES); otherwise,
+# and at other levels, they are picked at random.
+LEVEL_DISTRACTOR_SIMILARITY = {"b1": "length", "b2": "initial"}
+
+
+def distractor_similarity(level: str) -> Optional[str]:
+    """Return the distractor similarity mode for *level*, or None (random)."""
+    if not settings.SIMILAR_DISTRACTORS:
+        return None
+    return LEVEL_DISTRACTOR_SIMILARITY.get(level)
+
 
 # ---------------------------------------------------------------------------
 # Track individual answers
@@ -45,29 +62,37 @@ async def track_answer(
     Increments error_count when the answer is wrong.  If the skill area does
     not exist yet for the user, a new row is created.
     """
-    result = await db.execute(
-        select(UserWeakness).where(
-            UserWeakness.user_id == user_id, UserWeakness.skill_area == skill_area
-        )
-    )
-    weakness = result.scalar_one_or_none()
+    await track_answers(db, user_id, skill_area, [{"correct": is_correct}])
 
-    now = datetime.now(timezone.utc)
 
-    if weakness is None:
-        weakness = UserWeakness(
-            user_id=user_id,
-            skill_area=skill_area,
-            error_count=0 if is_correct else 1,
-            last_tested=now,
-        )
-        db.add(weakness)
-    else:
-        if not is_correct:
-            weakness.error_count += 1
-        weakness.last_tested = now
+async def track_answers(
+    db: AsyncSession, user_id: UUID, skill_area: str, answers: Iterable[dict]
+) -> None:
+    """Record a batch of answers for a skill area in a single statement.
 
-    await db.flush()
+    Wrong answers (``answer["correct"]`` falsy) are counted in memory and
+    added to error_count with one upsert on (user_id, skill_area), so a
+    whole game costs one round trip instead of a SELECT and flush per answer.
+    """
+    answers = list(answers)
+    if not answers:
+        return
+    errors = sum(1 for answer in answers if not answer.get("correct", False))
+
+    stmt = upsert(db, UserWeakness).values(
+        user_id=user_id,
+        skill_area=skill_area,
+        error_count=errors,
+        last_tested=datetime.now(timezone.utc),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserWeakness.user_id, UserWeakness.skill_area],
+        set_={
+            "error_count": UserWeakness.error_count + stmt.excluded.error_count,
+            "last_tested": stmt.excluded.last_tested,
+        },
+    )
+    await db.execute(stmt)
 
 
 # ---------------------------------------------------------------------------
@@ -85,6 +110,74 @@ async def get_weaknesses(db: AsyncSession, user_id: UUID) -> List[UserWeakness]:
     return list(result.scalars().all())
 
 
+# ---------------------------------------------------------------------------
+# Learner snapshot used for session generation
+# ---------------------------------------------------------------------------
+
+
+class WeaknessEntry(NamedTuple):
+    skill_area: str
+    error_count: int
+    last_tested: Optional[datetime]
+
+
+@dataclass
+class UserLearningSnapshot:
+    """Everything session generation needs to know about one learner."""
+
+    level: str
+    weaknesses: List[WeaknessEntry]
+    completed_lesson_ids: Set[UUID]
+    completed_modules: Set[str]
+
+
+async def load_learning_snapshot(
+    db: AsyncSession, user_id: UUID, level: str, index: CurriculumIndex
+) -> UserLearningSnapshot:
+    """Fetch the user's weaknesses and completed lessons in one round trip.
+
+    Both row sets are read through a single ``UNION ALL``; completed modules
+    are then resolved against the in-process curriculum *index* without
+    touching the database again.
+    """
+    lessons_q = (
+        select(
+            literal("lesson").label("kind"),
+            UserProgress.lesson_id.label("lesson_id"),
+            cast(null(), String(100)).label("skill_area"),
+            cast(null(), Integer).label("error_count"),
+            cast(null(), DateTime(timezone=True)).label("last_tested"),
+        )
+        .where(UserProgress.user_id == user_id)
+        .distinct()
+    )
+    weaknesses_q = select(
+        literal("weakness"),
+        null(),
+        UserWeakness.skill_area,
+        UserWeakness.error_count,
+        UserWeakness.last_tested,
+    ).where(UserWeakness.user_id == user_id)
+
+    result = await db.execute(union_all(lessons_q, weaknesses_q))
+
+    weaknesses: List[WeaknessEntry] = []
+    completed_ids: Set[UUID] = set()
+    for kind, lesson_id, skill_area, error_count, last_tested in result.all():
+        if kind == "lesson":
+            completed_ids.add(lesson_id)
+        else:
+            weaknesses.append(WeaknessEntry(skill_area, error_count, last_tested))
+    weaknesses.sort(key=lambda w: w.error_count, reverse=True)
+
+    return UserLearningSnapshot(
+        level=level,
+        weaknesses=weaknesses,
+        completed_lesson_ids=completed_ids,
+        completed_modules=index.completed_modules(level, completed_ids),
+    )
+
+
 # ---------------------------------------------------------------------------
 # Generate a prioritised game session
 # ---------------------------------------------------------------------------
@@ -518,81 +611,6 @@ CONVERSATION_SCENARIOS = {
 }
 
 
-async def _get_completed_modules(
-    db: AsyncSession, user_id: UUID, level: str
-) -> Set[str]:
-    """Return the set of module IDs where the user has completed at least one lesson."""
-    result = await db.execute(
-        select(Lesson.module)
-        .join(UserProgress, UserProgress.lesson_id == Lesson.id)
-        .where(
-            UserProgress.user_id == user_id, Lesson.level == level, Lesson.order < 999
-        )
-        .distinct()
-    )
-    return {row[0] for row in result.all()}
-
-
-async def _load_game_content(
-    db: AsyncSession, level: str, completed_modules: Set[str] | None = None
-) -> dict:
-    """Load game_content entries scoped to the user's completed modules.
-
-    If *completed_modules* is provided, only game_content from those modules
-    is returned so that games reinforce vocabulary the user has already learned.
-    Falls back to all content for the level when no modules have been completed
-    yet (first session).
-    """
-    stmt = select(Lesson.content_json, Lesson.module).where(
-        Lesson.level == level, Lesson.order == 999
-    )
-    if completed_modules:
-        stmt = stmt.where(Lesson.module.in_(completed_modules))
-
-    result = await db.execute(stmt)
-    all_content = {"word_match": [], "fill_blanks": [], "cultural_quiz": []}
-    for cj, _module in result.all():
-        gc = cj.get("game_content", {}) if cj else {}
-        for key in all_content:
-            all_content[key].extend(gc.get(key, []))
-
-    # If nothing found from completed modules, fall back to all level content
-    if not any(all_content.values()) and completed_modules:
-        return await _load_game_content(db, level, completed_modules=None)
-
-    return all_content
-
-
-async def _load_lesson_vocabulary(db: AsyncSession, user_id: UUID, level: str) -> list:
-    """Extract vocabulary items from the user's completed lessons.
-
-    Returns a flat list of vocabulary dicts that can be used to generate
-    additional word_match pairs and flashcard content directly from words
-    the user has studied.
-    """
-    result = await db.execute(
-        select(Lesson.content_json)
-        .join(UserProgress, UserProgress.lesson_id == Lesson.id)
-        .where(
-            UserProgress.user_id == user_id, Lesson.level == level, Lesson.order < 999
-        )
-    )
-    vocab = []
-    for (cj,) in result.all():
-        if not cj:
-            continue
-        for item in cj.get("vocabulary", []):
-            if item.get("arabic") and item.get("english"):
-                vocab.append(
-                    {
-                        "darija_arabic": item["arabic"],
-                        "darija_latin": item.get("romanized", ""),
-                        "english": item["english"],
-                    }
-                )
-    return vocab
-
-
 def _build_word_match_config(items: list, count: int = 5) -> dict:
     """Build WordMatch game data from curriculum word_match items."""
     sample = random.sample(items, min(count, len(items)))
@@ -609,18 +627,54 @@ def _build_word_match_config(items: list, count: int = 5) -> dict:
     return {"pairs": pairs}
 
 
-def _build_fill_blank_config(items: list, count: int = 3) -> dict:
-    """Build FillInBlank game data from curriculum fill_blanks items."""
-    sample = random.sample(items, min(count, len(items)))
+def _fill_answer_pool(items: list) -> DistractorPool:
+    """Deduplicated (arabic, latin) answers of fill_blanks items."""
+    return DistractorPool(
+        (
+            {"arabic": it.get("answer_arabic", ""), "latin": it.get("answer_latin", "")}
+            for it in items
+        ),
+        key=lambda a: (a["arabic"], a["latin"]),
+        text=lambda a: a["latin"],
+    )
+
+
+def _quiz_answer_pool(items: list) -> DistractorPool:
+    """Correct answers of cultural_quiz items, used to pad distractors."""
+    return DistractorPool(it["correct_answer"] for it in items if "correct_answer" in it)
+
 
-    # Collect all unique answers for generating distractors
-    all_answers = []
-    seen: set = set()
-    for it in items:
-        key = (it.get("answer_arabic", ""), it.get("answer_latin", ""))
-        if key not in seen:
-            seen.add(key)
-            all_answers.append({"arabic": key[0], "latin": key[1]})
+def _english_pool(vocab: list) -> DistractorPool:
+    """English meanings of vocabulary items."""
+    return DistractorPool(v["english"] for v in vocab)
+
+
+def _darija_pool(vocab: list) -> DistractorPool:
+    """Darija forms of vocabulary items, deduplicated by Arabic script."""
+    return DistractorPool(
+        (
+            {"arabic": v.get("darija_arabic", ""), "latin": v.get("darija_latin", "")}
+            for v in vocab
+        ),
+        key=lambda a: a["arabic"],
+        text=lambda a: a["latin"],
+    )
+
+
+def _build_fill_blank_config(
+    items: list,
+    count: int = 3,
+    answers: DistractorPool | None = None,
+    similarity: str | None = None,
+) -> dict:
+    """Build FillInBlank game data from curriculum fill_blanks items.
+
+    *answers* is the precomputed distractor pool for *items*; it is built
+    on the fly when not given.
+    """
+    sample = random.sample(items, min(count, len(items)))
+    if answers is None:
+        answers = _fill_answer_pool(items)
 
     questions = []
     for item in sample:
@@ -630,12 +684,9 @@ def _build_fill_blank_config(items: list, count: int = 3) -> dict:
         }
 
         # Pick distractors from other items' answers
-        distractors = [
-            a
-            for a in all_answers
-            if a["latin"] != correct["latin"] or a["arabic"] != correct["arabic"]
-        ]
-        distractor_sample = random.sample(distractors, min(3, len(distractors)))
+        distractor_sample = answers.sample(
+            3, exclude=[correct], similar_to=correct, similarity=similarity
+        )
 
         # Build options list: 1 correct + 3 distractors (4 total)
         options = [
@@ -665,12 +716,15 @@ def _build_fill_blank_config(items: list, count: int = 3) -> dict:
     return {"questions": questions}
 
 
-def _build_cultural_quiz_config(items: list, count: int = 3) -> dict:
+def _build_cultural_quiz_config(
+    items: list, count: int = 3, answers: DistractorPool | None = None
+) -> dict:
     """Build CulturalQuiz / MultipleChoice data from curriculum cultural_quiz."""
     sample = random.sample(items, min(count, len(items)))
 
-    # Collect all correct answers for padding distractors when needed
-    all_correct = [it["correct_answer"] for it in items if "correct_answer" in it]
+    # All correct answers, for padding distractors when needed
+    if answers is None:
+        answers = _quiz_answer_pool(items)
 
     questions = []
     for item in sample:
@@ -678,13 +732,11 @@ def _build_cultural_quiz_config(items: list, count: int = 3) -> dict:
 
         # Pad with other items' correct answers if fewer than 3 distractors
         if len(distractors) < 3:
-            extra = [
-                a
-                for a in all_correct
-                if a != item["correct_answer"] and a not in distractors
-            ]
             distractors.extend(
-                random.sample(extra, min(3 - len(distractors), len(extra)))
+                answers.sample(
+                    3 - len(distractors),
+                    exclude=[item["correct_answer"], *distractors],
+                )
             )
 
         options = [{"text": item["correct_answer"], "correct": True}]
@@ -704,7 +756,12 @@ def _build_cultural_quiz_config(items: list, count: int = 3) -> dict:
     return {"questions": questions}
 
 
-def _build_listening_config(vocab: list, count: int = 4) -> dict:
+def _build_listening_config(
+    vocab: list,
+    count: int = 4,
+    answers: DistractorPool | None = None,
+    similarity: str | None = None,
+) -> dict:
     """Build a Multiple-Choice quiz from vocabulary.
 
     Shows a Darija word and asks the user to pick the correct English meaning.
@@ -714,16 +771,20 @@ def _build_listening_config(vocab: list, count: int = 4) -> dict:
         return {}
 
     sample = random.sample(vocab, min(count, len(vocab)))
+    if answers is None:
+        answers = _english_pool(vocab)
     questions = []
 
     for item in sample:
         correct_english = item["english"]
 
-        # Build distractors from other vocab English meanings
-        distractors = list(
-            {v["english"] for v in vocab if v["english"] != correct_english}
+        # Distractors from other vocab English meanings
+        distractor_sample = answers.sample(
+            3,
+            exclude=[correct_english],
+            similar_to=correct_english,
+            similarity=similarity,
         )
-        distractor_sample = random.sample(distractors, min(3, len(distractors)))
 
         options: list[dict] = [
             {"arabic": "", "latin": correct_english, "correct": True}
@@ -748,7 +809,12 @@ def _build_listening_config(vocab: list, count: int = 4) -> dict:
     return {"questions": questions}
 
 
-def _build_translation_config(vocab: list, count: int = 3) -> dict:
+def _build_translation_config(
+    vocab: list,
+    count: int = 3,
+    answers: DistractorPool | None = None,
+    similarity: str | None = None,
+) -> dict:
     """Build a Fill-In-Blank style translation quiz from vocabulary.
 
     Shows an English word and asks the user to pick the correct Darija
@@ -758,6 +824,8 @@ def _build_translation_config(vocab: list, count: int = 3) -> dict:
         return {}
 
     sample = random.sample(vocab, min(count, len(vocab)))
+    if answers is None:
+        answers = _darija_pool(vocab)
     questions = []
 
     for item in sample:
@@ -766,13 +834,10 @@ def _build_translation_config(vocab: list, count: int = 3) -> dict:
             "latin": item.get("darija_latin", ""),
         }
 
-        # Build distractors from other vocab Darija words
-        distractors = [
-            {"arabic": v.get("darija_arabic", ""), "latin": v.get("darija_latin", "")}
-            for v in vocab
-            if v.get("darija_arabic", "") != correct["arabic"]
-        ]
-        distractor_sample = random.sample(distractors, min(3, len(distractors)))
+        # Distractors from other vocab Darija words
+        distractor_sample = answers.sample(
+            3, exclude=[correct], similar_to=correct, similarity=similarity
+        )
 
         options: list[dict] = [
             {"arabic": correct["arabic"], "latin": correct["latin"], "correct": True}
@@ -881,77 +946,27 @@ TENSE_LABELS = {
 }
 
 
-async def _load_lesson_conjugation(db: AsyncSession, user_id: UUID, level: str) -> list:
-    """Extract conjugation entries from the user's completed lessons.
-
-    Returns a flat list of conjugation dicts, each with verb, verb_arabic,
-    english, and tense dicts (present, past, future, negative) mapping
-    pronouns to conjugated forms.
-    """
-    result = await db.execute(
-        select(Lesson.content_json)
-        .join(UserProgress, UserProgress.lesson_id == Lesson.id)
-        .where(
-            UserProgress.user_id == user_id, Lesson.level == level, Lesson.order < 999
-        )
-    )
-    conjugations = []
-    for (cj,) in result.all():
-        if not cj:
-            continue
-        for item in cj.get("conjugation", []):
-            if item.get("verb") and item.get("present"):
-                conjugations.append(item)
-    return conjugations
-
-
-def _build_conjugation_quiz_config(conjugations: list, count: int = 4) -> dict:
+def _build_conjugation_quiz_config(
+    conjugations: ConjugationSet, count: int = 4
+) -> dict:
     """Build a Multiple-Choice conjugation quiz.
 
     Shows a verb + pronoun + tense and asks the user to pick the correct
     conjugated form from 4 options.
     """
-    if not conjugations:
+    if len(conjugations) < 4:
         return {}
 
-    # Collect all available (verb, tense, pronoun) combinations
-    candidates = []
-    for conj in conjugations:
-        for tense in ["present", "past", "future", "negative"]:
-            forms = conj.get(tense)
-            if not forms:
-                continue
-            for pronoun, form in forms.items():
-                if form:
-                    candidates.append(
-                        {
-                            "verb": conj["verb"],
-                            "verb_arabic": conj.get("verb_arabic", ""),
-                            "english": conj.get("english", ""),
-                            "tense": tense,
-                            "pronoun": pronoun,
-                            "correct_form": form,
-                        }
-                    )
-
-    if len(candidates) < 4:
-        return {}
-
-    sample = random.sample(candidates, min(count, len(candidates)))
-
-    # Collect all forms for distractor generation
-    all_forms = list({c["correct_form"] for c in candidates})
-
     questions = []
-    for item in sample:
-        pronoun_label = PRONOUN_LABELS.get(item["pronoun"], item["pronoun"])
-        tense_label = TENSE_LABELS.get(item["tense"], item["tense"])
+    for table, cell_idx in conjugations.sample(count):
+        item = table.cell(cell_idx)
+        pronoun_label = PRONOUN_LABELS.get(item.pronoun, item.pronoun)
+        tense_label = TENSE_LABELS.get(item.tense, item.tense)
 
-        # Build distractors from other forms (excluding the correct one)
-        distractors = [f for f in all_forms if f != item["correct_form"]]
-        distractor_sample = random.sample(distractors, min(3, len(distractors)))
+        # Distractors: other forms from any verb (excluding the correct one)
+        distractor_sample = conjugations.random_forms(3, exclude={item.form})
 
-        options = [{"arabic": "", "latin": item["correct_form"], "correct": True}]
+        options = [{"arabic": "", "latin": item.form, "correct": True}]
         for d in distractor_sample:
             options.append({"arabic": "", "latin": d, "correct": False})
         random.shuffle(options)
@@ -961,10 +976,10 @@ def _build_conjugation_quiz_config(conjugations: list, count: int = 4) -> dict:
         questions.append(
             {
                 "english": (
-                    f"Conjugate '{item['verb']}' ({item['english']}) — "
-                    f"{item['pronoun']} ({pronoun_label}), {tense_label} tense"
+                    f"Conjugate '{item.verb}' ({item.english}) — "
+                    f"{item.pronoun} ({pronoun_label}), {tense_label} tense"
                 ),
-                "question": {"arabic": item["verb_arabic"], "latin": item["verb"]},
+                "question": {"arabic": item.verb_arabic, "latin": item.verb},
                 "options": options,
             }
         )
@@ -972,71 +987,43 @@ def _build_conjugation_quiz_config(conjugations: list, count: int = 4) -> dict:
     return {"questions": questions}
 
 
-def _build_conjugation_fill_config(conjugations: list, count: int = 3) -> dict:
+def _build_conjugation_fill_config(
+    conjugations: ConjugationSet, count: int = 3
+) -> dict:
     """Build a Fill-In-The-Blank conjugation game.
 
     Shows a sentence template with a blank for the conjugated form
     and asks the user to pick the correct option.
     """
-    if not conjugations:
+    if len(conjugations) < 3:
         return {}
 
-    # Collect all available (verb, tense, pronoun) combinations
-    candidates = []
-    for conj in conjugations:
-        for tense in ["present", "past", "future", "negative"]:
-            forms = conj.get(tense)
-            if not forms:
-                continue
-            for pronoun, form in forms.items():
-                if form:
-                    candidates.append(
-                        {
-                            "verb": conj["verb"],
-                            "verb_arabic": conj.get("verb_arabic", ""),
-                            "english": conj.get("english", ""),
-                            "tense": tense,
-                            "pronoun": pronoun,
-                            "correct_form": form,
-                            "all_forms": forms,
-                        }
-                    )
-
-    if len(candidates) < 3:
-        return {}
-
-    sample = random.sample(candidates, min(count, len(candidates)))
-
     questions = []
-    for item in sample:
-        pronoun_label = PRONOUN_LABELS.get(item["pronoun"], item["pronoun"])
-        tense_label = TENSE_LABELS.get(item["tense"], item["tense"])
-        correct = {"arabic": "", "latin": item["correct_form"]}
+    for table, cell_idx in conjugations.sample(count):
+        item = table.cell(cell_idx)
+        pronoun_label = PRONOUN_LABELS.get(item.pronoun, item.pronoun)
+        tense_label = TENSE_LABELS.get(item.tense, item.tense)
+        correct = {"arabic": "", "latin": item.form}
 
         # Distractors: other pronoun forms of the same verb+tense
-        distractors = [
-            {"arabic": "", "latin": f}
-            for p, f in item["all_forms"].items()
-            if p != item["pronoun"] and f != item["correct_form"]
-        ]
+        same_verb = list(dict.fromkeys(table.group_forms(cell_idx)))
+        if item.form in same_verb:
+            same_verb.remove(item.form)
+        distractor_sample = random.sample(same_verb, min(3, len(same_verb)))
         # If not enough same-verb distractors, pull from other verbs
-        if len(distractors) < 3:
-            extra = [
-                {"arabic": "", "latin": c["correct_form"]}
-                for c in candidates
-                if c["correct_form"] != item["correct_form"]
-                and c["correct_form"] not in [d["latin"] for d in distractors]
-            ]
-            distractors.extend(extra)
-        distractor_sample = random.sample(distractors, min(3, len(distractors)))
+        if len(distractor_sample) < 3:
+            distractor_sample.extend(
+                conjugations.random_forms(
+                    3 - len(distractor_sample),
+                    exclude={item.form, *distractor_sample},
+                )
+            )
 
         options = [
             {"arabic": correct["arabic"], "latin": correct["latin"], "correct": True}
         ]
         for d in distractor_sample:
-            options.append(
-                {"arabic": d["arabic"], "latin": d["latin"], "correct": False}
-            )
+            options.append({"arabic": "", "latin": d, "correct": False})
         random.shuffle(options)
         for j, opt in enumerate(options):
             opt["id"] = chr(97 + j)
@@ -1044,13 +1031,13 @@ def _build_conjugation_fill_config(conjugations: list, count: int = 3) -> dict:
         questions.append(
             {
                 "sentence_arabic": "",
-                "sentence_latin": f"{item['pronoun']} ___ ({item['verb']}, {tense_label})",
+                "sentence_latin": f"{item.pronoun} ___ ({item.verb}, {tense_label})",
                 "english": (
                     f"{pronoun_label} — {tense_label} tense of "
-                    f"'{item['verb']}' ({item['english']})"
+                    f"'{item.verb}' ({item.english})"
                 ),
                 "answer": correct,
-                "hint": f"Think about how '{item['verb']}' changes for {item['pronoun']} in the {tense_label}",
+                "hint": f"Think about how '{item.verb}' changes for {item.pronoun} in the {tense_label}",
                 "options": options,
             }
         )
@@ -1058,29 +1045,39 @@ def _build_conjugation_fill_config(conjugations: list, count: int = 3) -> dict:
     return {"questions": questions}
 
 
-async def generate_session(db: AsyncSession, user_id: UUID, level: str) -> List[dict]:
-    """Generate a daily game session prioritising the user's weak areas.
+@dataclass
+class SessionContent:
+    """Game content and distractor pools for one learner's progress.
 
-    Games are scoped to the user's CEFR level and draw content only from
-    modules/lessons the user has already completed, so vocabulary always
-    reinforces prior learning.  Difficulty (number of items per game)
-    scales with the CEFR level.
-
-    A session contains SESSION_SIZE games chosen from a larger pool:
-    core games (word_match, conversation) always appear, and the
-    remaining slots are filled with weakness-targeted or random games.
+    Built once per (level, completed lessons) combination and cached on the
+    curriculum index, so repeated sessions only sample from it.
     """
-    weaknesses = await get_weaknesses(db, user_id)
 
-    # Determine which modules the user has completed at this level
-    completed_modules = await _get_completed_modules(db, user_id, level)
+    word_match: list
+    fill_blanks: list
+    cultural_quiz: list
+    conjugations: ConjugationSet
+    fill_answers: DistractorPool
+    quiz_answers: DistractorPool
+    english: DistractorPool
+    darija: DistractorPool
+
+    @property
+    def vocab(self) -> list:
+        """Vocabulary for vocab-based games (word_match merged with lessons)."""
+        return self.word_match
 
-    # Load game_content scoped to completed modules
-    content = await _load_game_content(db, level, completed_modules or None)
+
+def _build_session_content(
+    index: CurriculumIndex, level: str, lesson_ids: FrozenSet[UUID]
+) -> SessionContent:
+    # Game content scoped to completed modules
+    completed_modules = index.completed_modules(level, lesson_ids)
+    content = index.game_content(level, completed_modules or None)
 
     # Also extract vocabulary directly from completed lessons to enrich
     # word_match content with words the user actually studied
-    lesson_vocab = await _load_lesson_vocabulary(db, user_id, level)
+    lesson_vocab = index.vocabulary(level, lesson_ids)
     if lesson_vocab:
         # Merge lesson vocabulary into word_match pool (deduplicate)
         existing = {
@@ -1093,11 +1090,48 @@ async def generate_session(db: AsyncSession, user_id: UUID, level: str) -> List[
                 content["word_match"].append(v)
                 existing.add(key)
 
-    # Combine all vocabulary sources for vocab-based games
-    all_vocab = list(content["word_match"])  # already merged with lesson_vocab
+    vocab = content["word_match"]
+    return SessionContent(
+        word_match=vocab,
+        fill_blanks=content["fill_blanks"],
+        cultural_quiz=content["cultural_quiz"],
+        # Conjugation data from completed lessons for conjugation games
+        conjugations=index.conjugations(level, lesson_ids),
+        fill_answers=_fill_answer_pool(content["fill_blanks"]),
+        quiz_answers=_quiz_answer_pool(content["cultural_quiz"]),
+        english=_english_pool(vocab),
+        darija=_darija_pool(vocab),
+    )
+
+
+def get_session_content(
+    index: CurriculumIndex, snapshot: UserLearningSnapshot
+) -> SessionContent:
+    """Return the (cached) session content for *snapshot*'s progress."""
+    lesson_ids = index.lesson_ids_at(snapshot.level, snapshot.completed_lesson_ids)
+    return index.cached(
+        ("session_content", snapshot.level, lesson_ids),
+        lambda: _build_session_content(index, snapshot.level, lesson_ids),
+    )
+
 
-    # Load conjugation data from completed lessons for conjugation games
-    lesson_conjugation = await _load_lesson_conjugation(db, user_id, level)
+async def generate_session(db: AsyncSession, user_id: UUID, level: str) -> List[dict]:
+    """Generate a daily game session prioritising the user's weak areas.
+
+    Games are scoped to the user's CEFR level and draw content only from
+    modules/lessons the user has already completed, so vocabulary always
+    reinforces prior learning.  Difficulty (number of items per game)
+    scales with the CEFR level.
+
+    A session contains SESSION_SIZE games chosen from a larger pool:
+    core games (word_match, conversation) always appear, and the
+    remaining slots are filled with weakness-targeted or random games.
+    """
+    # Curriculum content comes from the in-process compiled index; the only
+    # database read is the learner snapshot
+    index = await get_curriculum_index(db)
+    snapshot = await load_learning_snapshot(db, user_id, level, index)
+    content = get_session_content(index, snapshot)
 
     difficulty = LEVEL_DIFFICULTY.get(level, DEFAULT_DIFFICULTY)
 
@@ -1117,19 +1151,12 @@ async def generate_session(db: AsyncSession, user_id: UUID, level: str) -> List[
     # 1. Add core games that always appear
     for g in GAME_TYPES:
         if g["game_type"] in CORE_GAME_TYPES:
-            config = _build_game_config(
-                g["game_type"],
-                content,
-                level,
-                difficulty,
-                all_vocab,
-                lesson_conjugation,
-            )
+            config = _build_game_config(g["game_type"], content, level, difficulty)
             session_games.append({**g, "config": config})
             used_types.add(g["game_type"])
 
     # 2. Add weakness-targeted games
-    for w in weaknesses[:2]:
+    for w in snapshot.weaknesses[:2]:
         if len(session_games) >= SESSION_SIZE:
             break
         game_type = skill_to_game.get(w.skill_area)
@@ -1138,9 +1165,7 @@ async def generate_session(db: AsyncSession, user_id: UUID, level: str) -> List[
                 (g for g in GAME_TYPES if g["game_type"] == game_type), None
             )
             if game_def:
-                config = _build_game_config(
-                    game_type, content, level, difficulty, all_vocab, lesson_conjugation
-                )
+                config = _build_game_config(game_type, content, level, difficulty)
                 session_games.append({**game_def, "config": config})
                 used_types.add(game_type)
 
@@ -1150,9 +1175,7 @@ async def generate_session(db: AsyncSession, user_id: UUID, level: str) -> List[
     for g in remaining:
         if len(session_games) >= SESSION_SIZE:
             break
-        config = _build_game_config(
-            g["game_type"], content, level, difficulty, all_vocab, lesson_conjugation
-        )
+        config = _build_game_config(g["game_type"], content, level, difficulty)
         session_games.append({**g, "config": config})
         used_types.add(g["game_type"])
 
@@ -1188,55 +1211,67 @@ def _build_conversation_config(level: str) -> dict:
 
 def _build_game_config(
     game_type: str,
-    content: dict,
+    content: SessionContent,
     level: str,
     difficulty: dict | None = None,
-    vocab: list | None = None,
-    conjugations: list | None = None,
 ) -> dict:
     """Build the config dict for a specific game type with real content.
 
     The *difficulty* dict controls how many items each game contains,
-    scaling with the user's CEFR level.  *vocab* is a flat list of
-    vocabulary dicts used by vocab-based game types (listening,
-    translation, memory_match, word_scramble, flashcard_sprint).
-    *conjugations* is a flat list of conjugation dicts from completed
-    lessons, used by conjugation_quiz and conjugation_fill games.
+    scaling with the user's CEFR level; ``distractor_similarity`` how
+    similar the distractors are.
+    *content* carries the learner's game content, vocabulary (used by
+    listening, translation, memory_match, word_scramble, flashcard_sprint),
+    conjugation tables and the precomputed distractor pools.
     """
     if difficulty is None:
         difficulty = LEVEL_DIFFICULTY.get(level, DEFAULT_DIFFICULTY)
-    if vocab is None:
-        vocab = []
-    if conjugations is None:
-        conjugations = []
+    similarity = distractor_similarity(level)
+    vocab = content.vocab
+    conjugations = content.conjugations
 
     base = {"level": level}
 
-    if game_type == "word_match" and content["word_match"]:
+    if game_type == "word_match" and content.word_match:
         base.update(
             _build_word_match_config(
-                content["word_match"], count=difficulty["word_match_count"]
+                content.word_match, count=difficulty["word_match_count"]
             )
         )
-    elif game_type == "fill_blank" and content["fill_blanks"]:
+    elif game_type == "fill_blank" and content.fill_blanks:
         base.update(
             _build_fill_blank_config(
-                content["fill_blanks"], count=difficulty["fill_blank_count"]
+                content.fill_blanks,
+                count=difficulty["fill_blank_count"],
+                answers=content.fill_answers,
+                similarity=similarity,
             )
         )
-    elif game_type == "cultural_quiz" and content["cultural_quiz"]:
+    elif game_type == "cultural_quiz" and content.cultural_quiz:
         base.update(
             _build_cultural_quiz_config(
-                content["cultural_quiz"], count=difficulty["cultural_quiz_count"]
+                content.cultural_quiz,
+                count=difficulty["cultural_quiz_count"],
+                answers=content.quiz_answers,
             )
         )
     elif game_type == "listening" and vocab:
         base.update(
-            _build_listening_config(vocab, count=difficulty["word_match_count"])
+            _build_listening_config(
+                vocab,
+                count=difficulty["word_match_count"],
+                answers=content.english,
+                similarity=similarity,
+            )
         )
     elif game_type == "translation" and vocab:
         base.update(
-            _build_translation_config(vocab, count=difficulty["fill_blank_count"])
+            _build_translation_config(
+                vocab,
+                count=difficulty["fill_blank_count"],
+                answers=content.darija,
+                similarity=similarity,
+            )
         )
     elif game_type == "memory_match" and vocab:
         base.update(_build_memory_match_config(vocab, count=5))
@@ -0,0 +1,246 @@
+"""Admission control for AI model calls.
+
+Three layers keep a burst of conversation turns (a class starting the same
+scenario together) from turning into Bedrock throttling errors:
+
+- ``SingleFlight`` coalesces identical in-flight requests: followers wait
+  for the leader's reply instead of calling the model again.
+- ``AdmissionGate`` caps concurrent model calls per worker at
+  ``BEDROCK_MAX_CONCURRENCY``; further calls queue (at most ``AI_MAX_QUEUE``
+  of them, for at most ``AI_QUEUE_TIMEOUT_SECONDS``) and record how long
+  they waited.
+- ``TokenBucketLimiter`` limits each user's ``/api/ai/*`` turns that reach
+  the model to ``AI_RATE_LIMIT_PER_MINUTE`` with bursts of
+  ``AI_RATE_LIMIT_BURST``; conversation-tree and cached replies are free.
+
+Throttled calls are retried by ``app.services.claude`` with
+``retry_delay``'s jittered exponential backoff.  ``metrics()`` reports the
+state of every layer.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# Longest backoff between two attempts, in seconds
+MAX_RETRY_DELAY = 8.0
+
+# Recent queue waits kept for the percentiles in metrics()
+WAIT_SAMPLES = 1000
+
+# Users whose rate-limit buckets are tracked at once
+RATE_LIMIT_MAX_USERS = 100000
+
+
+class Overloaded(Exception):
+    """The model call queue is full or the wait for a slot timed out."""
+
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait before retry number *attempt* (1-based), full jitter."""
+    ceiling = settings.AI_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1)
+    return random.uniform(0, min(ceiling, MAX_RETRY_DELAY))
+
+
+class AdmissionGate:
+    """Semaphore with a bounded, measured queue."""
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waits: deque = deque(maxlen=WAIT_SAMPLES)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one model-call slot; raises ``Overloaded`` if none frees up."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("AI request queue is full")
+
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded("Timed out waiting for an AI request slot") from None
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        self._waits.append(waited)
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        p50 = p95 = 0.0
+        if len(waits) >= 2:
+            q = statistics.quantiles(waits, n=20, method="inclusive")
+            p50, p95 = q[9], q[18]
+        elif waits:
+            p50 = p95 = waits[0]
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds_p50": round(p50, 4),
+            "wait_seconds_p95": round(p95, 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Return ``(result, leader)``; *leader* is False for shared results.
+
+        The call is shielded, so a caller going away does not cancel it for
+        the others.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future), False
+
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+        self.calls += 1
+        return await asyncio.shield(future), True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets refilled at *rate_per_minute*, holding *burst*."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        # A bucket left alone until it is full again can simply be forgotten
+        self._buckets = TTLCache(
+            maxsize=RATE_LIMIT_MAX_USERS, ttl=burst / self.rate if self.rate else 0
+        )
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key: Hashable) -> float:
+        """Take a token for *key*; return 0, or the seconds until one is due."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            self.limited += 1
+            return (1 - tokens) / self.rate
+        self._buckets.set(key, (tokens - 1, now))
+        self.allowed += 1
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "per_minute": self.rate * 60,
+            "burst": self.burst,
+            "users": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Process-wide instances
+# ---------------------------------------------------------------------------
+
+_gate: Optional[AdmissionGate] = None
+_flights: Optional[SingleFlight] = None
+_limiter: Optional[TokenBucketLimiter] = None
+_retries = 0
+
+
+def get_gate() -> AdmissionGate:
+    global _gate
+    if _gate is None:
+        _gate = AdmissionGate(
+            settings.BEDROCK_MAX_CONCURRENCY,
+            settings.AI_MAX_QUEUE,
+            settings.AI_QUEUE_TIMEOUT_SECONDS,
+        )
+    return _gate
+
+
+def get_flights() -> SingleFlight:
+    global _flights
+    if _flights is None:
+        _flights = SingleFlight()
+    return _flights
+
+
+def get_rate_limiter() -> TokenBucketLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucketLimiter(
+            settings.AI_RATE_LIMIT_PER_MINUTE, settings.AI_RATE_LIMIT_BURST
+        )
+    return _limiter
+
+
+def record_retry() -> None:
+    global _retries
+    _retries += 1
+
+
+def metrics() -> Dict[str, Any]:
+    return {
+        "admission": get_gate().stats(),
+        "coalescing": get_flights().stats(),
+        "rate_limit": get_rate_limiter().stats(),
+        "retries": _retries,
+    }
+
+
+def reset() -> None:
+    """Drop all state (used by tests; asyncio primitives are loop-bound)."""
+    global _gate, _flights, _limiter, _retries
+    _gate = _flights = _limiter = None
+    _retries = 0
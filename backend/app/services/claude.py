@@ -1,14 +1,38 @@
-"""Claude Haiku proxy for Darija conversation practice via AWS Bedrock."""
+"""Claude Haiku proxy for Darija conversation practice via AWS Bedrock.
 
-import json
-from typing import Any, Dict, List, Optional
+Model calls go through the provider selected by ``LLM_PROVIDER`` (see
+``app.services.llm``).
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-import boto3
 from botocore.exceptions import ClientError
 
 from app.core.config import settings
+from app.services import admission, response_cache, response_parser
+from app.services.history import compact_history
+from app.services.llm import LLMProvider, Usage, get_llm_provider, new_usage
+from app.services.response_parser import (
+    IncrementalFieldParser,
+    ReplyParseError,
+    parse_reply,
+)
+
+logger = logging.getLogger(__name__)
 
-MODEL_ID = "arn:aws:bedrock:eu-west-3:557720455286:inference-profile/eu.anthropic.claude-haiku-4-5-20251001-v1:0"
+# Reply fields sent to streaming clients as soon as each one is complete
+STREAMED_FIELDS = ("arabic", "latin", "english")
+
+# Conversation kinds: scenario practice (games) and the open conversation
+# page, with the longest reply each may generate
+CONVERSATION_KINDS = ("scenario", "open")
+MAX_TOKENS = {"scenario": 512, "open": 300}
+
+# Bump when a prompt's wording or response format changes, so parse failure
+# counts (``response_parser.stats()``) can be compared between versions
+PROMPT_VERSIONS = {"scenario": "scenario-1", "open": "open-1"}
 
 BASE_SYSTEM_PROMPT = """\
 You are a friendly Moroccan conversation partner helping a language learner practice real everyday Darija.
@@ -63,9 +87,303 @@ You MUST respond with valid JSON only, no other text:
 """
 
 
-def _get_bedrock_client():
-    """Create a Bedrock Runtime client for the configured AWS region."""
-    return boto3.client("bedrock-runtime", region_name=settings.AWS_REGION)
+# ---------------------------------------------------------------------------
+# Model calls
+# ---------------------------------------------------------------------------
+
+
+async def _retry_wait(provider: LLMProvider, exc: Exception, attempt: int) -> None:
+    """Sleep before retry *attempt*, or re-raise *exc* if it should not retry."""
+    if attempt >= settings.AI_MAX_ATTEMPTS or not provider.is_retryable(exc):
+        raise exc
+    admission.record_retry()
+    await asyncio.sleep(admission.retry_delay(attempt))
+
+
+async def _invoke_model(request: Dict[str, Any]) -> Tuple[str, Usage]:
+    """Send *request* to the LLM provider once admitted.
+
+    Throttling and transient errors are retried with jittered backoff.
+    Returns the reply text and the token usage reported by the provider.
+    """
+    provider = get_llm_provider()
+    attempt = 1
+    while True:
+        try:
+            async with admission.get_gate().slot():
+                return await provider.complete(request)
+        except admission.Overloaded:
+            raise
+        except Exception as exc:
+            await _retry_wait(provider, exc, attempt)
+        attempt += 1
+
+
+async def _stream_model(request: Dict[str, Any], usage: Usage) -> AsyncIterator[str]:
+    """Yield the reply's text deltas once admitted, like ``_invoke_model``.
+
+    A failed call is only retried if no text has been yielded yet.
+    """
+    provider = get_llm_provider()
+    attempt = 1
+    while True:
+        started = False
+        try:
+            async with admission.get_gate().slot():
+                async for text in provider.stream(request, usage):
+                    started = True
+                    yield text
+            return
+        except admission.Overloaded:
+            raise
+        except Exception as exc:
+            if started:
+                raise
+            await _retry_wait(provider, exc, attempt)
+        attempt += 1
+
+
+def _request_body(
+    system_prompt: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    max_tokens: int,
+) -> Dict[str, Any]:
+    """Build the Messages API request with a token-budgeted history.
+
+    The static system prompt is its own block, marked for prompt caching;
+    the summary of older turns (if any) follows it in a second block.
+    """
+    history = compact_history(
+        conversation_history,
+        user_message,
+        keep_turns=settings.AI_HISTORY_KEEP_TURNS,
+        token_budget=settings.AI_HISTORY_TOKEN_BUDGET,
+    )
+    messages = history.messages + [{"role": "user", "content": user_message}]
+
+    static_block: Dict[str, Any] = {"type": "text", "text": system_prompt}
+    if settings.AI_PROMPT_CACHING:
+        static_block["cache_control"] = {"type": "ephemeral"}
+    system = [static_block]
+    if history.summary:
+        system.append({"type": "text", "text": history.summary})
+
+    return {"max_tokens": max_tokens, "system": system, "messages": messages}
+
+
+def _log_usage(usage: Usage) -> None:
+    logger.info(
+        "LLM turn: %d tokens in (%d cache read, %d cache write), %d out",
+        usage["input_tokens"],
+        usage["cache_read_input_tokens"],
+        usage["cache_creation_input_tokens"],
+        usage["output_tokens"],
+    )
+
+
+def _parse_reply(assistant_text: str, prompt_version: str) -> Dict[str, Any]:
+    """Parse Claude's structured JSON reply (raises ``ReplyParseError``).
+
+    The outcome is counted per model and *prompt_version*.
+    """
+    model = get_llm_provider().model
+    try:
+        reply = parse_reply(assistant_text)
+    except ReplyParseError as exc:
+        response_parser.record_outcome(model, prompt_version, exc)
+        logger.warning(
+            "Unparseable reply from %s (prompt %s): %s: %.200r",
+            model,
+            prompt_version,
+            exc,
+            assistant_text,
+        )
+        raise
+    response_parser.record_outcome(model, prompt_version)
+    return reply
+
+
+def _error_reply(exc: Exception, assistant_text: str) -> Dict[str, Any]:
+    """Fallback reply for a failed turn, with the reason in ``error``."""
+    if isinstance(exc, ReplyParseError):
+        # Claude did not return a usable reply — wrap it as a plain response
+        return {
+            "arabic": "",
+            "latin": assistant_text,
+            "english": "",
+            "correction": None,
+            "suggestions": [],
+            "error": f"Failed to parse AI response: {exc}",
+            "usage": None,
+        }
+    if isinstance(exc, admission.Overloaded):
+        return {
+            "arabic": "",
+            "latin": "Smeh liya, kayn bzaf d nnas daba. 3awd jerreb mn ba3d.",
+            "english": "Sorry, it's very busy right now. Please try again shortly.",
+            "correction": None,
+            "suggestions": [],
+            "error": f"AI service busy: {exc}",
+            "usage": None,
+        }
+    if isinstance(exc, ClientError):
+        error_code = exc.response["Error"]["Code"]
+        error_msg = exc.response["Error"]["Message"]
+        return {
+            "arabic": "",
+            "latin": "Smeh liya, kayn mouchkil tekni.",
+            "english": "Sorry, there is a technical problem.",
+            "correction": None,
+            "suggestions": [],
+            "error": f"Bedrock error ({error_code}): {error_msg}",
+            "usage": None,
+        }
+    return {
+        "arabic": "",
+        "latin": "Smeh liya, kayn mouchkil.",
+        "english": "Sorry, something went wrong.",
+        "correction": None,
+        "suggestions": [],
+        "error": str(exc),
+        "usage": None,
+    }
+
+
+def cached_reply(
+    system_prompt: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    level: str,
+) -> Optional[Dict[str, Any]]:
+    """Return the cached reply to this turn, or None."""
+    key = response_cache.cache_key(
+        system_prompt, conversation_history, user_message, level
+    )
+    return None if key is None else response_cache.get(key)
+
+
+async def converse(
+    system_prompt: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    max_tokens: int,
+    level: str,
+    prompt_version: str,
+    check_cache: bool = True,
+) -> Dict[str, Any]:
+    """Send one conversation turn and parse Claude's structured JSON reply.
+
+    Repeated early turns are answered from ``response_cache`` without
+    calling the model (unless *check_cache* is false because the caller
+    looked already), and identical turns already in flight share one call
+    (the shared copies report no ``usage``).  Errors are returned in the
+    ``error`` field with a fallback message rather than raised.
+    """
+    key = response_cache.cache_key(
+        system_prompt, conversation_history, user_message, level
+    )
+    if key is not None and check_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    async def call() -> Dict[str, Any]:
+        request = _request_body(
+            system_prompt, conversation_history, user_message, max_tokens
+        )
+        assistant_text = ""
+        usage = None
+        try:
+            assistant_text, usage = await _invoke_model(request)
+            reply = _parse_reply(assistant_text, prompt_version)
+        except Exception as exc:
+            reply = _error_reply(exc, assistant_text)
+        else:
+            if key is not None:
+                response_cache.put(key, reply)
+            reply["usage"] = usage
+        # Tokens spent on an unparseable reply are logged, not reported
+        if usage is not None:
+            _log_usage(usage)
+        return reply
+
+    flight_key = (
+        response_cache.content_key(
+            system_prompt, conversation_history, user_message, level
+        ),
+        max_tokens,
+    )
+    reply, leader = await admission.get_flights().run(flight_key, call)
+    reply = dict(reply)
+    if not leader:
+        reply["usage"] = None
+    return reply
+
+
+async def replay_reply(
+    reply: Dict[str, Any],
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Yield a complete *reply* as the events of ``stream_converse``."""
+    for name in STREAMED_FIELDS:
+        yield "field", {"name": name, "value": reply[name]}
+    yield "done", reply
+
+
+async def stream_converse(
+    system_prompt: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    max_tokens: int,
+    level: str,
+    prompt_version: str,
+    check_cache: bool = True,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Streaming variant of ``converse`` yielding ``(event, data)`` pairs.
+
+    ``("field", {"name", "value"})`` is yielded as soon as each of
+    ``STREAMED_FIELDS`` is complete in the partial reply, then a single
+    ``("done", reply)`` with the full parsed reply (or the error fallback).
+    A cached reply is replayed as the same events.  Unlike ``converse``,
+    identical turns in flight are not coalesced: each stream calls the
+    model.
+    """
+    key = response_cache.cache_key(
+        system_prompt, conversation_history, user_message, level
+    )
+    cached = None if key is None or not check_cache else response_cache.get(key)
+    if cached is not None:
+        async for event in replay_reply(cached):
+            yield event
+        return
+
+    request = _request_body(
+        system_prompt, conversation_history, user_message, max_tokens
+    )
+
+    parser = IncrementalFieldParser(STREAMED_FIELDS)
+    parts: List[str] = []
+    usage = new_usage()
+    try:
+        async for delta in _stream_model(request, usage):
+            parts.append(delta)
+            for name, value in parser.feed(delta):
+                yield "field", {"name": name, "value": value}
+        reply = _parse_reply("".join(parts), prompt_version)
+    except Exception as exc:
+        reply = _error_reply(exc, "".join(parts))
+    else:
+        if key is not None:
+            response_cache.put(key, reply)
+        reply["usage"] = usage
+    if parts:
+        _log_usage(usage)
+    yield "done", reply
+
+
+# ---------------------------------------------------------------------------
+# Scenario conversation (games)
+# ---------------------------------------------------------------------------
 
 
 def _build_system_prompt(level: str, scenario: Optional[Dict[str, Any]] = None) -> str:
@@ -89,6 +407,7 @@ async def generate_conversation_response(
     conversation_history: List[Dict[str, str]],
     user_message: str,
     scenario: Optional[Dict[str, Any]] = None,
+    check_cache: bool = True,
 ) -> Dict[str, Any]:
     """Send a conversation turn to Claude Haiku via AWS Bedrock.
 
@@ -102,6 +421,8 @@ async def generate_conversation_response(
         The latest message from the learner.
     scenario : dict, optional
         Scenario data with context, target_vocabulary, scenario_prompt.
+    check_cache : bool
+        False if the caller already looked in the response cache.
 
     Returns
     -------
@@ -109,92 +430,49 @@ async def generate_conversation_response(
         Structured response with arabic, latin, english, correction, suggestions.
     """
     system_prompt = _build_system_prompt(user_level, scenario)
-
-    # Build the messages list
-    messages: List[Dict[str, str]] = []
-    for turn in conversation_history:
-        messages.append({"role": turn["role"], "content": turn["content"]})
-    messages.append({"role": "user", "content": user_message})
-
-    body = json.dumps(
-        {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 512,
-            "system": system_prompt,
-            "messages": messages,
-        }
+    return await converse(
+        system_prompt,
+        conversation_history,
+        user_message,
+        max_tokens=MAX_TOKENS["scenario"],
+        level=user_level,
+        prompt_version=PROMPT_VERSIONS["scenario"],
+        check_cache=check_cache,
     )
 
-    assistant_text = ""
-    try:
-        client = _get_bedrock_client()
-        response = client.invoke_model(
-            modelId=MODEL_ID,
-            contentType="application/json",
-            accept="application/json",
-            body=body,
-        )
 
-        response_body = json.loads(response["body"].read())
-        assistant_text = response_body["content"][0]["text"]
-
-        # Strip markdown code fences if present (e.g. ```json ... ```)
-        cleaned = assistant_text.strip()
-        if cleaned.startswith("```"):
-            # Remove opening fence (```json or ```)
-            cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else cleaned[3:]
-            # Remove closing fence
-            if cleaned.rstrip().endswith("```"):
-                cleaned = cleaned.rstrip()[:-3].rstrip()
-
-        # Parse the structured JSON response from Claude
-        parsed = json.loads(cleaned)
-
-        return {
-            "arabic": parsed.get("arabic", ""),
-            "latin": parsed.get("latin", ""),
-            "english": parsed.get("english", ""),
-            "correction": parsed.get("correction"),
-            "suggestions": parsed.get("suggestions", []),
-            "error": None,
-        }
+async def stream_conversation_response(
+    user_level: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    scenario: Optional[Dict[str, Any]] = None,
+    check_cache: bool = True,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Streaming variant of ``generate_conversation_response``.
 
-    except json.JSONDecodeError:
-        # Claude returned non-JSON — wrap it as a plain response
-        return {
-            "arabic": "",
-            "latin": assistant_text,
-            "english": "",
-            "correction": None,
-            "suggestions": [],
-            "error": "Failed to parse AI response as JSON",
-        }
-    except ClientError as exc:
-        error_code = exc.response["Error"]["Code"]
-        error_msg = exc.response["Error"]["Message"]
-        return {
-            "arabic": "",
-            "latin": "Smeh liya, kayn mouchkil tekni.",
-            "english": "Sorry, there is a technical problem.",
-            "correction": None,
-            "suggestions": [],
-            "error": f"Bedrock error ({error_code}): {error_msg}",
-        }
-    except Exception as exc:
-        return {
-            "arabic": "",
-            "latin": "Smeh liya, kayn mouchkil.",
-            "english": "Sorry, something went wrong.",
-            "correction": None,
-            "suggestions": [],
-            "error": str(exc),
-        }
+    Yields ``("field", {"name": ..., "value": ...})`` for arabic, latin and
+    english as each completes, then ``("done", response)`` with the same
+    dict ``generate_conversation_response`` returns.
+    """
+    system_prompt = _build_system_prompt(user_level, scenario)
+    async for event in stream_converse(
+        system_prompt,
+        conversation_history,
+        user_message,
+        max_tokens=MAX_TOKENS["scenario"],
+        level=user_level,
+        prompt_version=PROMPT_VERSIONS["scenario"],
+        check_cache=check_cache,
+    ):
+        yield event
 
 
 # ---------------------------------------------------------------------------
 # Open conversation (standalone page, not a game)
 # ---------------------------------------------------------------------------
 
+DEFAULT_OPEN_TOPIC = "General everyday conversation"
+
 OPEN_CONVO_SYSTEM_PROMPT = """\
 You are a friendly Moroccan person having a casual everyday conversation with someone \
 who is learning Darija. You are role-playing an imagined real-life situation.
@@ -243,6 +521,7 @@ async def generate_open_conversation(
     conversation_history: List[Dict[str, str]],
     user_message: str,
     topic: str,
+    check_cache: bool = True,
 ) -> Dict[str, Any]:
     """Send an open conversation turn to Claude via AWS Bedrock.
 
@@ -250,77 +529,50 @@ async def generate_open_conversation(
     focused on casual everyday chat with no game mechanics.
     """
     system_prompt = OPEN_CONVO_SYSTEM_PROMPT.format(topic=topic, level=user_level)
-
-    messages: List[Dict[str, str]] = []
-    for turn in conversation_history:
-        messages.append({"role": turn["role"], "content": turn["content"]})
-    messages.append({"role": "user", "content": user_message})
-
-    body = json.dumps(
-        {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 300,
-            "system": system_prompt,
-            "messages": messages,
-        }
+    return await converse(
+        system_prompt,
+        conversation_history,
+        user_message,
+        max_tokens=MAX_TOKENS["open"],
+        level=user_level,
+        prompt_version=PROMPT_VERSIONS["open"],
+        check_cache=check_cache,
     )
 
-    assistant_text = ""
-    try:
-        client = _get_bedrock_client()
-        response = client.invoke_model(
-            modelId=MODEL_ID,
-            contentType="application/json",
-            accept="application/json",
-            body=body,
-        )
-
-        response_body = json.loads(response["body"].read())
-        assistant_text = response_body["content"][0]["text"]
-
-        cleaned = assistant_text.strip()
-        if cleaned.startswith("```"):
-            cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else cleaned[3:]
-            if cleaned.rstrip().endswith("```"):
-                cleaned = cleaned.rstrip()[:-3].rstrip()
-
-        parsed = json.loads(cleaned)
-
-        return {
-            "arabic": parsed.get("arabic", ""),
-            "latin": parsed.get("latin", ""),
-            "english": parsed.get("english", ""),
-            "correction": parsed.get("correction"),
-            "suggestions": parsed.get("suggestions", []),
-            "error": None,
-        }
 
-    except json.JSONDecodeError:
-        return {
-            "arabic": "",
-            "latin": assistant_text,
-            "english": "",
-            "correction": None,
-            "suggestions": [],
-            "error": "Failed to parse AI response as JSON",
-        }
-    except ClientError as exc:
-        error_code = exc.response["Error"]["Code"]
-        error_msg = exc.response["Error"]["Message"]
-        return {
-            "arabic": "",
-            "latin": "Smeh liya, kayn mouchkil tekni.",
-            "english": "Sorry, there is a technical problem.",
-            "correction": None,
-            "suggestions": [],
-            "error": f"Bedrock error ({error_code}): {error_msg}",
-        }
-    except Exception as exc:
-        return {
-            "arabic": "",
-            "latin": "Smeh liya, kayn mouchkil.",
-            "english": "Sorry, something went wrong.",
-            "correction": None,
-            "suggestions": [],
-            "error": str(exc),
-        }
+async def stream_open_conversation(
+    user_level: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    topic: str,
+    check_cache: bool = True,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Streaming variant of ``generate_open_conversation`` (see
+    ``stream_conversation_response`` for the events)."""
+    system_prompt = OPEN_CONVO_SYSTEM_PROMPT.format(topic=topic, level=user_level)
+    async for event in stream_converse(
+        system_prompt,
+        conversation_history,
+        user_message,
+        max_tokens=MAX_TOKENS["open"],
+        level=user_level,
+        prompt_version=PROMPT_VERSIONS["open"],
+        check_cache=check_cache,
+    ):
+        yield event
+
+
+def build_system_prompt(
+    kind: str,
+    level: str,
+    scenario: Optional[Dict[str, Any]] = None,
+    topic: Optional[str] = None,
+) -> str:
+    """Return the system prompt of a *kind* conversation (see CONVERSATION_KINDS)."""
+    if kind == "scenario":
+        return _build_system_prompt(level, scenario)
+    if kind == "open":
+        return OPEN_CONVO_SYSTEM_PROMPT.format(
+            topic=topic or DEFAULT_OPEN_TOPIC, level=level
+        )
+    raise ValueError(f"Unknown conversation kind: {kind}")
@@ -0,0 +1,139 @@
+"""Compiled conjugation tables for the conjugation games.
+
+Each lesson's ``conjugation`` entries (verb -> tense -> pronoun -> form) are
+flattened once, when the curriculum index is built, into parallel integer
+arrays with one slot per (verb, tense, pronoun) cell.  Form and pronoun
+strings are interned per table, and cells of the same verb and tense are
+grouped so that same-verb distractors are a dictionary lookup away.
+
+Session generation then samples questions and distractors in O(count)
+instead of expanding every verb into fresh dicts on each request.
+"""
+
+import bisect
+import random
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.services.distractors import DistractorPool
+
+TENSES = ("present", "past", "future", "negative")
+
+
+class ConjugationCell(NamedTuple):
+    verb: str
+    verb_arabic: str
+    english: str
+    tense: str
+    pronoun: str
+    form: str
+
+
+class ConjugationTable:
+    """Compact verb × tense × pronoun table for a single lesson."""
+
+    def __init__(self, entries: Iterable[dict] = ()):
+        self.verbs: List[Tuple[str, str, str]] = []
+        self.pronouns: List[str] = []
+        self.forms: List[str] = []
+        self.cell_verb = array("i")
+        self.cell_tense = array("b")
+        self.cell_pronoun = array("i")
+        self.cell_form = array("i")
+        # (verb index, tense code) -> cell indices of that form group
+        self.groups: Dict[Tuple[int, int], Tuple[int, ...]] = {}
+
+        pronoun_ids: Dict[str, int] = {}
+        form_ids: Dict[str, int] = {}
+        for entry in entries:
+            if not (entry.get("verb") and entry.get("present")):
+                continue
+            verb_idx = len(self.verbs)
+            self.verbs.append(
+                (entry["verb"], entry.get("verb_arabic", ""), entry.get("english", ""))
+            )
+            for tense_code, tense in enumerate(TENSES):
+                cells = []
+                for pronoun, form in (entry.get(tense) or {}).items():
+                    if not form:
+                        continue
+                    cells.append(len(self.cell_form))
+                    self.cell_verb.append(verb_idx)
+                    self.cell_tense.append(tense_code)
+                    self.cell_pronoun.append(
+                        _intern(pronoun, pronoun_ids, self.pronouns)
+                    )
+                    self.cell_form.append(_intern(form, form_ids, self.forms))
+                if cells:
+                    self.groups[(verb_idx, tense_code)] = tuple(cells)
+
+    def __len__(self) -> int:
+        return len(self.cell_form)
+
+    def form(self, cell: int) -> str:
+        return self.forms[self.cell_form[cell]]
+
+    def cell(self, cell: int) -> ConjugationCell:
+        verb, verb_arabic, english = self.verbs[self.cell_verb[cell]]
+        return ConjugationCell(
+            verb=verb,
+            verb_arabic=verb_arabic,
+            english=english,
+            tense=TENSES[self.cell_tense[cell]],
+            pronoun=self.pronouns[self.cell_pronoun[cell]],
+            form=self.form(cell),
+        )
+
+    def group_forms(self, cell: int) -> List[str]:
+        """Return the forms of the other pronouns for *cell*'s verb and tense."""
+        group = self.groups[(self.cell_verb[cell], self.cell_tense[cell])]
+        return [self.form(c) for c in group if c != cell]
+
+
+def _intern(value: str, ids: Dict[str, int], values: List[str]) -> int:
+    idx = ids.get(value)
+    if idx is None:
+        idx = ids[value] = len(values)
+        values.append(value)
+    return idx
+
+
+class ConjugationSet:
+    """Read-only view over the tables of a learner's completed lessons.
+
+    Cells are addressed by a global index; sampling draws global indices
+    and bisects them back into a (table, cell) pair, so no per-request
+    copy of the underlying tables is made.
+    """
+
+    def __init__(self, tables: Iterable[ConjugationTable] = ()):
+        self.tables = [t for t in tables if len(t)]
+        self._offsets: List[int] = []
+        total = 0
+        for table in self.tables:
+            self._offsets.append(total)
+            total += len(table)
+        self._size = total
+        self._form_pool: Optional[DistractorPool] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _locate(self, idx: int) -> Tuple[ConjugationTable, int]:
+        pos = bisect.bisect_right(self._offsets, idx) - 1
+        return self.tables[pos], idx - self._offsets[pos]
+
+    def sample(self, k: int) -> List[Tuple[ConjugationTable, int]]:
+        """Return *k* distinct random cells (fewer if the set is smaller)."""
+        indices = random.sample(range(self._size), min(k, self._size))
+        return [self._locate(i) for i in indices]
+
+    def form_pool(self) -> DistractorPool:
+        """Return the deduplicated pool of every form in the set (built once)."""
+        if self._form_pool is None:
+            self._form_pool = DistractorPool(f for t in self.tables for f in t.forms)
+        return self._form_pool
+
+    def random_forms(self, k: int, exclude: Set[str]) -> List[str]:
+        """Draw up to *k* distinct forms not in *exclude*."""
+        return self.form_pool().sample(k, exclude=exclude)
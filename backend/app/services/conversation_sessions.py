@@ -0,0 +1,271 @@
+"""Server-side AI conversation sessions.
+
+A session keeps a conversation's history, scenario and system prompt on
+the server, so the client only posts each new message and the session id.
+Only the newest ``AI_SESSION_MAX_TURNS`` turns are stored (older context
+is condensed again per request by ``app.services.history``), while
+``turn_count`` keeps counting every answered message.
+
+``AI_SESSION_BACKEND`` selects where sessions live: ``sql`` (the
+``conversation_sessions`` table, shared by every worker) or ``memory``
+(per worker, expiring after ``AI_SESSION_TTL_SECONDS`` idle; tests and
+single-node deployments).
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.conversation import ConversationSession
+from app.services.claude import build_system_prompt
+
+
+class SessionConflict(Exception):
+    """The session gained a turn since it was read (overlapping messages)."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class SessionState:
+    user_id: UUID
+    kind: str
+    level: str
+    system_prompt: str
+    scenario: Optional[Dict[str, Any]] = None
+    topic: Optional[str] = None
+    history: List[Dict[str, str]] = field(default_factory=list)
+    turn_count: int = 0
+    id: UUID = field(default_factory=uuid4)
+    created_at: datetime = field(default_factory=_now)
+    updated_at: datetime = field(default_factory=_now)
+
+
+# ---------------------------------------------------------------------------
+# Stores
+# ---------------------------------------------------------------------------
+
+
+class SessionStore(ABC):
+    """Persistence of ``SessionState``; *db* is unused by non-SQL stores."""
+
+    @abstractmethod
+    async def create(self, db: AsyncSession, state: SessionState) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, db: AsyncSession, session_id: UUID) -> Optional[SessionState]:
+        ...
+
+    @abstractmethod
+    async def save(
+        self, db: AsyncSession, state: SessionState, expected_turn_count: int
+    ) -> bool:
+        """Persist *state*'s history, turn count and update time.
+
+        Only saves if the stored turn count is still *expected_turn_count*;
+        returns False otherwise.
+        """
+
+    @abstractmethod
+    async def delete(self, db: AsyncSession, session_id: UUID) -> None:
+        ...
+
+
+class SqlSessionStore(SessionStore):
+    """Sessions in the ``conversation_sessions`` table (the caller commits)."""
+
+    async def create(self, db: AsyncSession, state: SessionState) -> None:
+        db.add(
+            ConversationSession(
+                id=state.id,
+                user_id=state.user_id,
+                kind=state.kind,
+                level=state.level,
+                system_prompt=state.system_prompt,
+                scenario=state.scenario,
+                topic=state.topic,
+                history=state.history,
+                turn_count=state.turn_count,
+                created_at=state.created_at,
+                updated_at=state.updated_at,
+            )
+        )
+        await db.flush()
+
+    async def get(self, db: AsyncSession, session_id: UUID) -> Optional[SessionState]:
+        row = await db.get(ConversationSession, session_id)
+        if row is None:
+            return None
+        return SessionState(
+            id=row.id,
+            user_id=row.user_id,
+            kind=row.kind,
+            level=row.level,
+            system_prompt=row.system_prompt,
+            scenario=row.scenario,
+            topic=row.topic,
+            history=list(row.history),
+            turn_count=row.turn_count,
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+        )
+
+    async def save(
+        self, db: AsyncSession, state: SessionState, expected_turn_count: int
+    ) -> bool:
+        result = await db.execute(
+            update(ConversationSession)
+            .where(
+                ConversationSession.id == state.id,
+                ConversationSession.turn_count == expected_turn_count,
+            )
+            .values(
+                history=state.history,
+                turn_count=state.turn_count,
+                updated_at=state.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    async def delete(self, db: AsyncSession, session_id: UUID) -> None:
+        await db.execute(
+            delete(ConversationSession)
+            .where(ConversationSession.id == session_id)
+            .execution_options(synchronize_session=False)
+        )
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local sessions, evicted when idle or least recently used."""
+
+    def __init__(self):
+        self._sessions = TTLCache(
+            maxsize=settings.AI_SESSION_MAX_SESSIONS,
+            ttl=settings.AI_SESSION_TTL_SECONDS,
+        )
+
+    async def create(self, db: AsyncSession, state: SessionState) -> None:
+        self._sessions.set(state.id, replace(state, history=list(state.history)))
+
+    async def get(self, db: AsyncSession, session_id: UUID) -> Optional[SessionState]:
+        state = self._sessions.get(session_id)
+        return None if state is None else replace(state, history=list(state.history))
+
+    async def save(
+        self, db: AsyncSession, state: SessionState, expected_turn_count: int
+    ) -> bool:
+        stored = self._sessions.get(state.id)
+        if stored is None or stored.turn_count != expected_turn_count:
+            return False
+        self._sessions.set(state.id, replace(state, history=list(state.history)))
+        return True
+
+    async def delete(self, db: AsyncSession, session_id: UUID) -> None:
+        self._sessions.pop(session_id)
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the store selected by ``AI_SESSION_BACKEND``."""
+    global _store
+    if _store is None:
+        kind = settings.AI_SESSION_BACKEND
+        if kind == "sql":
+            _store = SqlSessionStore()
+        elif kind == "memory":
+            _store = InMemorySessionStore()
+        else:
+            raise ValueError(f"Unknown AI_SESSION_BACKEND: {kind}")
+    return _store
+
+
+def reset_session_store() -> None:
+    """Drop the store instance (used by tests)."""
+    global _store
+    _store = None
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+
+def assistant_content(reply: Dict[str, Any]) -> str:
+    """History text of an AI reply (romanized Darija plus translation)."""
+    return f"{reply.get('latin', '')} ({reply.get('english', '')})"
+
+
+async def start_session(
+    db: AsyncSession,
+    user_id: UUID,
+    level: str,
+    kind: str,
+    scenario: Optional[Dict[str, Any]] = None,
+    topic: Optional[str] = None,
+    history: Optional[List[Dict[str, str]]] = None,
+) -> SessionState:
+    """Create a session; *history* holds any scripted opening turns."""
+    state = SessionState(
+        user_id=user_id,
+        kind=kind,
+        level=level,
+        system_prompt=build_system_prompt(kind, level, scenario, topic),
+        scenario=scenario,
+        topic=topic,
+        history=list(history or [])[-settings.AI_SESSION_MAX_TURNS :],
+    )
+    await get_session_store().create(db, state)
+    return state
+
+
+async def get_user_session(
+    db: AsyncSession, session_id: UUID, user_id: UUID
+) -> Optional[SessionState]:
+    """Return *user_id*'s session *session_id*, or None."""
+    state = await get_session_store().get(db, session_id)
+    if state is None or state.user_id != user_id:
+        return None
+    return state
+
+
+async def record_turn(
+    db: AsyncSession, state: SessionState, message: str, reply: Dict[str, Any]
+) -> None:
+    """Append an answered learner message to *state* and save it.
+
+    Raises ``SessionConflict`` (leaving the stored session unchanged) if
+    another message was recorded since *state* was read.
+    """
+    expected_turn_count = state.turn_count
+    history = state.history + [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": assistant_content(reply)},
+    ]
+    state.history = history[-settings.AI_SESSION_MAX_TURNS :]
+    state.turn_count += 1
+    state.updated_at = _now()
+    if not await get_session_store().save(db, state, expected_turn_count):
+        raise SessionConflict(f"Conversation {state.id} changed concurrently")
+
+
+async def prune_sessions(db: AsyncSession, idle_before: datetime) -> int:
+    """Delete SQL sessions not updated since *idle_before*; return the count."""
+    result = await db.execute(
+        delete(ConversationSession)
+        .where(ConversationSession.updated_at < idle_before)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,245 @@
+"""Pre-generated conversation trees for the scripted scenarios.
+
+Most learners answer the conversation game by clicking one of the
+suggested replies, so the paths through a scenario are few and known in
+advance.  ``build_trees`` walks them offline: starting from each
+``CONVERSATION_SCENARIOS`` opener, it asks the model for its reply to every
+suggestion, then to every suggestion of those replies, down to *depth*
+learner turns.  The replies are stored as an artifact keyed like
+``response_cache`` (a hash of the system prompt, level, normalized history
+and message), so ``lookup`` answers a suggestion click without a model
+call; free-form input misses and goes to the model as before.
+
+The artifact records the prompt version it was built with and a content
+hash.  ``load`` ignores an artifact built for another prompt version, and
+editing a scenario changes its system prompt and therefore its keys, so a
+stale tree falls back to the model rather than serving outdated replies.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.services import response_cache
+from app.services.adaptive import CONVERSATION_SCENARIOS
+from app.services.claude import (
+    PROMPT_VERSIONS,
+    build_system_prompt,
+    generate_conversation_response,
+)
+from app.services.conversation_sessions import assistant_content
+from app.services.llm import get_llm_provider
+
+logger = logging.getLogger(__name__)
+
+# Layout of the artifact file; bump on incompatible changes
+TREE_FORMAT = 1
+
+# Learner turns covered by default (the game's MAX_EXCHANGES)
+DEFAULT_DEPTH = 3
+
+# Scenario fields the client sends back with every turn
+SCENARIO_FIELDS = ("context", "scenario_prompt", "target_vocabulary")
+
+# content key -> reply
+_nodes: Dict[str, Dict[str, Any]] = {}
+_info: Dict[str, Any] = {}
+_hits = 0
+_misses = 0
+
+
+def suggestion_message(suggestion: Dict[str, str]) -> str:
+    """The message the game client sends when *suggestion* is clicked."""
+    return f"{suggestion.get('latin', '')} ({suggestion.get('english', '')})"
+
+
+def _key(
+    level: str,
+    scenario: Optional[Dict[str, Any]],
+    history: List[Dict[str, str]],
+    message: str,
+) -> str:
+    system_prompt = build_system_prompt("scenario", level, scenario)
+    return response_cache.content_key(system_prompt, history, message, level)
+
+
+def lookup(
+    level: str,
+    scenario: Optional[Dict[str, Any]],
+    history: List[Dict[str, str]],
+    message: str,
+) -> Optional[Dict[str, Any]]:
+    """Return a copy of the pre-generated reply to this turn, or None."""
+    global _hits, _misses
+    if not _nodes:
+        return None
+    reply = _nodes.get(_key(level, scenario, history, message))
+    if reply is None:
+        _misses += 1
+        return None
+    _hits += 1
+    return dict(reply)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "nodes": len(_nodes),
+        "version": _info.get("version"),
+        "built_at": _info.get("built_at"),
+        "hits": _hits,
+        "misses": _misses,
+    }
+
+
+def clear() -> None:
+    """Forget the loaded tree and its counters (used by tests)."""
+    global _hits, _misses
+    _nodes.clear()
+    _info.clear()
+    _hits = _misses = 0
+
+
+# ---------------------------------------------------------------------------
+# Artifact
+# ---------------------------------------------------------------------------
+
+
+def load(path: Optional[str] = None) -> int:
+    """Load the artifact at *path* (default: ``CONVERSATION_TREE_PATH``).
+
+    Returns the number of replies loaded; a missing, unreadable or stale
+    artifact leaves the tree empty.
+    """
+    path = path or settings.CONVERSATION_TREE_PATH
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        logger.warning("Could not read conversation tree %s", path, exc_info=True)
+        return 0
+
+    prompt_version = PROMPT_VERSIONS["scenario"]
+    if artifact.get("format") != TREE_FORMAT:
+        logger.warning("Ignoring conversation tree %s: unknown format", path)
+        return 0
+    if artifact.get("prompt_version") != prompt_version:
+        logger.warning(
+            "Ignoring conversation tree %s: built for prompt %s, not %s",
+            path,
+            artifact.get("prompt_version"),
+            prompt_version,
+        )
+        return 0
+
+    clear()
+    _nodes.update(artifact["nodes"])
+    _info.update({k: v for k, v in artifact.items() if k != "nodes"})
+    return len(_nodes)
+
+
+def save(artifact: Dict[str, Any], path: str) -> None:
+    """Write *artifact* to *path*, replacing any previous file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------------------
+# Builder
+# ---------------------------------------------------------------------------
+
+
+async def build_trees(
+    levels: Optional[Iterable[str]] = None, depth: int = DEFAULT_DEPTH
+) -> Dict[str, Any]:
+    """Generate the replies along every suggestion path; return the artifact.
+
+    The model is called through ``generate_conversation_response``, exactly
+    as the endpoint would, at most ``BEDROCK_MAX_CONCURRENCY`` at a time.
+    Failed replies are left out (those turns fall back to the model), and
+    so is the subtree below them.
+    """
+    levels = list(levels or CONVERSATION_SCENARIOS)
+    slots = asyncio.Semaphore(settings.BEDROCK_MAX_CONCURRENCY)
+
+    async def reply_to(branch: Dict[str, Any]) -> Dict[str, Any]:
+        async with slots:
+            return await generate_conversation_response(
+                user_level=branch["level"],
+                conversation_history=branch["history"],
+                user_message=branch["message"],
+                scenario=branch["scenario"],
+            )
+
+    # Conversation states still to expand, with the suggestions offered
+    frontier = []
+    scenarios = 0
+    for level in levels:
+        for scenario in CONVERSATION_SCENARIOS.get(level, []):
+            scenarios += 1
+            frontier.append(
+                {
+                    "level": level,
+                    "scenario": {name: scenario[name] for name in SCENARIO_FIELDS},
+                    "history": [
+                        {
+                            "role": "assistant",
+                            "content": assistant_content(scenario["initial_message"]),
+                        }
+                    ],
+                    "suggestions": scenario["initial_suggestions"],
+                }
+            )
+
+    nodes: Dict[str, Dict[str, Any]] = {}
+    failed = 0
+    for _ in range(depth):
+        branches = [
+            {**state, "message": suggestion_message(suggestion)}
+            for state in frontier
+            for suggestion in state["suggestions"]
+        ]
+        replies = await asyncio.gather(*(reply_to(b) for b in branches))
+        frontier = []
+        for branch, reply in zip(branches, replies):
+            if reply.get("error") is not None:
+                failed += 1
+                logger.warning("No tree reply to %r: %s", branch["message"], reply)
+                continue
+            reply["usage"] = None
+            level, scenario = branch["level"], branch["scenario"]
+            key = _key(level, scenario, branch["history"], branch["message"])
+            nodes[key] = reply
+            frontier.append(
+                {
+                    **branch,
+                    "history": branch["history"]
+                    + [
+                        {"role": "user", "content": branch["message"]},
+                        {"role": "assistant", "content": assistant_content(reply)},
+                    ],
+                    "suggestions": reply.get("suggestions", []),
+                }
+            )
+
+    encoded = json.dumps(nodes, sort_keys=True, ensure_ascii=False)
+    return {
+        "format": TREE_FORMAT,
+        "version": hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:12],
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "prompt_version": PROMPT_VERSIONS["scenario"],
+        "model": get_llm_provider().model,
+        "levels": levels,
+        "depth": depth,
+        "scenarios": scenarios,
+        "failed": failed,
+        "nodes": nodes,
+    }
@@ -0,0 +1,255 @@
+"""In-process compiled curriculum index.
+
+The curriculum only changes when a teacher edits it through
+``/api/curriculum/*``, yet every game session used to re-read and walk the
+same ``Lesson.content_json`` blobs.  This module compiles every lesson once
+into flat per-level / per-module lists and keeps the result in memory.
+
+The index is versioned: curriculum mutations bump the version (and again
+after the surrounding transaction commits) so the next caller rebuilds it.
+A TTL bounds staleness on deployments with several workers, where an edit
+only invalidates the index of the worker that handled it.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.lesson import Lesson
+from app.services.conjugation import ConjugationSet, ConjugationTable
+
+GAME_CONTENT_KEYS = ("word_match", "fill_blanks", "cultural_quiz")
+
+# Lessons with this order hold a module's game_content rather than teaching
+GAME_CONTENT_ORDER = 999
+
+# Maximum number of derived structures memoised per index (LRU)
+MEMO_CACHE_SIZE = 512
+
+
+# ---------------------------------------------------------------------------
+# Compiled structures
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class CompiledLesson:
+    """Teaching lesson reduced to the parts used by session generation."""
+
+    lesson_id: UUID
+    level: str
+    module: str
+    vocabulary: List[dict] = field(default_factory=list)
+    conjugation: ConjugationTable = field(default_factory=ConjugationTable)
+
+
+class CurriculumIndex:
+    """Immutable snapshot of the compiled curriculum."""
+
+    def __init__(
+        self,
+        version: int,
+        lessons: List[CompiledLesson],
+        game_content: Dict[Tuple[str, str], Dict[str, list]],
+    ):
+        self.version = version
+        self.built_at = time.monotonic()
+        self._lessons: Dict[UUID, CompiledLesson] = {l.lesson_id: l for l in lessons}
+        self._lessons_by_level: Dict[str, List[CompiledLesson]] = {}
+        for lesson in lessons:
+            self._lessons_by_level.setdefault(lesson.level, []).append(lesson)
+        self._game_content = game_content
+        self._memo: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._lessons)
+
+    def cached(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Memoise ``factory()`` under *key* for the lifetime of this index.
+
+        Derived structures (merged content, distractor pools) live here so
+        they are dropped together with the index when the curriculum changes.
+        """
+        try:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        except KeyError:
+            pass
+        value = self._memo[key] = factory()
+        if len(self._memo) > MEMO_CACHE_SIZE:
+            self._memo.popitem(last=False)
+        return value
+
+    def lesson_ids_at(self, level: str, lesson_ids: Iterable[UUID]) -> FrozenSet[UUID]:
+        """Return the subset of *lesson_ids* that are teaching lessons at *level*."""
+        return frozenset(l.lesson_id for l in self._completed(level, lesson_ids))
+
+    def _completed(
+        self, level: str, lesson_ids: Iterable[UUID]
+    ) -> List[CompiledLesson]:
+        """Return compiled lessons at *level* whose id is in *lesson_ids*."""
+        ids = lesson_ids
+        if not isinstance(ids, (set, frozenset)):
+            ids = set(ids)
+        return [l for l in self._lessons_by_level.get(level, []) if l.lesson_id in ids]
+
+    def completed_modules(self, level: str, lesson_ids: Iterable[UUID]) -> Set[str]:
+        """Return module IDs at *level* with at least one completed lesson."""
+        return {l.module for l in self._completed(level, lesson_ids)}
+
+    def game_content(self, level: str, modules: Optional[Set[str]] = None) -> dict:
+        """Return game_content lists for *level*, scoped to *modules*.
+
+        Falls back to all content for the level when the given modules have
+        no game content (or when no modules are given, e.g. first session).
+        The returned lists are fresh copies and safe to extend.
+        """
+        content: Dict[str, list] = {key: [] for key in GAME_CONTENT_KEYS}
+        for (lvl, module), gc in self._game_content.items():
+            if lvl != level or (modules and module not in modules):
+                continue
+            for key in GAME_CONTENT_KEYS:
+                content[key].extend(gc[key])
+
+        if not any(content.values()) and modules:
+            return self.game_content(level, None)
+        return content
+
+    def vocabulary(self, level: str, lesson_ids: Iterable[UUID]) -> List[dict]:
+        """Return vocabulary dicts from the completed lessons at *level*."""
+        vocab: List[dict] = []
+        for lesson in self._completed(level, lesson_ids):
+            vocab.extend(lesson.vocabulary)
+        return vocab
+
+    def conjugations(self, level: str, lesson_ids: Iterable[UUID]) -> ConjugationSet:
+        """Return the conjugation tables of the completed lessons at *level*."""
+        return ConjugationSet(l.conjugation for l in self._completed(level, lesson_ids))
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+
+
+def _compile_lesson(
+    lesson_id: UUID, level: str, module: str, cj: dict
+) -> CompiledLesson:
+    """Flatten a teaching lesson's vocabulary and conjugation tables."""
+    compiled = CompiledLesson(
+        lesson_id=lesson_id,
+        level=level,
+        module=module,
+        conjugation=ConjugationTable(cj.get("conjugation", [])),
+    )
+    for item in cj.get("vocabulary", []):
+        if item.get("arabic") and item.get("english"):
+            compiled.vocabulary.append(
+                {
+                    "darija_arabic": item["arabic"],
+                    "darija_latin": item.get("romanized", ""),
+                    "english": item["english"],
+                }
+            )
+    return compiled
+
+
+async def build_curriculum_index(db: AsyncSession, version: int = 0) -> CurriculumIndex:
+    """Load every lesson once and compile it into a ``CurriculumIndex``."""
+    result = await db.execute(
+        select(
+            Lesson.id, Lesson.level, Lesson.module, Lesson.order, Lesson.content_json
+        ).order_by(Lesson.level, Lesson.module, Lesson.order)
+    )
+
+    lessons: List[CompiledLesson] = []
+    game_content: Dict[Tuple[str, str], Dict[str, list]] = {}
+    for lesson_id, level, module, order, cj in result.all():
+        cj = cj or {}
+        if order == GAME_CONTENT_ORDER:
+            gc = cj.get("game_content", {})
+            bucket = game_content.setdefault(
+                (level, module), {key: [] for key in GAME_CONTENT_KEYS}
+            )
+            for key in GAME_CONTENT_KEYS:
+                bucket[key].extend(gc.get(key, []))
+        elif order < GAME_CONTENT_ORDER:
+            lessons.append(_compile_lesson(lesson_id, level, module, cj))
+
+    return CurriculumIndex(version, lessons, game_content)
+
+
+# ---------------------------------------------------------------------------
+# Process-wide cache
+# ---------------------------------------------------------------------------
+
+_index: Optional[CurriculumIndex] = None
+_version = 0
+_build_lock = asyncio.Lock()
+
+
+def _is_fresh(index: Optional[CurriculumIndex]) -> bool:
+    if index is None or index.version != _version:
+        return False
+    ttl = settings.CURRICULUM_INDEX_TTL_SECONDS
+    return ttl <= 0 or time.monotonic() - index.built_at < ttl
+
+
+async def get_curriculum_index(db: AsyncSession) -> CurriculumIndex:
+    """Return the current curriculum index, rebuilding it when stale."""
+    global _index
+    if _is_fresh(_index):
+        return _index
+
+    async with _build_lock:
+        # Another request may have rebuilt it while we were waiting
+        if _is_fresh(_index):
+            return _index
+        _index = await build_curriculum_index(db, version=_version)
+        return _index
+
+
+def invalidate_curriculum_index() -> None:
+    """Mark the cached index stale so the next caller rebuilds it."""
+    global _version
+    _version += 1
+
+
+def mark_curriculum_changed(db: AsyncSession) -> None:
+    """Invalidate the index now and again once *db*'s transaction commits.
+
+    The second invalidation covers requests that rebuild the index between
+    the mutation and the commit and would otherwise cache the old content.
+    """
+    invalidate_curriculum_index()
+    db.info["curriculum_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop("curriculum_changed", False):
+        invalidate_curriculum_index()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session) -> None:
+    session.info.pop("curriculum_changed", None)
@@ -0,0 +1,120 @@
+"""Distractor sampling for multiple-choice games.
+
+A ``DistractorPool`` holds the deduplicated answers of a content set and
+draws *k* distinct wrong options by rejection sampling, so building a
+question costs O(k) instead of a scan over every item.  Pools are built
+once per content set and cached next to it (see ``SessionContent`` in
+``app.services.adaptive``).
+
+Pools can also prefer "similar" distractors — answers of about the same
+length or starting with the same letter — which makes questions harder
+for advanced learners.
+"""
+
+import random
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+SIMILARITY_MODES = ("length", "initial")
+
+# Maximum length difference for two answers to count as "similar" in length
+LENGTH_TOLERANCE = 2
+
+# Rejection sampling gives up after this many draws per requested option
+_ATTEMPTS_PER_OPTION = 8
+
+
+class DistractorPool:
+    """Deduplicated answer pool supporting O(k) distractor sampling."""
+
+    def __init__(
+        self,
+        answers: Iterable[Any],
+        key: Callable[[Any], Hashable] = lambda a: a,
+        text: Callable[[Any], str] = str,
+    ):
+        self._key = key
+        self._text = text
+        self.items: List[Any] = []
+        self.keys: List[Hashable] = []
+        positions: Dict[Hashable, int] = {}
+        for answer in answers:
+            k = key(answer)
+            if k in positions:
+                continue
+            positions[k] = len(self.items)
+            self.items.append(answer)
+            self.keys.append(k)
+        self._buckets: Dict[str, Dict[Hashable, List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(
+        self,
+        k: int,
+        exclude: Iterable[Any] = (),
+        similar_to: Optional[Any] = None,
+        similarity: Optional[str] = None,
+    ) -> List[Any]:
+        """Return up to *k* distinct answers whose key differs from *exclude*.
+
+        When *similarity* is one of ``SIMILARITY_MODES`` and *similar_to* is
+        given, answers similar to it are preferred and the rest of the pool
+        only fills the remaining slots.
+        """
+        seen = {self._key(a) for a in exclude}
+        picked: List[Any] = []
+        if similarity and similar_to is not None:
+            for candidates in self._similar(similarity, similar_to):
+                self._draw(candidates, k, seen, picked)
+        self._draw(range(len(self.items)), k, seen, picked)
+        return picked
+
+    def _draw(
+        self, candidates: Sequence[int], k: int, seen: set, picked: List[Any]
+    ) -> None:
+        """Add distinct unseen items from *candidates* to *picked* until *k*."""
+        size = len(candidates)
+        if not size or len(picked) >= k:
+            return
+        for _ in range(_ATTEMPTS_PER_OPTION * k):
+            idx = candidates[random.randrange(size)]
+            if self.keys[idx] not in seen:
+                seen.add(self.keys[idx])
+                picked.append(self.items[idx])
+                if len(picked) >= k:
+                    return
+        # Pool too small or too crowded by exclusions: finish with a scan
+        rest = [i for i in candidates if self.keys[i] not in seen]
+        for idx in random.sample(rest, min(k - len(picked), len(rest))):
+            seen.add(self.keys[idx])
+            picked.append(self.items[idx])
+
+    def _similar(self, similarity: str, reference: Any) -> List[List[int]]:
+        """Return candidate index lists similar to *reference*, closest first."""
+        if similarity not in SIMILARITY_MODES:
+            raise ValueError(f"Unknown similarity mode: {similarity}")
+        buckets = self._buckets.get(similarity)
+        if buckets is None:
+            buckets = self._buckets[similarity] = {}
+            for idx, item in enumerate(self.items):
+                buckets.setdefault(_bucket(similarity, self._text(item)), []).append(
+                    idx
+                )
+
+        ref = _bucket(similarity, self._text(reference))
+        if similarity == "initial":
+            return [buckets.get(ref, [])]
+        return [
+            buckets.get(ref + offset, [])
+            for offset in sorted(
+                range(-LENGTH_TOLERANCE, LENGTH_TOLERANCE + 1), key=abs
+            )
+        ]
+
+
+def _bucket(similarity: str, text: str) -> Hashable:
+    text = text.strip()
+    if similarity == "length":
+        return len(text)
+    return text[:1].casefold()
@@ -0,0 +1,108 @@
+"""Token budgeting for AI conversation history.
+
+The client resends the whole conversation on every turn.  Before it is
+forwarded to the model, ``compact_history`` keeps the last
+``AI_HISTORY_KEEP_TURNS`` turns verbatim and condenses older turns into a
+short summary (one truncated line per turn, newest first until the budget
+runs out), so a request stays around ``AI_HISTORY_TOKEN_BUDGET`` tokens
+however long the conversation gets.  The summary goes into the system
+prompt after the static part, which therefore stays cacheable.
+
+Token counts are estimates (characters / ``CHARS_PER_TOKEN``); the exact
+counts Bedrock reports are returned with each reply.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Conservative for romanized Darija and Arabic script alike
+CHARS_PER_TOKEN = 3
+
+# Longest summary line per condensed turn, in characters
+SUMMARY_LINE_CHARS = 160
+
+# The latest turn keeps at least this many tokens, even over budget, so a
+# long learner message never leaves the model a context-free stub
+MIN_LATEST_TURN_TOKENS = 60
+
+_SPEAKERS = {"user": "Learner", "assistant": "You"}
+
+
+@dataclass
+class CompactedHistory:
+    """History to send: verbatim *messages* plus an optional *summary*."""
+
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    summary: Optional[str] = None
+    # Older turns condensed into the summary, and those left out entirely
+    summarized: int = 0
+    omitted: int = 0
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of *text*."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[: max(0, max_chars - 1)].rstrip() + "…"
+
+
+def compact_history(
+    history: List[Dict[str, str]],
+    user_message: str,
+    keep_turns: int,
+    token_budget: int,
+) -> CompactedHistory:
+    """Fit *history* and *user_message* into roughly *token_budget* tokens.
+
+    The newest verbatim turns are kept first; if even those exceed the
+    budget, the oldest of them are condensed too (the latest turn is always
+    kept, truncated if necessary but to no less than
+    ``MIN_LATEST_TURN_TOKENS``).  The summary fills whatever budget is left,
+    newest condensed turns first.
+    """
+    budget = token_budget - estimate_tokens(user_message)
+    recent = [
+        {"role": turn["role"], "content": turn["content"]}
+        for turn in (history[-keep_turns:] if keep_turns > 0 else [])
+    ]
+    older = history[: len(history) - len(recent)]
+
+    used = sum(estimate_tokens(turn["content"]) for turn in recent)
+    while len(recent) > 1 and used > budget:
+        turn = recent.pop(0)
+        used -= estimate_tokens(turn["content"])
+        older = older + [turn]
+    if recent and used > budget:
+        max_chars = max(budget, MIN_LATEST_TURN_TOKENS) * CHARS_PER_TOKEN
+        recent[0]["content"] = _truncate(recent[0]["content"], max_chars)
+        used = estimate_tokens(recent[0]["content"])
+
+    compacted = CompactedHistory(messages=recent)
+    if not older:
+        return compacted
+
+    def header(omitted: int) -> str:
+        if not omitted:
+            return "## Earlier in this conversation"
+        return f"## Earlier in this conversation ({omitted} older turns not shown)"
+
+    remaining = budget - used - estimate_tokens(header(len(older)))
+    lines: List[str] = []
+    for turn in reversed(older):
+        speaker = _SPEAKERS.get(turn["role"], turn["role"])
+        line = f"- {speaker}: {_truncate(turn['content'], SUMMARY_LINE_CHARS)}"
+        cost = estimate_tokens("\n" + line)
+        if cost > remaining:
+            break
+        lines.append(line)
+        remaining -= cost
+
+    compacted.summarized = len(lines)
+    compacted.omitted = len(older) - len(lines)
+    compacted.summary = "\n".join([header(compacted.omitted)] + lines[::-1])
+    return compacted
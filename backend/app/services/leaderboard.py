@@ -0,0 +1,146 @@
+"""Leaderboard materialization.
+
+Writes per-period XP totals (``LeaderboardEntry``) for the weekly, monthly
+and all-time periods so ``GET /api/leaderboard/`` is an indexed read.
+Ranks are not stored: the ``(period, xp_total)`` index gives the top of a
+period in order and any user's rank as a range count, so a run only
+writes the rows whose totals changed.
+
+Each run only adds the XP earned since the period's watermark (stored in
+``leaderboard_state``): the ``xp_earned`` stored on each game result and
+completed lesson, i.e. exactly the XP added to ``users.xp``.  When a new
+week or month starts the period's entries are cleared and rebuilt from
+the window start.  Activity newer than ``SAFETY_LAG`` is left for the
+next run so rows from transactions still in flight are not skipped.
+
+Run with ``python -m app.cli materialize-leaderboard`` (cron or
+``--every`` for a long-running loop).
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert
+from app.models.progress import (
+    GameResult,
+    LeaderboardEntry,
+    LeaderboardState,
+    UserProgress,
+)
+
+PERIODS = ("weekly", "monthly", "all-time")
+
+# Activity younger than this is picked up by the next run
+SAFETY_LAG = timedelta(seconds=60)
+
+# Rows per multi-row upsert statement
+UPSERT_BATCH_SIZE = 1000
+
+
+def period_start(period: str, now: datetime) -> Optional[datetime]:
+    """Return the UTC start of *period*'s current window (None for all-time)."""
+    midnight = now.astimezone(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    if period == "weekly":
+        return midnight - timedelta(days=midnight.weekday())
+    if period == "monthly":
+        return midnight.replace(day=1)
+    if period == "all-time":
+        return None
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite returns naive datetimes (stored as UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def period_xp_query(lower: Optional[datetime], upper: Optional[datetime]):
+    """Per-user ``(user_id, xp)`` earned in ``[lower, upper)`` (open if None)."""
+    games = select(
+        GameResult.user_id.label("user_id"), GameResult.xp_earned.label("xp")
+    )
+    lessons = select(UserProgress.user_id, UserProgress.xp_earned)
+    if upper is not None:
+        games = games.where(GameResult.played_at < upper)
+        lessons = lessons.where(UserProgress.completed_at < upper)
+    if lower is not None:
+        games = games.where(GameResult.played_at >= lower)
+        lessons = lessons.where(UserProgress.completed_at >= lower)
+
+    activity = union_all(games, lessons).subquery()
+    return select(activity.c.user_id, func.sum(activity.c.xp)).group_by(
+        activity.c.user_id
+    )
+
+
+async def materialize_period(
+    db: AsyncSession, period: str, now: Optional[datetime] = None
+) -> int:
+    """Bring *period*'s entries up to date; return the number of users updated.
+
+    The caller commits.
+    """
+    now = now or datetime.now(timezone.utc)
+    upper = now - SAFETY_LAG
+    start = period_start(period, now)
+
+    state = await db.get(LeaderboardState, period)
+    if state is None:
+        state = LeaderboardState(period=period)
+        db.add(state)
+    if state.watermark is None or _utc(state.window_start) != start:
+        # New window (or first run): rebuild from the window start
+        await db.execute(
+            delete(LeaderboardEntry)
+            .where(LeaderboardEntry.period == period)
+            .execution_options(synchronize_session=False)
+        )
+        lower = start
+    else:
+        lower = _utc(state.watermark)
+        if start is not None and lower < start:
+            lower = start
+
+    result = await db.execute(period_xp_query(lower, upper))
+    deltas = [(user_id, int(xp)) for user_id, xp in result.all() if xp]
+
+    for i in range(0, len(deltas), UPSERT_BATCH_SIZE):
+        stmt = upsert(db, LeaderboardEntry).values(
+            [
+                {"period": period, "user_id": user_id, "xp_total": xp}
+                for user_id, xp in deltas[i : i + UPSERT_BATCH_SIZE]
+            ]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[LeaderboardEntry.period, LeaderboardEntry.user_id],
+                set_={"xp_total": LeaderboardEntry.xp_total + stmt.excluded.xp_total},
+            )
+        )
+
+    state.window_start = start
+    state.watermark = upper
+    state.updated_at = now
+    await db.flush()
+    return len(deltas)
+
+
+async def materialize_leaderboards(
+    db: AsyncSession,
+    periods: Iterable[str] = PERIODS,
+    now: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """Materialize every period in *periods*, committing after each one."""
+    now = now or datetime.now(timezone.utc)
+    updated: Dict[str, int] = {}
+    for period in periods:
+        updated[period] = await materialize_period(db, period, now)
+        await db.commit()
+    return updated
@@ -0,0 +1,361 @@
+"""LLM providers behind the AI conversation service.
+
+``app.services.claude`` builds Anthropic Messages API requests (``system``,
+``messages``, ``max_tokens``) and hands them to the provider selected by
+``LLM_PROVIDER``:
+
+- ``bedrock``: Claude on AWS Bedrock (``BEDROCK_MODEL_ID``).
+- ``local``: a deterministic stand-in that answers with scripted JSON
+  after a simulated latency, so the conversation endpoints can be
+  load-tested and benchmarked offline without AWS credentials or token
+  spend.  Latencies follow a log-normal distribution around
+  ``LLM_LOCAL_LATENCY_MS`` (spread ``LLM_LOCAL_LATENCY_SIGMA``) drawn from
+  a generator seeded with ``LLM_LOCAL_SEED``; ``LLM_LOCAL_ERROR_RATE``
+  makes that share of calls fail as throttled.
+
+Providers raise on failure; retries, admission control and parsing stay
+in ``app.services.claude``.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from app.core.config import settings
+from app.services.history import estimate_tokens
+
+# Token counts reported for each call
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+Usage = Dict[str, int]
+
+
+class Throttled(Exception):
+    """The provider asked the caller to slow down (retryable)."""
+
+
+def new_usage() -> Usage:
+    return dict.fromkeys(USAGE_FIELDS, 0)
+
+
+def _update_usage(usage: Usage, reported: Optional[Dict[str, Any]]) -> None:
+    for name in USAGE_FIELDS:
+        if reported and reported.get(name) is not None:
+            usage[name] = reported[name]
+
+
+class LLMProvider(ABC):
+    """Interface of a chat model taking Anthropic Messages API requests."""
+
+    name = ""
+    # Model identifier reported in metrics
+    model = ""
+
+    @abstractmethod
+    async def complete(self, request: Dict[str, Any]) -> Tuple[str, Usage]:
+        """Return the reply text and its token usage."""
+
+    @abstractmethod
+    def stream(self, request: Dict[str, Any], usage: Usage) -> AsyncIterator[str]:
+        """Yield the reply's text deltas, writing token counts to *usage*."""
+
+    def is_retryable(self, exc: Exception) -> bool:
+        """Whether *exc* is transient and the call worth retrying."""
+        return isinstance(exc, Throttled)
+
+
+# ---------------------------------------------------------------------------
+# Bedrock
+# ---------------------------------------------------------------------------
+
+# Bedrock errors worth retrying (with backoff) before giving up
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+
+class BedrockProvider(LLMProvider):
+    """Claude on AWS Bedrock.
+
+    boto3 calls block for the whole LLM call (often seconds), so they run
+    in a thread pool and the event loop keeps serving other requests.
+    Calls are admitted by ``admission.get_gate()`` with the same limit, so
+    they never queue for a thread here.
+    """
+
+    name = "bedrock"
+
+    def __init__(self, model_id: str, region: str, max_concurrency: int):
+        self.model = model_id
+        self.region = region
+        self.max_concurrency = max_concurrency
+        # boto3 clients are thread-safe: one is shared by every call
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="bedrock"
+        )
+
+    def _get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.client(
+                        "bedrock-runtime",
+                        region_name=self.region,
+                        config=Config(
+                            max_pool_connections=self.max_concurrency,
+                            # Retried by app.services.claude instead, off the
+                            # worker threads and outside the admission slots
+                            retries={"mode": "standard", "total_max_attempts": 1},
+                        ),
+                    )
+        return self._client
+
+    def _invoke_sync(self, body: str) -> Tuple[str, Usage]:
+        response = self._get_client().invoke_model(
+            modelId=self.model,
+            contentType="application/json",
+            accept="application/json",
+            body=body,
+        )
+        response_body = json.loads(response["body"].read())
+        usage = new_usage()
+        _update_usage(usage, response_body.get("usage"))
+        return response_body["content"][0]["text"], usage
+
+    async def complete(self, request: Dict[str, Any]) -> Tuple[str, Usage]:
+        body = json.dumps({"anthropic_version": "bedrock-2023-05-31", **request})
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._invoke_sync, body)
+
+    async def stream(
+        self, request: Dict[str, Any], usage: Usage
+    ) -> AsyncIterator[str]:
+        """Read ``invoke_model_with_response_stream`` in the thread pool.
+
+        Events are handed to the event loop through a queue.  If the
+        consumer goes away, the event stream is closed so the reader stops
+        at once, and the reader is awaited so its thread (and admission
+        slot) is really free when this returns.
+        """
+        body = json.dumps({"anthropic_version": "bedrock-2023-05-31", **request})
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        events = None
+
+        def produce() -> None:
+            nonlocal events
+            try:
+                response = self._get_client().invoke_model_with_response_stream(
+                    modelId=self.model,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=body,
+                )
+                events = response["body"]
+                if stop.is_set():
+                    events.close()
+                    return
+                for event in events:
+                    if stop.is_set():
+                        break
+                    chunk = json.loads(event["chunk"]["bytes"])
+                    kind = chunk.get("type")
+                    if kind == "content_block_delta":
+                        text = chunk["delta"].get("text")
+                        if text:
+                            loop.call_soon_threadsafe(queue.put_nowait, text)
+                    elif kind == "message_start":
+                        _update_usage(usage, chunk.get("message", {}).get("usage"))
+                    elif kind == "message_delta":
+                        _update_usage(usage, chunk.get("usage"))
+            except Exception as exc:
+                loop.call_soon_threadsafe(queue.put_nowait, exc)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        producer = loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Set before reading *events*: either this closes the stream or
+            # the producer sees the flag right after opening it
+            stop.set()
+            if events is not None:
+                events.close()
+            await producer
+
+    def is_retryable(self, exc: Exception) -> bool:
+        if isinstance(exc, ClientError):
+            return exc.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+        return super().is_retryable(exc) or isinstance(
+            exc, (ConnectionClosedError, EndpointConnectionError, ReadTimeoutError)
+        )
+
+
+# ---------------------------------------------------------------------------
+# Local stand-in
+# ---------------------------------------------------------------------------
+
+# Scripted replies, picked by a hash of the request (same request, same reply)
+LOCAL_REPLIES = (
+    {
+        "arabic": "واخا، مزيان بزاف!",
+        "latin": "Wakha, mzyan bzaf!",
+        "english": "Okay, very good!",
+    },
+    {
+        "arabic": "لاباس، الحمد لله. وانتا؟",
+        "latin": "Labas, l7amdulillah. W nta?",
+        "english": "Fine, thank God. And you?",
+    },
+    {
+        "arabic": "شنو بغيتي تشرب؟",
+        "latin": "Chnou bghiti tcherb?",
+        "english": "What would you like to drink?",
+    },
+    {
+        "arabic": "بصحتك! نتلاقاو من بعد.",
+        "latin": "B sa7tek! Ntla9aw mn ba3d.",
+        "english": "Enjoy! See you later.",
+    },
+)
+
+LOCAL_SUGGESTIONS = [
+    {"arabic": "شكرا بزاف", "latin": "Choukran bzaf", "english": "Thanks a lot"},
+    {"arabic": "عافاك عاود", "latin": "3afak 3awed", "english": "Please repeat"},
+]
+
+# Share of the latency spent before the first streamed delta
+LOCAL_FIRST_TOKEN_SHARE = 0.3
+
+# Characters per streamed delta
+LOCAL_STREAM_CHUNK = 12
+
+
+class LocalProvider(LLMProvider):
+    """Deterministic offline stand-in with a simulated latency distribution."""
+
+    name = "local"
+    model = "local"
+
+    def __init__(
+        self,
+        latency_ms: float,
+        sigma: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _latency(self) -> float:
+        """Seconds for the next call: log-normal with median *latency_ms*."""
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.latency_ms / 1000 * self._random.lognormvariate(0, self.sigma)
+
+    def _reply(self, request: Dict[str, Any]) -> Tuple[str, Usage]:
+        self.calls += 1
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise Throttled("Simulated throttling")
+        encoded = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(encoded.encode("utf-8")).digest()
+        reply = dict(LOCAL_REPLIES[digest[0] % len(LOCAL_REPLIES)])
+        reply["correction"] = None
+        reply["suggestions"] = LOCAL_SUGGESTIONS
+        text = json.dumps(reply, ensure_ascii=False)
+
+        usage = new_usage()
+        usage["input_tokens"] = estimate_tokens(encoded)
+        usage["output_tokens"] = estimate_tokens(text)
+        return text, usage
+
+    async def complete(self, request: Dict[str, Any]) -> Tuple[str, Usage]:
+        delay = self._latency()
+        text, usage = self._reply(request)
+        await asyncio.sleep(delay)
+        return text, usage
+
+    async def stream(
+        self, request: Dict[str, Any], usage: Usage
+    ) -> AsyncIterator[str]:
+        delay = self._latency()
+        text, reported = self._reply(request)
+        usage.update(reported)
+        chunks = [
+            text[i : i + LOCAL_STREAM_CHUNK]
+            for i in range(0, len(text), LOCAL_STREAM_CHUNK)
+        ]
+        await asyncio.sleep(delay * LOCAL_FIRST_TOKEN_SHARE)
+        step = delay * (1 - LOCAL_FIRST_TOKEN_SHARE) / len(chunks)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(step)
+            yield chunk
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """Return the provider selected by ``LLM_PROVIDER``."""
+    global _provider
+    if _provider is None:
+        kind = settings.LLM_PROVIDER
+        if kind == "bedrock":
+            _provider = BedrockProvider(
+                settings.BEDROCK_MODEL_ID,
+                settings.AWS_REGION,
+                settings.BEDROCK_MAX_CONCURRENCY,
+            )
+        elif kind == "local":
+            _provider = LocalProvider(
+                settings.LLM_LOCAL_LATENCY_MS,
+                settings.LLM_LOCAL_LATENCY_SIGMA,
+                settings.LLM_LOCAL_ERROR_RATE,
+                settings.LLM_LOCAL_SEED,
+            )
+        else:
+            raise ValueError(f"Unknown LLM_PROVIDER: {kind}")
+    return _provider
+
+
+def reset_llm_provider() -> None:
+    """Drop the provider instance (used by tests and benchmarks)."""
+    global _provider
+    _provider = None
@@ -0,0 +1,353 @@
+"""Real-time leaderboard on sorted sets.
+
+With ``LEADERBOARD_BACKEND`` set to ``memory`` or ``redis``, every XP award
+is pushed to one sorted set per leaderboard period window (ZINCRBY), the
+top of a period is a ZREVRANGE and any user's rank a ZREVRANK, i.e.
+O(log n) instead of a table scan.  The default, ``sql``, keeps the
+materialized tables of ``app.services.leaderboard``, which also remain the
+fallback when the sorted-set backend fails.
+
+Scores use the same XP as the materializer (the ``xp_earned`` stored on
+game results and completed lessons).  A period's set is seeded from
+the SQL history the first time this process touches it, so restarts and
+new weekly/monthly windows do not lose earlier activity.  Awards are
+pushed only once the request's transaction commits, so a rolled-back
+activity never reaches the sets.
+
+The ``memory`` backend is process-local (tests, single-node deployments);
+``redis`` needs the optional ``redis`` package and ``REDIS_URL``.
+"""
+
+import asyncio
+import bisect
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.leaderboard import PERIODS, period_start, period_xp_query
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "leaderboard"
+
+# Weekly/monthly Redis keys outlive their window by this much
+WINDOW_KEY_GRACE = timedelta(days=7)
+
+# Session.info key of the awards waiting for the transaction to commit
+PENDING_AWARDS = "leaderboard_awards"
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+
+class SortedSetBackend(ABC):
+    """Minimal sorted-set API (a subset of Redis' Z* commands)."""
+
+    @abstractmethod
+    async def claim_seed(self, key: str, ttl: Optional[timedelta]) -> bool:
+        """Atomically claim the seeding of *key*; False if already claimed."""
+
+    @abstractmethod
+    async def add_scores(
+        self, key: str, scores: Dict[str, float], ttl: Optional[timedelta]
+    ) -> None:
+        """Atomically add *scores* to the members' current scores in *key*."""
+
+    @abstractmethod
+    async def incr(self, key: str, member: str, amount: float) -> None:
+        ...
+
+    @abstractmethod
+    async def top(self, key: str, n: int) -> List[Tuple[str, float]]:
+        """Return the *n* highest ``(member, score)`` pairs, best first."""
+
+    @abstractmethod
+    async def rank(self, key: str, member: str) -> Optional[int]:
+        """Return *member*'s 0-based position from the top, or None."""
+
+
+class _SortedSet:
+    """Scores plus a list of ``(-score, member)`` kept sorted with bisect."""
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.order: List[Tuple[float, str]] = []
+
+    def incr(self, member: str, amount: float) -> None:
+        old = self.scores.get(member)
+        if old is not None:
+            del self.order[bisect.bisect_left(self.order, (-old, member))]
+        new = (old or 0.0) + amount
+        self.scores[member] = new
+        bisect.insort(self.order, (-new, member))
+
+    def rank(self, member: str) -> Optional[int]:
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.order, (-score, member))
+
+
+class InMemorySortedSets(SortedSetBackend):
+    """Process-local sorted sets."""
+
+    def __init__(self):
+        self._sets: Dict[str, _SortedSet] = {}
+
+    def _get(self, key: str) -> _SortedSet:
+        zset = self._sets.get(key)
+        if zset is None:
+            # A new window replaces the previous one of the same period
+            period = key.rsplit(":", 1)[0]
+            for old in [k for k in self._sets if k.rsplit(":", 1)[0] == period]:
+                del self._sets[old]
+            zset = self._sets[key] = _SortedSet()
+        return zset
+
+    async def claim_seed(self, key: str, ttl: Optional[timedelta]) -> bool:
+        if key in self._sets:
+            return False
+        self._get(key)
+        return True
+
+    async def add_scores(
+        self, key: str, scores: Dict[str, float], ttl: Optional[timedelta]
+    ) -> None:
+        zset = self._get(key)
+        for member, score in scores.items():
+            zset.incr(member, score)
+
+    async def incr(self, key: str, member: str, amount: float) -> None:
+        self._get(key).incr(member, amount)
+
+    async def top(self, key: str, n: int) -> List[Tuple[str, float]]:
+        zset = self._sets.get(key)
+        if zset is None:
+            return []
+        return [(member, -neg) for neg, member in zset.order[:n]]
+
+    async def rank(self, key: str, member: str) -> Optional[int]:
+        zset = self._sets.get(key)
+        return None if zset is None else zset.rank(member)
+
+
+class RedisSortedSets(SortedSetBackend):
+    """Sorted sets stored in Redis (shared by every worker)."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "LEADERBOARD_BACKEND=redis requires the 'redis' package"
+            ) from exc
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def claim_seed(self, key: str, ttl: Optional[timedelta]) -> bool:
+        # SET NX is atomic across workers: exactly one of them seeds
+        return bool(await self._client.set(f"{key}:seeded", 1, nx=True, ex=ttl))
+
+    async def add_scores(
+        self, key: str, scores: Dict[str, float], ttl: Optional[timedelta]
+    ) -> None:
+        if not scores:
+            return
+        staging = f"{key}:seed"
+        async with self._client.pipeline(transaction=True) as pipe:
+            # Summed with the live set, so increments pushed by other workers
+            # since the seed was claimed are kept on top of the history
+            pipe.delete(staging)
+            pipe.zadd(staging, scores)
+            pipe.zunionstore(key, [key, staging], aggregate="SUM")
+            pipe.delete(staging)
+            if ttl is not None:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def incr(self, key: str, member: str, amount: float) -> None:
+        await self._client.zincrby(key, amount, member)
+
+    async def top(self, key: str, n: int) -> List[Tuple[str, float]]:
+        return await self._client.zrevrange(key, 0, n - 1, withscores=True)
+
+    async def rank(self, key: str, member: str) -> Optional[int]:
+        return await self._client.zrevrank(key, member)
+
+
+_backend: Optional[SortedSetBackend] = None
+_seeded: set = set()
+_seed_lock = asyncio.Lock()
+# user id -> pushes of their committed awards not finished yet
+_push_tasks: Dict[UUID, set] = {}
+
+
+def get_ranking_backend() -> Optional[SortedSetBackend]:
+    """Return the configured sorted-set backend, or None for ``sql``."""
+    global _backend
+    kind = settings.LEADERBOARD_BACKEND
+    if kind == "sql":
+        return None
+    if _backend is None:
+        if kind == "memory":
+            _backend = InMemorySortedSets()
+        elif kind == "redis":
+            _backend = RedisSortedSets(settings.REDIS_URL)
+        else:
+            raise ValueError(f"Unknown LEADERBOARD_BACKEND: {kind}")
+    return _backend
+
+
+def reset_ranking_backend() -> None:
+    """Drop the backend instance and seeding state (used by tests)."""
+    global _backend
+    _backend = None
+    _seeded.clear()
+    _push_tasks.clear()
+
+
+# ---------------------------------------------------------------------------
+# Period keys and seeding
+# ---------------------------------------------------------------------------
+
+
+def period_key(period: str, now: Optional[datetime] = None) -> str:
+    """Return the sorted-set key of *period*'s current window."""
+    start = period_start(period, now or datetime.now(timezone.utc))
+    window = "all" if start is None else start.date().isoformat()
+    return f"{KEY_PREFIX}:{period}:{window}"
+
+
+async def _ensure_seeded(
+    db: AsyncSession, backend: SortedSetBackend, period: str, key: str
+) -> bool:
+    """Load *key* from SQL history unless seeded already; True if seeded now.
+
+    The backend's ``claim_seed`` picks a single seeder across workers.
+    Other workers push their increments to *key* while the history is
+    being read, so the history is added to the scores found there rather
+    than replacing them.  The history is read after the claim: only an
+    award committed just before the claim and pushed just after it can
+    be counted twice.
+    """
+    if key in _seeded:
+        return False
+    async with _seed_lock:
+        if key in _seeded:
+            return False
+        start = period_start(period, datetime.now(timezone.utc))
+        ttl = None
+        if start is not None:
+            length = timedelta(days=31 if period == "monthly" else 7)
+            ttl = start + length - datetime.now(timezone.utc) + WINDOW_KEY_GRACE
+        if not await backend.claim_seed(key, ttl):
+            _seeded.add(key)
+            return False
+
+        result = await db.execute(period_xp_query(start, None))
+        scores = {str(user_id): float(xp or 0) for user_id, xp in result.all() if xp}
+        await backend.add_scores(key, scores, ttl)
+        _seeded.add(key)
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+
+def award_xp(db: AsyncSession, user_id: UUID, xp: float) -> None:
+    """Queue *xp* for *user_id*, pushed to every period once *db* commits.
+
+    Nothing is pushed if the transaction rolls back (no-op for the SQL
+    backend).  Push failures are logged and do not fail the request; the
+    materialized tables still receive the activity.
+    """
+    if get_ranking_backend() is None or not xp:
+        return
+    pending = db.info.setdefault(PENDING_AWARDS, {"bind": db.bind, "awards": []})
+    pending["awards"].append((user_id, xp))
+
+
+async def _push(bind: AsyncEngine, awards: List[Tuple[UUID, float]]) -> None:
+    """Apply committed *awards*; a set seeded now already includes them."""
+    backend = get_ranking_backend()
+    if backend is None:
+        return
+    try:
+        async with AsyncSession(bind) as db:
+            for period in PERIODS:
+                key = period_key(period)
+                if await _ensure_seeded(db, backend, period, key):
+                    continue
+                for user_id, xp in awards:
+                    await backend.incr(key, str(user_id), xp)
+    except Exception:
+        logger.warning("Leaderboard backend update failed", exc_info=True)
+
+
+@event.listens_for(Session, "after_commit")
+def _push_after_commit(session: Session) -> None:
+    pending = session.info.pop(PENDING_AWARDS, None)
+    if pending:
+        task = asyncio.get_running_loop().create_task(
+            _push(pending["bind"], pending["awards"])
+        )
+        users = {user_id for user_id, _ in pending["awards"]}
+        for user_id in users:
+            _push_tasks.setdefault(user_id, set()).add(task)
+        task.add_done_callback(lambda done: _forget_push(done, users))
+
+
+def _forget_push(task: asyncio.Task, users: set) -> None:
+    for user_id in users:
+        tasks = _push_tasks.get(user_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del _push_tasks[user_id]
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session: Session) -> None:
+    session.info.pop(PENDING_AWARDS, None)
+
+
+async def wait_for_pushes(user_id: Optional[UUID] = None) -> None:
+    """Wait for this process' pending pushes of *user_id*'s awards (or all)."""
+    if user_id is None:
+        tasks = set().union(*_push_tasks.values())
+    else:
+        tasks = set(_push_tasks.get(user_id, ()))
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def top_and_rank(
+    db: AsyncSession, period: str, user_id: UUID, n: int
+) -> Tuple[List[Tuple[UUID, float]], Optional[int]]:
+    """Return the top *n* ``(user_id, xp)`` of *period* and *user_id*'s rank.
+
+    Ranks are 1-based positions.  Only the caller's own pending pushes are
+    awaited (they see their latest award), so a slow write for another
+    user never stalls the read.  Raises if the backend is unavailable so
+    callers can fall back to SQL.
+    """
+    backend = get_ranking_backend()
+    key = period_key(period)
+    await wait_for_pushes(user_id)
+    await _ensure_seeded(db, backend, period, key)
+    top = await backend.top(key, n)
+    position = await backend.rank(key, str(user_id))
+    return (
+        [(UUID(member), score) for member, score in top],
+        None if position is None else position + 1,
+    )
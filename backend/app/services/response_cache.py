@@ -0,0 +1,130 @@
+"""Content-addressed cache of AI conversation replies.
+
+The first turns of a scripted scenario are the same for many learners (the
+scenario's opener followed by one of its suggested replies), so the model's
+answer can be reused.  Replies are keyed on a hash of the system prompt,
+the level, and the normalized history and user message; only successful
+replies to conversations of at most ``RESPONSE_CACHE_MAX_HISTORY`` previous
+turns are stored, since longer conversations rarely repeat.
+
+Entries expire after ``RESPONSE_CACHE_TTL_SECONDS`` and the least recently
+used ones are evicted beyond ``RESPONSE_CACHE_SIZE``.  With
+``RESPONSE_CACHE_PATH`` set, the cache is loaded from and saved to that
+JSON file on application startup and shutdown, so a restart keeps it warm.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# key -> {"stored_at": unix time, "reply": reply dict}
+_cache = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE, ttl=settings.RESPONSE_CACHE_TTL_SECONDS
+)
+
+
+def normalize(text: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return " ".join(text.casefold().split()).rstrip(" .!?")
+
+
+def content_key(
+    system_prompt: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    level: str,
+) -> str:
+    """Hash identifying a turn's content, whether or not it is cacheable."""
+    material = [
+        hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        level,
+        [[turn["role"], normalize(turn["content"])] for turn in conversation_history],
+        normalize(user_message),
+    ]
+    encoded = json.dumps(material, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def cache_key(
+    system_prompt: str,
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    level: str,
+) -> Optional[str]:
+    """Return the cache key of a turn, or None if it should not be cached."""
+    if settings.RESPONSE_CACHE_SIZE <= 0:
+        return None
+    if len(conversation_history) > settings.RESPONSE_CACHE_MAX_HISTORY:
+        return None
+    return content_key(system_prompt, conversation_history, user_message, level)
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Return a copy of the cached reply for *key*, or None."""
+    entry = _cache.get(key)
+    return None if entry is None else dict(entry["reply"])
+
+
+def put(key: str, reply: Dict[str, Any]) -> None:
+    """Cache *reply* under *key* unless it is an error fallback."""
+    if reply.get("error") is None:
+        _cache.set(key, {"stored_at": time.time(), "reply": dict(reply)})
+
+
+def stats() -> Dict[str, int]:
+    return _cache.stats()
+
+
+# ---------------------------------------------------------------------------
+# Persistence
+# ---------------------------------------------------------------------------
+
+
+def load(path: Optional[str] = None) -> int:
+    """Load unexpired entries from *path* (default: ``RESPONSE_CACHE_PATH``).
+
+    Returns the number of entries loaded; a missing or unreadable file
+    leaves the cache empty.
+    """
+    path = path or settings.RESPONSE_CACHE_PATH
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        logger.warning("Could not read response cache %s", path, exc_info=True)
+        return 0
+
+    now = time.time()
+    loaded = 0
+    for key, entry in entries.items():
+        remaining = _cache.ttl - (now - entry["stored_at"])
+        if remaining > 0:
+            _cache.set(key, entry, ttl=remaining)
+            loaded += 1
+    return loaded
+
+
+def save(path: Optional[str] = None) -> int:
+    """Write the live entries to *path* (default: ``RESPONSE_CACHE_PATH``).
+
+    The file is replaced atomically.  Returns the number of entries saved.
+    """
+    path = path or settings.RESPONSE_CACHE_PATH
+    if not path:
+        return 0
+    entries = dict(_cache.items())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return len(entries)
@@ -0,0 +1,210 @@
+"""Parsing of Claude's structured conversation replies.
+
+Replies should be a single JSON object, but models sometimes wrap it in a
+Markdown code fence or add a sentence before or after it.
+``extract_json_object`` finds the first balanced JSON object in the text
+and ignores whatever surrounds it; ``parse_reply`` then validates it
+against ``ConversationResponse``.  While a reply is still being streamed,
+``IncrementalFieldParser`` reports each top-level string field as soon as
+its closing quote arrives, so the translation can be shown before the
+suggestions have been generated.
+
+Every failed parse is a wasted model call the learner usually retries, so
+outcomes are counted per model and prompt version (``record_outcome``,
+reported by ``stats()``) to spot a prompt or model change that breaks the
+format.
+"""
+
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.schemas.conversation import ConversationResponse
+
+# Fields of a reply generated by the model (error and usage are ours)
+REPLY_FIELDS = ("arabic", "latin", "english", "correction", "suggestions")
+
+# Fields of which at least one must be non-empty for a usable reply
+TEXT_FIELDS = ("arabic", "latin", "english")
+
+_decoder = json.JSONDecoder()
+
+
+class ReplyParseError(ValueError):
+    """A model reply that is not a usable ``ConversationResponse``.
+
+    *reason* is one of ``no_json``, ``invalid_schema`` or ``empty``.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def extract_json_object(text: str) -> Dict[str, Any]:
+    """Return the first balanced JSON object in *text*.
+
+    Leading and trailing prose (code fences, explanations) is ignored; a
+    ``{`` that does not start a valid object is skipped.  Raises
+    ``ReplyParseError`` if there is none.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(value, dict):
+                return value
+        start = text.find("{", start + 1)
+    raise ReplyParseError("no_json", "No JSON object in the AI response")
+
+
+def parse_reply(text: str) -> Dict[str, Any]:
+    """Parse and validate a model reply into a conversation reply dict.
+
+    Returns the ``ConversationResponse`` fields with ``error`` and
+    ``usage`` set to None; raises ``ReplyParseError``.
+    """
+    parsed = extract_json_object(text)
+    try:
+        reply = ConversationResponse.model_validate(
+            {name: parsed[name] for name in REPLY_FIELDS if name in parsed}
+        )
+    except ValidationError as exc:
+        fields = ", ".join(".".join(map(str, e["loc"])) for e in exc.errors())
+        raise ReplyParseError(
+            "invalid_schema", f"Invalid fields in the AI response: {fields}"
+        ) from None
+    if not any(getattr(reply, name) for name in TEXT_FIELDS):
+        raise ReplyParseError("empty", "The AI response has no text")
+    return reply.model_dump()
+
+
+class IncrementalFieldParser:
+    """Extract top-level string fields from a partial JSON object.
+
+    Feed text chunks in order; ``feed`` returns the ``(name, value)`` pairs
+    of the watched fields completed by that chunk.  Text before the opening
+    ``{`` (e.g. a code fence) is ignored, as is everything after the object
+    closes.  Nested objects and arrays are skipped.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = set(fields)
+        self.emitted: set = set()
+        self._depth = 0
+        self._started = False
+        self._closed = False
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        # At depth 1 the next string is a key until a ':' is seen
+        self._expect_key = True
+        self._key: Optional[str] = None
+
+    @property
+    def closed(self) -> bool:
+        """True once the object's closing brace has been read."""
+        return self._closed
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        completed: List[Tuple[str, str]] = []
+        for char in chunk:
+            if self._closed:
+                break
+            if self._in_string:
+                self._string.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    field = self._end_string()
+                    if field is not None:
+                        completed.append(field)
+                continue
+
+            if char == '"':
+                if self._started:
+                    self._in_string = True
+                    self._string = [char]
+            elif char in "{[":
+                if not self._started:
+                    if char == "{":
+                        self._started = True
+                        self._depth = 1
+                    continue
+                self._depth += 1
+            elif char in "}]":
+                if self._started:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._closed = True
+            elif self._depth == 1:
+                if char == ":":
+                    self._expect_key = False
+                elif char == ",":
+                    self._expect_key = True
+                    self._key = None
+        return completed
+
+    def _end_string(self) -> Optional[Tuple[str, str]]:
+        if self._depth != 1:
+            return None
+        try:
+            value = json.loads("".join(self._string))
+        except json.JSONDecodeError:
+            return None
+        if self._expect_key:
+            self._key = value
+            return None
+        key, self._key = self._key, None
+        if key in self.fields and key not in self.emitted:
+            self.emitted.add(key)
+            return key, value
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Outcome counters
+# ---------------------------------------------------------------------------
+
+# (model, prompt version) -> Counter of "parsed" and failure reasons
+_outcomes: Dict[Tuple[str, str], Counter] = {}
+
+
+def record_outcome(
+    model: str, prompt_version: str, error: Optional[ReplyParseError] = None
+) -> None:
+    """Count one parsed reply, or one failure with *error*'s reason."""
+    counts = _outcomes.setdefault((model, prompt_version), Counter())
+    if error is None:
+        counts["parsed"] += 1
+    else:
+        counts[error.reason] += 1
+
+
+def stats() -> List[Dict[str, Any]]:
+    """Parse outcomes per model and prompt version."""
+    rows = []
+    for (model, prompt_version), counts in sorted(_outcomes.items()):
+        failures = {k: v for k, v in counts.items() if k != "parsed"}
+        rows.append(
+            {
+                "model": model,
+                "prompt_version": prompt_version,
+                "parsed": counts["parsed"],
+                "failed": sum(failures.values()),
+                "failures": failures,
+            }
+        )
+    return rows
+
+
+def reset_stats() -> None:
+    _outcomes.clear()
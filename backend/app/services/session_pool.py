@@ -0,0 +1,163 @@
+"""Pre-generated game session pool.
+
+When ``SESSION_POOL_SIZE`` is greater than zero, up to that many sessions
+per (user, level) are generated ahead of time and kept in memory, so
+``GET /api/games/session`` can pop a ready session instead of building one
+synchronously.  The pool is refilled after the response is sent (FastAPI
+background task) with a fresh database session on the request's engine.
+
+This mode is meant for long-running workers (uvicorn); on Lambda the
+invocation only returns once background tasks finish, so it should stay
+disabled there.
+
+Pools are dropped whenever the inputs of ``generate_session`` change:
+``complete_lesson`` (completed modules) and ``submit_game`` (weaknesses)
+invalidate the user's pools, once right away and once after the commit,
+and sessions built against an older curriculum index version are
+discarded when popped.
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.adaptive import generate_session
+from app.services.curriculum_index import get_curriculum_index
+
+PoolKey = Tuple[UUID, str]
+
+# Session.info key of the users to invalidate again once the commit lands
+CHANGED_USERS = "session_pool_changed_users"
+
+
+class _Refill:
+    """An in-flight refill; marked stale when its user's inputs change."""
+
+    def __init__(self):
+        self.stale = False
+
+
+# (user, level) -> deque of (curriculum index version, session games),
+# least recently used first
+_pools: "OrderedDict[PoolKey, Deque[Tuple[int, List[dict]]]]" = OrderedDict()
+_refilling: Dict[PoolKey, _Refill] = {}
+# user -> keys with a pool or a refill in flight, so invalidation does not
+# scan every user
+_user_keys: Dict[UUID, Set[PoolKey]] = {}
+
+
+def is_enabled() -> bool:
+    return settings.SESSION_POOL_SIZE > 0
+
+
+def _index(key: PoolKey) -> None:
+    _user_keys.setdefault(key[0], set()).add(key)
+
+
+def _unindex(key: PoolKey) -> None:
+    """Forget *key* in the user index once it has no pool and no refill."""
+    if key in _pools or key in _refilling:
+        return
+    keys = _user_keys.get(key[0])
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _user_keys[key[0]]
+
+
+def pop_session(
+    user_id: UUID, level: str, index_version: int
+) -> Optional[List[dict]]:
+    """Return a pre-generated session for (user, level), or None if empty."""
+    pool = _pools.get((user_id, level))
+    while pool:
+        version, games = pool.popleft()
+        if version == index_version:
+            return games
+    return None
+
+
+def needs_refill(user_id: UUID, level: str) -> bool:
+    key = (user_id, level)
+    if key in _refilling:
+        return False
+    return len(_pools.get(key, ())) < settings.SESSION_POOL_SIZE
+
+
+async def refill(user_id: UUID, level: str, bind: AsyncEngine) -> None:
+    """Top the (user, level) pool up to ``SESSION_POOL_SIZE`` sessions."""
+    key = (user_id, level)
+    if key in _refilling:
+        return
+    ticket = _refilling[key] = _Refill()
+    _index(key)
+    session_factory = async_sessionmaker(
+        bind, class_=AsyncSession, expire_on_commit=False
+    )
+    try:
+        async with session_factory() as db:
+            while len(_pools.get(key, ())) < settings.SESSION_POOL_SIZE:
+                index = await get_curriculum_index(db)
+                games = await generate_session(db, user_id, level)
+                if ticket.stale:
+                    # Progress changed while generating; the next request
+                    # starts a new refill instead of storing stale sessions
+                    break
+                pool = _pools.setdefault(key, deque())
+                pool.append((index.version, games))
+                _pools.move_to_end(key)
+                while len(_pools) > settings.SESSION_POOL_MAX_USERS:
+                    evicted, _ = _pools.popitem(last=False)
+                    _unindex(evicted)
+                # Let request handlers run between generations
+                await asyncio.sleep(0)
+    finally:
+        if _refilling.get(key) is ticket:
+            del _refilling[key]
+        _unindex(key)
+
+
+def invalidate_user(user_id: UUID) -> None:
+    """Drop every pooled session of *user_id* (all levels)."""
+    for key in _user_keys.pop(user_id, ()):
+        _pools.pop(key, None)
+        ticket = _refilling.get(key)
+        if ticket is not None:
+            ticket.stale = True
+            # Still refilling: stay indexed until the refill ends
+            _index(key)
+
+
+def mark_user_changed(db: AsyncSession, user_id: UUID) -> None:
+    """Invalidate *user_id*'s pools now and again once *db* commits.
+
+    The second invalidation covers refills that start between the change
+    and the commit and would otherwise pool sessions built from the old
+    data.
+    """
+    invalidate_user(user_id)
+    db.info.setdefault(CHANGED_USERS, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for user_id in session.info.pop(CHANGED_USERS, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session) -> None:
+    session.info.pop(CHANGED_USERS, None)
+
+
+def clear() -> None:
+    """Drop every pooled session (used by tests)."""
+    _pools.clear()
+    _refilling.clear()
+    _user_keys.clear()
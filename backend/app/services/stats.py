@@ -0,0 +1,187 @@
+"""Per-user running counters (``user_stats``).
+
+Lesson and game counts, score sums per skill and the last activity time
+are updated incrementally by ``complete_lesson`` and ``submit_game`` in the
+same transaction as the fact rows, so the progress summary and badge
+checks read a single row instead of aggregating the user's whole history.
+
+Rows missing for users who were active before the table existed are
+built from the fact tables on first use; ``python -m app.cli
+backfill-stats`` rebuilds (repairs) them all.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert
+from app.models.progress import GameResult, UserProgress, UserStats
+
+SKILLS = ("vocabulary", "grammar", "phrases", "culture", "conversation")
+
+# Maps game_type -> skill category for the radar chart
+GAME_SKILL_MAP = {
+    "word_match": "vocabulary",
+    "memory_match": "vocabulary",
+    "word_scramble": "vocabulary",
+    "flashcard_sprint": "vocabulary",
+    "fill_blank": "grammar",
+    "translation": "phrases",
+    "cultural_quiz": "culture",
+    "conversation": "conversation",
+    "listening": "phrases",
+}
+
+
+# ---------------------------------------------------------------------------
+# Incremental updates
+# ---------------------------------------------------------------------------
+
+
+async def record_lesson(db: AsyncSession, user_id: UUID, score: float) -> None:
+    """Count a completed lesson.  Call after its ``UserProgress`` is flushed."""
+    await _increment(
+        db,
+        user_id,
+        {
+            "lessons_completed": 1,
+            "lesson_score_sum": score,
+            "perfect_scores": 1 if score >= 1.0 else 0,
+        },
+    )
+
+
+async def record_game(
+    db: AsyncSession, user_id: UUID, game_type: str, score: float
+) -> None:
+    """Count a played game.  Call after its ``GameResult`` is flushed."""
+    deltas: Dict[str, float] = {
+        "games_played": 1,
+        "perfect_scores": 1 if score >= 1.0 else 0,
+    }
+    skill = GAME_SKILL_MAP.get(game_type)
+    if skill:
+        deltas[f"{skill}_score_sum"] = score
+        deltas[f"{skill}_count"] = 1
+    await _increment(db, user_id, deltas)
+
+
+async def _increment(db: AsyncSession, user_id: UUID, deltas: Dict[str, float]) -> None:
+    values = {
+        name: getattr(UserStats, name) + delta
+        for name, delta in deltas.items()
+        if delta
+    }
+    values["last_activity"] = datetime.now(timezone.utc)
+    stmt = (
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    if result.rowcount == 0 and not await _create_user_stats(db, user_id):
+        # A concurrent first activity created the row first, from fact rows
+        # that cannot include this uncommitted one: count it on top
+        await db.execute(stmt)
+
+
+# ---------------------------------------------------------------------------
+# Reads and rebuilds
+# ---------------------------------------------------------------------------
+
+
+async def get_user_stats(db: AsyncSession, user_id: UUID) -> UserStats:
+    """Return the user's counters, rebuilding the row if it is missing."""
+    stats = await db.get(UserStats, user_id, populate_existing=True)
+    if stats is None:
+        await _create_user_stats(db, user_id)
+        stats = await db.get(UserStats, user_id, populate_existing=True)
+    return stats
+
+
+def skill_average(stats: UserStats, skill: str) -> Optional[float]:
+    """Return the mean game score for *skill*, or None if never played."""
+    count = getattr(stats, f"{skill}_count")
+    if not count:
+        return None
+    return getattr(stats, f"{skill}_score_sum") / count
+
+
+async def rebuild_user_stats(db: AsyncSession, user_id: UUID) -> UserStats:
+    """Recompute the user's counters from the fact tables and store them."""
+    values = await _computed_stats(db, user_id)
+    stmt = upsert(db, UserStats).values(**values)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={k: v for k, v in values.items() if k != "user_id"},
+        )
+    )
+    return await db.get(UserStats, user_id, populate_existing=True)
+
+
+async def _create_user_stats(db: AsyncSession, user_id: UUID) -> bool:
+    """Insert the user's missing row from the fact tables.
+
+    The fact rows (including any just flushed) are the source of truth.
+    Returns False, leaving the row alone, if another transaction created
+    it meanwhile: overwriting it would drop that transaction's counts.
+    """
+    values = await _computed_stats(db, user_id)
+    stmt = upsert(db, UserStats).values(**values)
+    result = await db.execute(
+        stmt.on_conflict_do_nothing(index_elements=[UserStats.user_id])
+    )
+    return result.rowcount == 1
+
+
+async def _computed_stats(db: AsyncSession, user_id: UUID) -> Dict[str, object]:
+    lesson_result = await db.execute(
+        select(
+            func.count(UserProgress.id),
+            func.coalesce(func.sum(UserProgress.score), 0.0),
+            func.count(UserProgress.id).filter(UserProgress.score >= 1.0),
+            func.max(UserProgress.completed_at),
+        ).where(UserProgress.user_id == user_id)
+    )
+    lessons, lesson_score_sum, lesson_perfects, last_lesson = lesson_result.one()
+
+    game_result = await db.execute(
+        select(
+            GameResult.game_type,
+            func.count(GameResult.id),
+            func.sum(GameResult.score),
+            func.count(GameResult.id).filter(GameResult.score >= 1.0),
+            func.max(GameResult.played_at),
+        )
+        .where(GameResult.user_id == user_id)
+        .group_by(GameResult.game_type)
+    )
+
+    values: Dict[str, object] = {
+        "user_id": user_id,
+        "lessons_completed": lessons,
+        "lesson_score_sum": float(lesson_score_sum),
+        "games_played": 0,
+        "perfect_scores": lesson_perfects,
+        "last_activity": last_lesson,
+    }
+    for skill in SKILLS:
+        values[f"{skill}_score_sum"] = 0.0
+        values[f"{skill}_count"] = 0
+
+    for game_type, count, score_sum, perfects, last_played in game_result.all():
+        values["games_played"] += count
+        values["perfect_scores"] += perfects
+        skill = GAME_SKILL_MAP.get(game_type)
+        if skill:
+            values[f"{skill}_score_sum"] += float(score_sum or 0.0)
+            values[f"{skill}_count"] += count
+        last = values["last_activity"]
+        if last_played is not None and (last is None or last_played > last):
+            values["last_activity"] = last_played
+    return values
@@ -4,14 +4,16 @@ Handles XP calculation, streak management, and badge awards.
 """
 
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import Dict, List
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.progress import Badge, GameResult, UserBadge, UserProgress
+from app.core.database import upsert
+from app.models.progress import Badge, UserBadge, UserStats
 from app.models.user import User
+from app.services.stats import get_user_stats
 
 # ---------------------------------------------------------------------------
 # XP constants
@@ -146,85 +148,113 @@ BADGE_DEFINITIONS = [
 ]
 
 
+# Badge name -> id, seeded at startup (see ``load_badge_ids``).  Badge rows
+# are only ever created from BADGE_DEFINITIONS, so the mapping is stable.
+_badge_ids: Dict[str, UUID] = {}
+
+
+async def load_badge_ids(db: AsyncSession) -> Dict[str, UUID]:
+    """Create missing built-in badge rows and cache their ids by name."""
+    existing = await db.execute(select(Badge.name, Badge.id))
+    ids = dict(existing.all())
+
+    missing = [d for d in BADGE_DEFINITIONS if d["name"] not in ids]
+    if missing:
+        stmt = upsert(db, Badge).values(
+            [
+                {
+                    "name": d["name"],
+                    "description": d["description"],
+                    "icon": d["icon"],
+                    "criteria_json": {"check": d["check"], "threshold": d["threshold"]},
+                }
+                for d in missing
+            ]
+        )
+        # Another worker may be seeding the same rows concurrently
+        await db.execute(stmt.on_conflict_do_nothing(index_elements=[Badge.name]))
+        existing = await db.execute(select(Badge.name, Badge.id))
+        ids = dict(existing.all())
+
+    _badge_ids.clear()
+    _badge_ids.update(ids)
+    return _badge_ids
+
+
+def reset_badge_cache() -> None:
+    """Forget cached badge ids (used by tests, whose tables are recreated)."""
+    _badge_ids.clear()
+
+
 async def check_badges(
     db: AsyncSession, user_id: UUID, latest_score: float = 0.0
 ) -> List[dict]:
     """Check all badge criteria and award any newly earned badges.
 
+    Lesson and game counts are read from the user's ``user_stats`` row in
+    the same query as their streak and XP, and all new badges are inserted
+    with one statement.
+
     Returns a list of dicts describing newly earned badges.
     """
-    # Gather user stats
-    user_result = await db.execute(select(User).where(User.id == user_id))
-    user = user_result.scalar_one_or_none()
-    if user is None:
+    stats_result = await db.execute(
+        select(
+            User.streak,
+            User.xp,
+            UserStats.lessons_completed,
+            UserStats.games_played,
+            UserStats.perfect_scores,
+        )
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.id == user_id)
+    )
+    row = stats_result.one_or_none()
+    if row is None:
         return []
+    streak, total_xp, lessons, games, perfects = row
+    if lessons is None:
+        stats = await get_user_stats(db, user_id)
+        lessons, games, perfects = (
+            stats.lessons_completed,
+            stats.games_played,
+            stats.perfect_scores,
+        )
 
-    lessons_result = await db.execute(
-        select(UserProgress).where(UserProgress.user_id == user_id)
-    )
-    lessons_completed = len(lessons_result.scalars().all())
+    values = {
+        "lessons_completed": lessons,
+        "games_played": games,
+        "streak": streak,
+        "total_xp": total_xp,
+        "perfect_score": max(perfects, 1 if latest_score >= 1.0 else 0),
+    }
+    met = [d for d in BADGE_DEFINITIONS if values[d["check"]] >= d["threshold"]]
+    if not met:
+        return []
 
-    games_result = await db.execute(
-        select(GameResult).where(GameResult.user_id == user_id)
-    )
-    games_played = len(games_result.scalars().all())
+    badge_ids = _badge_ids
+    if any(d["name"] not in badge_ids for d in met):
+        badge_ids = await load_badge_ids(db)
 
-    # Already-earned badge names
     earned_result = await db.execute(
         select(UserBadge.badge_id).where(UserBadge.user_id == user_id)
     )
-    earned_badge_ids = {row[0] for row in earned_result.all()}
-
-    newly_earned: List[dict] = []
-
-    for badge_def in BADGE_DEFINITIONS:
-        check = badge_def["check"]
-        threshold = badge_def["threshold"]
-        met = False
-
-        if check == "lessons_completed":
-            met = lessons_completed >= threshold
-        elif check == "games_played":
-            met = games_played >= threshold
-        elif check == "streak":
-            met = user.streak >= threshold
-        elif check == "total_xp":
-            met = user.xp >= threshold
-        elif check == "perfect_score":
-            met = latest_score >= 1.0
-
-        if not met:
-            continue
-
-        # Ensure the badge row exists in the badges table
-        badge_row_result = await db.execute(
-            select(Badge).where(Badge.name == badge_def["name"])
-        )
-        badge_row = badge_row_result.scalar_one_or_none()
-        if badge_row is None:
-            badge_row = Badge(
-                name=badge_def["name"],
-                description=badge_def["description"],
-                icon=badge_def["icon"],
-                criteria_json={"check": check, "threshold": threshold},
-            )
-            db.add(badge_row)
-            await db.flush()
-
-        if badge_row.id in earned_badge_ids:
-            continue
-
-        # Award badge
-        user_badge = UserBadge(user_id=user_id, badge_id=badge_row.id)
-        db.add(user_badge)
-        await db.flush()
-
-        newly_earned.append(
-            {
-                "name": badge_def["name"],
-                "description": badge_def["description"],
-                "icon": badge_def["icon"],
-            }
+    earned_badge_ids = set(earned_result.scalars().all())
+
+    new_badges = [d for d in met if badge_ids[d["name"]] not in earned_badge_ids]
+    if not new_badges:
+        return []
+
+    await db.execute(
+        insert(UserBadge).values(
+            [{"user_id": user_id, "badge_id": badge_ids[d["name"]]} for d in new_badges]
         )
+    )
 
-    return newly_earned
+    return [
+        {
+            "name": badge_def["name"],
+            "description": badge_def["description"],
+            "icon": badge_def["icon"],
+        }
+        for badge_def in new_badges
+    ]
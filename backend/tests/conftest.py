@@ -5,8 +5,21 @@ import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from app.core.cache import clear_all_caches
+from app.core.config import settings
 from app.core.database import Base, get_db
 from app.main import application
+from app.services import (
+    admission,
+    conversation_tree,
+    response_parser,
+    session_pool,
+)
+from app.services.conversation_sessions import reset_session_store
+from app.services.curriculum_index import invalidate_curriculum_index
+from app.services.llm import reset_llm_provider
+from app.services.ranking import reset_ranking_backend
+from app.services.xp import reset_badge_cache
 
 # ---------------------------------------------------------------------------
 # Test database setup (in-memory SQLite for full isolation)
@@ -14,6 +27,9 @@ from app.main import application
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
+# Minimum bcrypt cost: hashing strength is irrelevant in tests
+settings.BCRYPT_ROUNDS = 4
+
 test_engine = create_async_engine(TEST_DATABASE_URL, echo=False)
 TestSessionLocal = async_sessionmaker(
     test_engine, class_=AsyncSession, expire_on_commit=False
@@ -47,6 +63,18 @@ async def setup_database():
     # Ensure all models are imported so Base.metadata is populated
     import app.models  # noqa: F401
 
+    # Process-wide caches must not leak content between tests
+    invalidate_curriculum_index()
+    session_pool.clear()
+    reset_badge_cache()
+    clear_all_caches()
+    reset_ranking_backend()
+    reset_session_store()
+    admission.reset()
+    reset_llm_provider()
+    response_parser.reset_stats()
+    conversation_tree.clear()
+
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield
@@ -1,8 +1,12 @@
 """API integration tests for DarijaLingo backend."""
 
+from uuid import UUID
+
 import pytest
 from httpx import AsyncClient
 
+from app.core.cache import clear_all_caches
+
 
 # ---------------------------------------------------------------------------
 # Health Check
@@ -146,6 +150,79 @@ class TestProgress:
         assert data["current_streak"] == 0
         assert data["average_score"] == 0.0
 
+    async def test_progress_counts_games(self, client: AsyncClient, auth_headers: dict):
+        """Game submissions update the summary counters and skill averages."""
+        for game_type, score in (("word_match", 1.0), ("fill_blank", 0.5)):
+            response = await client.post(
+                f"/api/games/{game_type}/submit",
+                json={"score": score, "answers": []},
+                headers=auth_headers,
+            )
+            assert response.status_code == 200
+
+        response = await client.get("/api/progress/", headers=auth_headers)
+        data = response.json()
+        assert data["total_games_played"] == 2
+        assert data["total_lessons_completed"] == 0
+        assert data["skills"]["vocabulary"] == 100.0
+        assert data["skills"]["grammar"] == 50.0
+        assert data["skills"]["culture"] == 0
+        assert sum(entry["xp"] for entry in data["xp_history"]) > 0
+
+    async def test_concurrent_first_activities_are_both_counted(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """A stats row created concurrently is incremented, not overwritten."""
+        from app.models.progress import UserStats
+        from app.services import stats
+
+        create_user_stats = stats._create_user_stats
+
+        async def create_after_other_activity(db, user_id):
+            # Another first activity, whose game this transaction cannot
+            # see, created the row just before this one
+            db.add(UserStats(user_id=user_id, games_played=1, vocabulary_count=1))
+            await db.flush()
+            return await create_user_stats(db, user_id)
+
+        monkeypatch.setattr(stats, "_create_user_stats", create_after_other_activity)
+        response = await client.post(
+            "/api/games/word_match/submit",
+            json={"score": 1.0, "answers": []},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+
+        data = (await client.get("/api/progress/", headers=auth_headers)).json()
+        assert data["total_games_played"] == 2
+
+    async def test_progress_lessons_by_module(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Completed lessons are counted per module and feed the XP history."""
+        await client.post(
+            "/api/curriculum/load",
+            json={
+                "module_id": "greetings",
+                "level": "a2",
+                "title": "Greetings",
+                "lessons": [{"title": "Hello", "order": 1}],
+            },
+        )
+        lessons = (await client.get("/api/lessons/", headers=auth_headers)).json()
+        lesson_id = lessons["lessons"][0]["id"]
+        for _ in range(2):
+            await client.post(
+                f"/api/lessons/{lesson_id}/complete",
+                json={"score": 1.0},
+                headers=auth_headers,
+            )
+
+        response = await client.get("/api/progress/", headers=auth_headers)
+        data = response.json()
+        assert data["lessons_by_module"] == {"greetings": 2}
+        assert data["xp_history"][-1]["xp"] == 100
+
     async def test_get_weaknesses(self, client: AsyncClient, auth_headers: dict):
         """GET /progress/weaknesses should return an empty list initially."""
         response = await client.get("/api/progress/weaknesses", headers=auth_headers)
@@ -209,7 +286,1020 @@ class TestLeaderboard:
         assert len(data["entries"]) >= 1
         assert data["user_rank"] is not None
 
+    async def test_leaderboard_ranks_users_outside_top(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Users beyond the top entries still get their rank."""
+        from app.api import leaderboard
+
+        monkeypatch.setattr(leaderboard, "LEADERBOARD_SIZE", 1)
+        await client.post(
+            "/api/games/word_match/submit",
+            json={"score": 1.0, "answers": []},
+            headers=auth_headers,
+        )
+        response = await client.post(
+            "/api/auth/register",
+            json={
+                "email": "second@example.com",
+                "password": "securepass123",
+                "display_name": "Second",
+            },
+        )
+        other = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        first = (await client.get("/api/leaderboard/", headers=auth_headers)).json()
+        second = (await client.get("/api/leaderboard/", headers=other)).json()
+        assert first["entries"] == second["entries"]
+        assert [e["display_name"] for e in first["entries"]] == ["Test User"]
+        assert first["user_rank"] == 1
+        assert second["user_rank"] == 2
+
+    async def test_materialized_leaderboard(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Materialized periods are ranked by period XP and updated incrementally."""
+        from datetime import datetime, timedelta, timezone
+
+        from app.models.progress import GameResult
+        from app.services.leaderboard import materialize_leaderboards
+        from tests.conftest import TestSessionLocal
+
+        me = (await client.get("/api/auth/me", headers=auth_headers)).json()
+        response = await client.post(
+            "/api/auth/register",
+            json={
+                "email": "second@example.com",
+                "password": "securepass123",
+                "display_name": "Second",
+            },
+        )
+        other = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        other_id = (await client.get("/api/auth/me", headers=other)).json()["id"]
+        # Start of a weekly window; activity and runs are placed relative to it
+        monday = datetime(2026, 10, 12, tzinfo=timezone.utc)
+
+        async def play(user_id: str, xp: int, at: datetime):
+            async with TestSessionLocal() as db:
+                db.add(
+                    GameResult(
+                        user_id=UUID(user_id),
+                        game_type="word_match",
+                        score=1.0,
+                        xp_earned=xp,
+                        played_at=at,
+                    )
+                )
+                await db.commit()
+
+        async def materialize(now: datetime):
+            async with TestSessionLocal() as db:
+                return await materialize_leaderboards(db, ["weekly"], now=now)
+
+        async def entries():
+            response = await client.get("/api/leaderboard/", headers=auth_headers)
+            data = response.json()
+            return [
+                (e["display_name"], e["xp_total"], e["rank"]) for e in data["entries"]
+            ]
+
+        await play(me["id"], 40, monday + timedelta(days=1))
+        await play(other_id, 30, monday + timedelta(days=1))
+        await play(other_id, 500, monday - timedelta(days=1))  # previous week
+        assert await materialize(monday + timedelta(days=2)) == {"weekly": 2}
+        assert await entries() == [("Test User", 40, 1), ("Second", 30, 2)]
+
+        # Only activity past the watermark is added to the running totals
+        await play(other_id, 20, monday + timedelta(days=2, hours=1))
+        assert await materialize(monday + timedelta(days=3)) == {"weekly": 1}
+        clear_all_caches()
+        assert await entries() == [("Second", 50, 1), ("Test User", 40, 2)]
+
+        # A new week starts from an empty board instead of the live fallback
+        assert await materialize(monday + timedelta(days=8)) == {"weekly": 0}
+        clear_all_caches()
+        assert await entries() == []
+
+    async def test_leaderboard_counts_awarded_lesson_xp(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Lessons are ranked by the XP actually awarded, bonuses included."""
+        from datetime import datetime, timedelta, timezone
+
+        from app.services.leaderboard import materialize_leaderboards
+        from tests.conftest import TestSessionLocal
+
+        await client.post(
+            "/api/curriculum/load",
+            json={
+                "module_id": "greetings",
+                "level": "a2",
+                "title": "Greetings",
+                "lessons": [{"title": "Hello", "order": 1}],
+            },
+        )
+        lessons = (await client.get("/api/lessons/", headers=auth_headers)).json()
+        response = await client.post(
+            f"/api/lessons/{lessons['lessons'][0]['id']}/complete",
+            json={"score": 1.0},
+            headers=auth_headers,
+        )
+        xp_earned = response.json()["xp_earned"]
+        assert xp_earned > 50  # perfect score bonus
+
+        later = datetime.now(timezone.utc) + timedelta(minutes=5)
+        async with TestSessionLocal() as db:
+            await materialize_leaderboards(db, ["all-time"], now=later)
+
+        response = await client.get(
+            "/api/leaderboard/?period=all-time", headers=auth_headers
+        )
+        me = (await client.get("/api/auth/me", headers=auth_headers)).json()
+        assert [e["xp_total"] for e in response.json()["entries"]] == [xp_earned]
+        assert me["xp"] == xp_earned
+
+    async def test_sorted_set_leaderboard(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """The in-memory sorted-set backend is seeded from SQL, then updated live."""
+        from app.core.config import settings
+
+        async def submit(headers: dict, score: float) -> int:
+            response = await client.post(
+                "/api/games/word_match/submit",
+                json={"score": score, "answers": []},
+                headers=headers,
+            )
+            return response.json()["xp_earned"]
+
+        # Activity from before the backend was enabled is seeded from SQL
+        first_xp = await submit(auth_headers, 0.5)
+        monkeypatch.setattr(settings, "LEADERBOARD_BACKEND", "memory")
+
+        response = await client.post(
+            "/api/auth/register",
+            json={
+                "email": "second@example.com",
+                "password": "securepass123",
+                "display_name": "Second",
+            },
+        )
+        other = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        other_xp = await submit(other, 1.0)
+        first_xp += await submit(auth_headers, 1.0)
+
+        for period in ("weekly", "all-time"):
+            response = await client.get(
+                f"/api/leaderboard/?period={period}", headers=other
+            )
+            data = response.json()
+            assert [(e["display_name"], e["xp_total"]) for e in data["entries"]] == [
+                ("Test User", first_xp),
+                ("Second", other_xp),
+            ]
+            assert [e["rank"] for e in data["entries"]] == [1, 2]
+            assert data["user_rank"] == 2
+
+        # Awards reach the sets only when their transaction commits
+        from uuid import uuid4
+
+        from sqlalchemy import text
+
+        from app.services import ranking
+        from tests.conftest import TestSessionLocal
+
+        member = uuid4()
+        backend = ranking.get_ranking_backend()
+        key = ranking.period_key("all-time")
+        for outcome in ("rollback", "commit"):
+            async with TestSessionLocal() as db:
+                await db.execute(text("SELECT 1"))
+                ranking.award_xp(db, member, 1000)
+                await getattr(db, outcome)()
+            await ranking.wait_for_pushes()
+            rank = await backend.rank(key, str(member))
+            assert rank == (None if outcome == "rollback" else 0)
+
+        # Readers wait for their own pending pushes only
+        import asyncio
+
+        stalled = asyncio.get_running_loop().create_future()
+        ranking._push_tasks[uuid4()] = {stalled}
+        await asyncio.wait_for(ranking.wait_for_pushes(member), timeout=5)
+        stalled.cancel()
+
+        # A push landing while another worker still reads the history is
+        # added to that history, neither overwritten nor skipped by it
+        ranking.reset_ranking_backend()
+        backend = ranking.get_ranking_backend()
+        assert await backend.claim_seed(key, None)  # the other worker
+        async with TestSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+            ranking.award_xp(db, member, 5)
+            await db.commit()
+        await ranking.wait_for_pushes()
+        await backend.add_scores(key, {str(member): 1000.0}, None)
+        assert (await backend.top(key, 1))[0] == (str(member), 1005.0)
+
     async def test_leaderboard_requires_auth(self, client: AsyncClient):
         """GET /leaderboard/ without auth should return 403."""
         response = await client.get("/api/leaderboard/")
         assert response.status_code in (401, 403)
+
+
+# ---------------------------------------------------------------------------
+# Flashcards
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+class TestFlashcards:
+    async def test_review_updates_cards_in_bulk(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """A review batch costs the same statements whatever its size."""
+        from sqlalchemy import event
+
+        from tests.conftest import test_engine
+
+        card_ids = []
+        for i in range(12):
+            response = await client.post(
+                "/api/flashcards",
+                json={"front_latin": f"kelma {i}", "back": f"word {i}"},
+                headers=auth_headers,
+            )
+            assert response.status_code == 201
+            card_ids.append(response.json()["id"])
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+        try:
+            counts = []
+            for batch in (card_ids[:1], card_ids[1:]):
+                statements.clear()
+                response = await client.post(
+                    "/api/flashcards/review",
+                    json={"results": [{"card_id": c, "known": True} for c in batch]},
+                    headers=auth_headers,
+                )
+                assert response.json()["updated"] == len(batch)
+                counts.append(len(statements))
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+        assert counts[0] == counts[1]
+
+        # Repeated cards move once per review; unknown cards are reported
+        missing = "00000000-0000-0000-0000-000000000000"
+        results = [
+            {"card_id": card_ids[0], "known": True},
+            {"card_id": card_ids[0], "known": True},
+            {"card_id": missing, "known": True},
+            {"card_id": card_ids[1], "known": False},
+        ]
+        response = await client.post(
+            "/api/flashcards/review", json={"results": results}, headers=auth_headers
+        )
+        data = response.json()
+        assert data["updated"] == 3
+        assert [(r["updated"], r["box"]) for r in data["results"]] == [
+            (True, 3),
+            (True, 3),
+            (False, None),
+            (True, 1),
+        ]
+
+        deck = (await client.get("/api/flashcards/my-deck", headers=auth_headers)).json()
+        by_id = {card["id"]: card for card in deck}
+        assert by_id[card_ids[0]]["box"] == 3
+        assert by_id[card_ids[0]]["review_count"] == 3
+        assert by_id[card_ids[1]]["box"] == 1
+        assert by_id[card_ids[1]]["review_count"] == 2
+        assert by_id[card_ids[2]]["review_count"] == 1
+
+
+# ---------------------------------------------------------------------------
+# AI Conversation
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+class TestAIConversation:
+    """Tests for /api/ai endpoints with a stubbed Bedrock client."""
+
+    async def test_bedrock_calls_do_not_block_the_event_loop(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Slow Bedrock calls run concurrently while other requests are served."""
+        import asyncio
+        import io
+        import json
+        import threading
+
+        from app.services.llm import get_llm_provider
+
+        reply = {
+            "arabic": "",
+            "latin": "Labas, hamdullah",
+            "english": "Fine, thank God",
+            "correction": None,
+            "suggestions": [],
+        }
+
+        # Every call blocks until released, so the calls only overlap if each
+        # runs off the event loop; count how many are in flight at once
+        loop = asyncio.get_running_loop()
+        all_in_flight = asyncio.Event()
+        release = threading.Event()
+        lock = threading.Lock()
+        in_flight = peak = 0
+
+        class SlowBedrock:
+            def invoke_model(self, **kwargs):
+                nonlocal in_flight, peak
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                    if in_flight == 4:
+                        loop.call_soon_threadsafe(all_in_flight.set)
+                try:
+                    release.wait(timeout=5)
+                finally:
+                    with lock:
+                        in_flight -= 1
+                text = "```json\n" + json.dumps(reply) + "\n```"
+                body = json.dumps({"content": [{"text": text}]}).encode()
+                return {"body": io.BytesIO(body)}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", SlowBedrock())
+
+        async def converse(i: int):
+            return await client.post(
+                "/api/ai/open-conversation",
+                json={"message": f"Labas {i}?"},
+                headers=auth_headers,
+            )
+
+        calls = [asyncio.create_task(converse(i)) for i in range(4)]
+        try:
+            await asyncio.wait_for(all_in_flight.wait(), timeout=5)
+            # All four calls are blocked, yet the loop still serves requests
+            health = await client.get("/api/health")
+        finally:
+            release.set()
+        responses = await asyncio.gather(*calls)
+
+        assert health.status_code == 200
+        assert peak == 4
+        for response in responses:
+            assert response.status_code == 200
+            assert response.json()["latin"] == "Labas, hamdullah"
+            assert response.json()["error"] is None
+
+    async def test_conversation_stream(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Reply fields are streamed as SSE as soon as each one is complete."""
+        import json
+
+        from app.services.llm import get_llm_provider
+
+        reply = {
+            "arabic": "لاباس، الحمد لله",
+            "latin": "Labas, l7amdulillah",
+            "english": "Fine, \"thank God\"",
+            "correction": None,
+            "suggestions": [{"arabic": "", "latin": "Chokran", "english": "Thanks"}],
+        }
+        text = "```json\n" + json.dumps(reply, ensure_ascii=False) + "\n```"
+
+        class StreamingBedrock:
+            def invoke_model_with_response_stream(self, **kwargs):
+                def events():
+                    yield {"chunk": {"bytes": b'{"type": "message_start"}'}}
+                    for i in range(0, len(text), 7):
+                        delta = {"type": "text_delta", "text": text[i : i + 7]}
+                        chunk = {"type": "content_block_delta", "delta": delta}
+                        yield {"chunk": {"bytes": json.dumps(chunk).encode()}}
+
+                return {"body": events()}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", StreamingBedrock())
+
+        response = await client.post(
+            "/api/ai/conversation/stream",
+            json={"message": "Labas?"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event_line, data_line = block.split("\n")
+            events.append((event_line[len("event: ") :], json.loads(data_line[6:])))
+
+        assert events[:3] == [
+            ("field", {"name": "arabic", "value": reply["arabic"]}),
+            ("field", {"name": "latin", "value": reply["latin"]}),
+            ("field", {"name": "english", "value": reply["english"]}),
+        ]
+        event, done = events[3]
+        assert event == "done" and len(events) == 4
+        assert done["suggestions"][0]["latin"] == "Chokran"
+        assert done["correction"] is None and done["error"] is None
+
+    async def test_conversation_stream_reports_errors(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """A failing stream still ends with a done event carrying the error."""
+        import json
+
+        from app.services.llm import get_llm_provider
+
+        class BrokenBedrock:
+            def invoke_model_with_response_stream(self, **kwargs):
+                raise RuntimeError("stream unavailable")
+
+        monkeypatch.setattr(get_llm_provider(), "_client", BrokenBedrock())
+
+        response = await client.post(
+            "/api/ai/open-conversation/stream",
+            json={"message": "Salam"},
+            headers=auth_headers,
+        )
+        event_line, data_line = response.text.strip().split("\n")
+        assert event_line == "event: done"
+        assert json.loads(data_line[6:])["error"] == "stream unavailable"
+
+    async def test_abandoned_stream_closes_the_bedrock_stream(self, monkeypatch):
+        """A consumer leaving early closes the event stream and frees the thread."""
+        import json
+        import threading
+
+        from app.services.llm import get_llm_provider, new_usage
+
+        class EventStream:
+            def __init__(self):
+                self.closed = threading.Event()
+                self.drained = False
+
+            def __iter__(self):
+                chunk = {"type": "content_block_delta", "delta": {"text": "Sa"}}
+                yield {"chunk": {"bytes": json.dumps(chunk).encode()}}
+                # Like the real stream, wait on the socket until it is closed
+                self.closed.wait(timeout=5)
+                self.drained = True
+
+            def close(self):
+                self.closed.set()
+
+        events = EventStream()
+
+        class StreamingBedrock:
+            def invoke_model_with_response_stream(self, **kwargs):
+                return {"body": events}
+
+        provider = get_llm_provider()
+        monkeypatch.setattr(provider, "_client", StreamingBedrock())
+
+        stream = provider.stream({"messages": []}, new_usage())
+        assert await stream.__anext__() == "Sa"
+        await stream.aclose()
+        assert events.closed.is_set()
+        assert events.drained
+
+    async def test_repeated_turns_are_served_from_cache(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch, tmp_path
+    ):
+        """Identical early turns reuse the reply; errors and long chats do not."""
+        import io
+        import json
+
+        from app.services import response_cache
+        from app.services.llm import get_llm_provider
+
+        calls = []
+
+        class CountingBedrock:
+            def invoke_model(self, **kwargs):
+                calls.append(json.loads(kwargs["body"]))
+                if len(calls) == 1:
+                    text = "not json"
+                else:
+                    text = json.dumps({"latin": f"reply {len(calls)}"})
+                body = json.dumps({"content": [{"text": text}]}).encode()
+                return {"body": io.BytesIO(body)}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", CountingBedrock())
+        opener = {"role": "assistant", "content": "Salam! Labas 3lik? Ana Karim."}
+
+        async def converse(message: str, history: list) -> dict:
+            response = await client.post(
+                "/api/ai/conversation",
+                json={"message": message, "history": history},
+                headers=auth_headers,
+            )
+            return response.json()
+
+        # Failed replies are not cached
+        assert (await converse("Salam! Labas lhamdulah", [opener]))["error"]
+        assert (await converse("Salam! Labas lhamdulah", [opener]))["latin"] == (
+            "reply 2"
+        )
+        # Case, spacing and trailing punctuation do not matter
+        again = await converse("  salam!  labas LHAMDULAH. ", [opener])
+        assert again["latin"] == "reply 2" and len(calls) == 2
+
+        # A different history, or one longer than the limit, calls the model
+        await converse("Salam! Labas lhamdulah", [])
+        long_history = [opener] * 3
+        await converse("Salam! Labas lhamdulah", long_history)
+        await converse("Salam! Labas lhamdulah", long_history)
+        assert len(calls) == 5
+
+        # Persistence round-trip
+        path = str(tmp_path / "responses.json")
+        assert response_cache.save(path) == 2
+        clear_all_caches()
+        assert response_cache.load(path) == 2
+        assert (await converse("Salam! Labas lhamdulah", [opener]))["latin"] == (
+            "reply 2"
+        )
+        assert len(calls) == 5
+
+    async def test_long_history_is_compacted(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Old turns are summarized within the budget and usage is reported."""
+        import io
+        import json
+
+        from app.core.config import settings
+        from app.services.llm import get_llm_provider
+        from app.services.history import (
+            CHARS_PER_TOKEN,
+            MIN_LATEST_TURN_TOKENS,
+            compact_history,
+            estimate_tokens,
+        )
+
+        requests = []
+
+        class RecordingBedrock:
+            def invoke_model(self, **kwargs):
+                requests.append(json.loads(kwargs["body"]))
+                body = {
+                    "content": [{"text": json.dumps({"latin": "Wakha"})}],
+                    "usage": {"input_tokens": 900, "output_tokens": 40},
+                }
+                return {"body": io.BytesIO(json.dumps(body).encode())}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", RecordingBedrock())
+        monkeypatch.setattr(settings, "AI_HISTORY_KEEP_TURNS", 4)
+        history = [
+            {"role": "user" if i % 2 else "assistant", "content": f"turn {i} " * 30}
+            for i in range(40)
+        ]
+
+        response = await client.post(
+            "/api/ai/open-conversation",
+            json={"message": "Bslama", "history": history},
+            headers=auth_headers,
+        )
+        data = response.json()
+        assert data["latin"] == "Wakha"
+        assert data["usage"]["input_tokens"] == 900
+        assert data["usage"]["output_tokens"] == 40
+
+        sent = requests[0]
+        assert [m["content"] for m in sent["messages"]] == [
+            t["content"] for t in history[-4:]
+        ] + ["Bslama"]
+        static, summary = sent["system"]
+        assert static["cache_control"] == {"type": "ephemeral"}
+        assert summary["text"].startswith("## Earlier in this conversation (")
+        assert "- Learner: turn 35" in summary["text"]
+
+        # The budget caps the history however long the conversation is
+        compacted = compact_history(history * 10, "Bslama", 4, token_budget=500)
+        sent_tokens = estimate_tokens(compacted.summary + "Bslama") + sum(
+            estimate_tokens(m["content"]) for m in compacted.messages
+        )
+        assert sent_tokens <= 500
+        assert compacted.summarized + compacted.omitted + 4 == 400
+
+        # A message filling the budget alone still leaves the latest turn
+        compacted = compact_history(history, "x" * 1500, 4, token_budget=500)
+        latest = compacted.messages[-1]["content"]
+        assert len(latest) >= MIN_LATEST_TURN_TOKENS * CHARS_PER_TOKEN - 1
+
+        # Oversized messages are rejected
+        response = await client.post(
+            "/api/ai/open-conversation",
+            json={"message": "x" * (settings.AI_MAX_MESSAGE_CHARS + 1)},
+            headers=auth_headers,
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("backend", ["sql", "memory"])
+    async def test_server_side_sessions(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch, backend
+    ):
+        """Sessions keep the history server-side; clients send only messages."""
+        import io
+        import json
+
+        from app.core.config import settings
+        from app.services.llm import get_llm_provider
+
+        monkeypatch.setattr(settings, "AI_SESSION_BACKEND", backend)
+        monkeypatch.setattr(settings, "AI_SESSION_MAX_TURNS", 4)
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_SIZE", 0)
+        monkeypatch.setattr(settings, "AI_RATE_LIMIT_PER_MINUTE", 0)
+        requests = []
+
+        class RecordingBedrock:
+            def invoke_model(self, **kwargs):
+                requests.append(json.loads(kwargs["body"]))
+                reply = {"latin": f"jawab {len(requests)}", "english": "answer"}
+                body = {"content": [{"text": json.dumps(reply)}]}
+                return {"body": io.BytesIO(json.dumps(body).encode())}
+
+            def invoke_model_with_response_stream(self, **kwargs):
+                requests.append(json.loads(kwargs["body"]))
+                text = json.dumps({"latin": "stream", "english": "answer"})
+                delta = {"type": "content_block_delta", "delta": {"text": text}}
+                chunk = {"chunk": {"bytes": json.dumps(delta).encode()}}
+                # A generator, since the provider closes the event stream
+                return {"body": (event for event in [chunk])}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", RecordingBedrock())
+        scenario = {"scenario_prompt": "Ordering tea at a cafe."}
+        response = await client.post(
+            "/api/ai/sessions",
+            json={
+                "scenario": scenario,
+                "history": [{"role": "assistant", "content": "Ahlan!"}],
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 201
+        session_id = response.json()["session_id"]
+        url = f"/api/ai/sessions/{session_id}"
+
+        for i in range(1, 4):
+            response = await client.post(
+                f"{url}/messages", json={"message": f"msg {i}"}, headers=auth_headers
+            )
+            data = response.json()
+            assert data["latin"] == f"jawab {i}" and data["turn_count"] == i
+
+        sent = requests[-1]
+        assert "Ordering tea at a cafe." in sent["system"][0]["text"]
+        assert [m["content"] for m in sent["messages"]] == [
+            "msg 1",
+            "jawab 1 (answer)",
+            "msg 2",
+            "jawab 2 (answer)",
+            "msg 3",
+        ]
+
+        response = await client.post(
+            f"{url}/messages/stream", json={"message": "msg 4"}, headers=auth_headers
+        )
+        done = json.loads(response.text.strip().split("\n")[-1][len("data: ") :])
+        assert done["latin"] == "stream" and done["turn_count"] == 4
+
+        # Only the newest turns are kept, but every turn is counted
+        data = (await client.get(url, headers=auth_headers)).json()
+        assert data["turn_count"] == 4
+        assert [t["content"] for t in data["history"]] == [
+            "msg 3",
+            "jawab 3 (answer)",
+            "msg 4",
+            "stream (answer)",
+        ]
+
+        # Of two overlapping messages only one is recorded, the other gets 409
+        import asyncio
+        import threading
+
+        both_in_flight = threading.Barrier(2, timeout=5)
+
+        class OverlappingBedrock(RecordingBedrock):
+            def invoke_model(self, **kwargs):
+                both_in_flight.wait()
+                return super().invoke_model(**kwargs)
+
+        monkeypatch.setattr(get_llm_provider(), "_client", OverlappingBedrock())
+        responses = await asyncio.gather(
+            *(
+                client.post(f"{url}/messages", json={"message": m}, headers=auth_headers)
+                for m in ("msg 5", "msg 5 again")
+            )
+        )
+        assert sorted(r.status_code for r in responses) == [200, 409]
+        assert (await client.get(url, headers=auth_headers)).json()["turn_count"] == 5
+
+        # Sessions are private to their owner
+        response = await client.post(
+            "/api/auth/register",
+            json={
+                "email": "other@example.com",
+                "password": "securepass123",
+                "display_name": "Other",
+            },
+        )
+        other = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        assert (await client.get(url, headers=other)).status_code == 404
+
+        response = await client.delete(url, headers=auth_headers)
+        assert response.status_code == 204
+        assert (await client.get(url, headers=auth_headers)).status_code == 404
+
+    async def test_admission_control(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Identical turns share a call, excess calls queue, throttling retries."""
+        import asyncio
+        import io
+        import json
+        import time
+
+        from botocore.exceptions import ClientError
+        from sqlalchemy import update
+
+        from app.core.config import settings
+        from app.models.user import User
+        from app.services.llm import get_llm_provider
+        from tests.conftest import TestSessionLocal
+
+        monkeypatch.setattr(settings, "BEDROCK_MAX_CONCURRENCY", 2)
+        monkeypatch.setattr(settings, "AI_RETRY_BASE_DELAY_SECONDS", 0.01)
+        monkeypatch.setattr(settings, "AI_RATE_LIMIT_PER_MINUTE", 6)
+        monkeypatch.setattr(settings, "AI_RATE_LIMIT_BURST", 10)
+        calls = []
+
+        class SlowBedrock:
+            def invoke_model(self, **kwargs):
+                message = json.loads(kwargs["body"])["messages"][-1]["content"]
+                calls.append(message)
+                if message == "throttle" and calls.count(message) == 1:
+                    error = {"Error": {"Code": "ThrottlingException", "Message": ""}}
+                    raise ClientError(error, "InvokeModel")
+                time.sleep(0.1)
+                body = {"content": [{"text": json.dumps({"latin": message})}]}
+                return {"body": io.BytesIO(json.dumps(body).encode())}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", SlowBedrock())
+
+        async def converse(message: str) -> dict:
+            response = await client.post(
+                "/api/ai/open-conversation",
+                json={"message": message},
+                headers=auth_headers,
+            )
+            assert response.status_code == 200
+            return response.json()
+
+        messages = ["same"] * 5 + ["a", "b", "c", "throttle"]
+        replies = await asyncio.gather(*(converse(m) for m in messages))
+        assert [r["latin"] for r in replies] == messages
+        assert sum(r["usage"] is not None for r in replies[:5]) == 1
+        assert calls.count("same") == 1 and calls.count("throttle") == 2
+
+        # A teacher can read the metrics
+        async with TestSessionLocal() as db:
+            await db.execute(update(User).values(role="teacher"))
+            await db.commit()
+        metrics = (await client.get("/api/ai/metrics", headers=auth_headers)).json()
+        assert metrics["coalescing"]["coalesced"] == 4
+        assert metrics["retries"] == 1
+        admission = metrics["admission"]
+        assert admission["limit"] == 2 and admission["queue_depth"] == 0
+        assert admission["admitted"] == 6 and admission["wait_seconds_max"] > 0
+
+        # The 9 turns that missed the cache used 9 of the 10 tokens
+        response = await client.post(
+            "/api/ai/open-conversation", json={"message": "x"}, headers=auth_headers
+        )
+        assert response.status_code == 200
+        response = await client.post(
+            "/api/ai/open-conversation", json={"message": "y"}, headers=auth_headers
+        )
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+    async def test_rate_limit_skips_cached_turns(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Only turns that reach the model are charged to the rate limit."""
+        import io
+        import json
+
+        from app.core.config import settings
+        from app.services.llm import get_llm_provider
+
+        monkeypatch.setattr(settings, "AI_RATE_LIMIT_PER_MINUTE", 1)
+        monkeypatch.setattr(settings, "AI_RATE_LIMIT_BURST", 1)
+        calls = []
+
+        class FakeBedrock:
+            def invoke_model(self, **kwargs):
+                message = json.loads(kwargs["body"])["messages"][-1]["content"]
+                calls.append(message)
+                body = {"content": [{"text": json.dumps({"latin": message})}]}
+                return {"body": io.BytesIO(json.dumps(body).encode())}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", FakeBedrock())
+
+        async def turn(message: str, path: str = "/api/ai/open-conversation"):
+            return await client.post(
+                path, json={"message": message}, headers=auth_headers
+            )
+
+        assert (await turn("salam limiter")).status_code == 200
+        for path in ("/api/ai/open-conversation", "/api/ai/open-conversation/stream"):
+            response = await turn("salam limiter", path)
+            assert response.status_code == 200
+        assert calls == ["salam limiter"]
+
+        response = await turn("labas limiter")
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+    async def test_local_llm_provider(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """The offline provider answers deterministically, streamed or not."""
+        import json
+
+        from app.core.config import settings
+        from app.services.llm import get_llm_provider
+
+        monkeypatch.setattr(settings, "LLM_PROVIDER", "local")
+        monkeypatch.setattr(settings, "LLM_LOCAL_LATENCY_MS", 20)
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_SIZE", 0)
+
+        async def converse(path: str):
+            return await client.post(
+                f"/api/ai/{path}",
+                json={"message": "Salam, labas?", "scenario": {"context": "Cafe"}},
+                headers=auth_headers,
+            )
+
+        first = (await converse("conversation")).json()
+        second = (await converse("conversation")).json()
+        assert first["error"] is None and first["latin"]
+        assert first == second
+        assert first["usage"]["input_tokens"] > 0
+        assert get_llm_provider().calls == 2
+
+        response = await converse("conversation/stream")
+        blocks = response.text.strip().split("\n\n")
+        assert [b.split("\n")[0] for b in blocks] == [
+            "event: field",
+            "event: field",
+            "event: field",
+            "event: done",
+        ]
+        done = json.loads(blocks[-1].split("\n")[1][len("data: ") :])
+        assert done["latin"] == first["latin"]
+
+    async def test_reply_parsing(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Replies are cut out of surrounding prose, validated and counted."""
+        import io
+        import json
+
+        from sqlalchemy import update
+
+        from app.core.config import settings
+        from app.models.user import User
+        from app.services.llm import get_llm_provider
+        from tests.conftest import TestSessionLocal
+
+        reply = {"arabic": "واخا", "latin": "Wakha", "english": "Okay"}
+        texts = [
+            # Fenced, with prose before and after (and a stray brace)
+            "Here you go {sic}:\n```json\n" + json.dumps(reply) + "\n```\nEnjoy!",
+            json.dumps({**reply, "suggestions": "3afak"}),
+            json.dumps({"correction": None}),
+            "Smeh liya, ma fhemtch.",
+        ]
+
+        class ScriptedBedrock:
+            def invoke_model(self, **kwargs):
+                body = json.dumps({"content": [{"text": texts.pop(0)}]}).encode()
+                return {"body": io.BytesIO(body)}
+
+        monkeypatch.setattr(get_llm_provider(), "_client", ScriptedBedrock())
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_SIZE", 0)
+
+        results = []
+        for _ in range(4):
+            response = await client.post(
+                "/api/ai/conversation", json={"message": "Salam"}, headers=auth_headers
+            )
+            results.append(response.json())
+        assert results[0]["latin"] == "Wakha" and results[0]["error"] is None
+        assert results[0]["suggestions"] == []
+        assert "suggestions" in results[1]["error"]
+        assert results[2]["error"] == "Failed to parse AI response: " + (
+            "The AI response has no text"
+        )
+        assert results[3]["latin"] == "Smeh liya, ma fhemtch."
+        assert results[3]["error"].startswith("Failed to parse")
+        # Only successful replies report usage
+        assert results[0]["usage"] is not None
+        assert all(r["usage"] is None for r in results[1:])
+
+        async with TestSessionLocal() as db:
+            await db.execute(update(User).values(role="teacher"))
+            await db.commit()
+        metrics = (await client.get("/api/ai/metrics", headers=auth_headers)).json()
+        assert metrics["reply_parsing"] == [
+            {
+                "model": settings.BEDROCK_MODEL_ID,
+                "prompt_version": "scenario-1",
+                "parsed": 1,
+                "failed": 3,
+                "failures": {"invalid_schema": 1, "empty": 1, "no_json": 1},
+            }
+        ]
+
+    async def test_conversation_tree(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch, tmp_path
+    ):
+        """Clicked suggestions are answered from the pre-generated tree."""
+        import json
+
+        from app.cli import build_conversation_trees
+        from app.core.config import settings
+        from app.services import conversation_tree
+        from app.services.adaptive import CONVERSATION_SCENARIOS
+        from app.services.conversation_sessions import assistant_content
+        from app.services.llm import get_llm_provider
+
+        monkeypatch.setattr(settings, "LLM_PROVIDER", "local")
+        monkeypatch.setattr(settings, "LLM_LOCAL_LATENCY_MS", 0)
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_SIZE", 0)
+
+        # Three a2 scenarios (the default level), two suggestions per reply
+        path = str(tmp_path / "trees.json")
+        assert await build_conversation_trees(path, ["a2"], depth=2) == 3 * (2 + 4)
+        assert get_llm_provider().calls == 18
+        assert conversation_tree.load(path) == 18
+
+        scenario = CONVERSATION_SCENARIOS["a2"][0]
+        payload = {
+            "scenario": {
+                name: scenario[name] for name in conversation_tree.SCENARIO_FIELDS
+            },
+            "history": [
+                {
+                    "role": "assistant",
+                    "content": assistant_content(scenario["initial_message"]),
+                }
+            ],
+        }
+        click = conversation_tree.suggestion_message(scenario["initial_suggestions"][0])
+
+        async def converse(message: str, history: list, path: str = "conversation"):
+            return await client.post(
+                f"/api/ai/{path}",
+                json={**payload, "message": message, "history": history},
+                headers=auth_headers,
+            )
+
+        first = (await converse(click, payload["history"])).json()
+        assert first["error"] is None and first["usage"] is None
+        history = payload["history"] + [
+            {"role": "user", "content": click},
+            {"role": "assistant", "content": assistant_content(first)},
+        ]
+        second_click = conversation_tree.suggestion_message(first["suggestions"][1])
+        assert (await converse(second_click, history)).json()["error"] is None
+        streamed = await converse(click, payload["history"], "conversation/stream")
+        done = streamed.text.strip().split("\n\n")[-1].split("\n")[1]
+        assert json.loads(done[len("data: ") :]) == first
+        assert get_llm_provider().calls == 18
+
+        # Free-form input and turns beyond the tree's depth call the model
+        await converse("Bghit nmchi l souk", payload["history"])
+        assert get_llm_provider().calls == 19
+        assert conversation_tree.stats()["hits"] == 3
+
+        # A tree built for another prompt version is ignored
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        artifact["prompt_version"] = "scenario-0"
+        conversation_tree.save(artifact, path)
+        conversation_tree.clear()
+        assert conversation_tree.load(path) == 0
@@ -3,6 +3,8 @@
 Fixtures (client, setup_database) are provided by conftest.py.
 """
 
+from uuid import UUID
+
 import pytest
 from httpx import AsyncClient
 
@@ -118,3 +120,126 @@ async def test_get_me_no_token(client: AsyncClient):
     """GET /me without a token should return 403."""
     resp = await client.get(ME_URL)
     assert resp.status_code in (401, 403)
+
+
+@pytest.mark.asyncio
+async def test_principal_follows_profile_updates(
+    client: AsyncClient, auth_headers: dict
+):
+    """Read-only endpoints see a level change, also once the cache expires."""
+    from app.core.security import _principal_cache
+
+    resp = await client.put(
+        ME_URL, json={"display_name": "Renamed"}, headers=auth_headers
+    )
+    assert resp.status_code == 200
+    assert resp.json()["tokens"] is None
+
+    resp = await client.put(ME_URL, json={"level": "b1"}, headers=auth_headers)
+    assert resp.status_code == 200
+    tokens = resp.json()["tokens"]
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    resp = await client.get("/api/games/session", headers=headers)
+    assert resp.json()["level"] == "b1"
+
+    # Without the cached principal the new token's own claims are trusted
+    _principal_cache.clear()
+    resp = await client.get("/api/games/session", headers=headers)
+    assert resp.json()["level"] == "b1"
+
+
+@pytest.mark.asyncio
+async def test_principal_is_cached_only_after_commit(
+    client: AsyncClient, auth_headers: dict
+):
+    """A profile change reaches the principal cache only once it commits."""
+    from app.core.security import _principal_cache, cache_user_on_commit
+    from app.models.user import User
+    from tests.conftest import TestSessionLocal
+
+    me = (await client.get(ME_URL, headers=auth_headers)).json()
+    user_id = UUID(me["id"])
+
+    for commit in (False, True):
+        async with TestSessionLocal() as db:
+            user = await db.get(User, user_id)
+            user.level = "b2"
+            await db.flush()
+            cache_user_on_commit(db, user)
+            assert _principal_cache.get(user_id) is None
+            if commit:
+                await db.commit()
+            else:
+                await db.rollback()
+                assert _principal_cache.get(user_id) is None
+
+    assert _principal_cache.get(user_id).level == "b2"
+
+
+@pytest.mark.asyncio
+async def test_revoked_tokens_are_rejected(client: AsyncClient, auth_headers: dict):
+    """A level change revokes older tokens; a deleted account cannot refresh."""
+    resp = await client.post(
+        LOGIN_URL, json={"email": "testuser@example.com", "password": "securepass123"}
+    )
+    refresh_token = resp.json()["refresh_token"]
+
+    resp = await client.put(ME_URL, json={"level": "b2"}, headers=auth_headers)
+    tokens = resp.json()["tokens"]
+
+    # The bumped version is cached for the claims-based dependency as well
+    assert (await client.get(ME_URL, headers=auth_headers)).status_code == 401
+    resp = await client.get("/api/games/session", headers=auth_headers)
+    assert resp.status_code == 401
+    resp = await client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert resp.status_code == 401
+
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert (await client.get(ME_URL, headers=headers)).status_code == 200
+    assert (await client.delete(ME_URL, headers=headers)).status_code == 200
+    assert (await client.get(ME_URL, headers=headers)).status_code == 401
+    resp = await client.post(
+        "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert resp.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_decoded_tokens_are_cached(client: AsyncClient, auth_headers: dict):
+    """Repeated requests with one token reuse the verified payload."""
+    from app.core.security import token_cache_stats
+
+    await client.get(ME_URL, headers=auth_headers)
+    hits = token_cache_stats()["hits"]
+    await client.get(ME_URL, headers=auth_headers)
+    assert token_cache_stats()["hits"] == hits + 1
+
+
+def test_hmac_verifier_matches_jose():
+    """The stdlib verifier accepts valid tokens and rejects bad ones."""
+    from datetime import datetime, timedelta, timezone
+
+    from jose import jwt
+
+    from app.core.config import settings
+    from app.core.security import (
+        InvalidToken,
+        TOKEN_VERIFIERS,
+        create_access_token,
+    )
+
+    token = create_access_token("abc", extra_claims={"level": "b1"})
+    payloads = [verify(token) for verify in TOKEN_VERIFIERS.values()]
+    assert payloads[0] == payloads[1]
+
+    expired = jwt.encode(
+        {"sub": "abc", "exp": datetime.now(timezone.utc) - timedelta(seconds=1)},
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    forged = jwt.encode({"sub": "abc"}, "other-secret", algorithm="HS256")
+    for bad in (expired, forged, token[:-2], "not-a-token"):
+        for verify in TOKEN_VERIFIERS.values():
+            with pytest.raises(InvalidToken):
+                verify(bad)
@@ -0,0 +1,248 @@
+"""Tests for game session generation and submission.
+
+Fixtures (client, auth_headers, setup_database) are provided by conftest.py.
+"""
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.services import session_pool
+from app.services.adaptive import (
+    _build_conjugation_fill_config,
+    _build_conjugation_quiz_config,
+    distractor_similarity,
+)
+from app.services.conjugation import ConjugationSet, ConjugationTable
+from app.services.distractors import DistractorPool
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+LOAD_URL = "/api/curriculum/load"
+SESSION_URL = "/api/games/session"
+
+
+def _module(word: str = "salam") -> dict:
+    """Build a small curriculum module with one lesson and game content."""
+    return {
+        "module_id": "greetings",
+        "level": "a2",
+        "title": "Greetings",
+        "lessons": [
+            {
+                "title": "Saying hello",
+                "order": 1,
+                "vocabulary": [
+                    {"arabic": "سلام", "romanized": "salam", "english": "hello"},
+                    {"arabic": "لاباس", "romanized": "labas", "english": "fine"},
+                    {"arabic": "شكرا", "romanized": "choukran", "english": "thanks"},
+                    {"arabic": "بسلامة", "romanized": "bslama", "english": "bye"},
+                ],
+                "conjugation": [
+                    {
+                        "verb": "kla",
+                        "verb_arabic": "كلا",
+                        "english": "to eat",
+                        "present": {"ana": "kanakol", "nta": "katakol", "huwa": "kayakol"},
+                        "past": {"ana": "klit", "nta": "kliti", "huwa": "kla"},
+                    }
+                ],
+            }
+        ],
+        "game_content": {
+            "word_match": [
+                {"darija_arabic": "سلام", "darija_latin": word, "english": "hello"}
+            ],
+            "fill_blanks": [],
+            "cultural_quiz": [],
+        },
+    }
+
+
+def _pairs(session: dict) -> list:
+    game = next(g for g in session["games"] if g["game_type"] == "word_match")
+    return game["config"].get("pairs", [])
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_session_uses_game_content(client: AsyncClient, auth_headers: dict):
+    """Before any lesson is completed, sessions fall back to level game content."""
+    await client.post(LOAD_URL, json=_module())
+
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["level"] == "a2"
+    assert [p["darija_latin"] for p in _pairs(data)] == ["salam"]
+
+
+@pytest.mark.asyncio
+async def test_session_reflects_curriculum_edits(
+    client: AsyncClient, auth_headers: dict
+):
+    """Reloading a module invalidates the compiled curriculum index."""
+    await client.post(LOAD_URL, json=_module("salam"))
+    await client.get(SESSION_URL, headers=auth_headers)
+
+    await client.post(LOAD_URL, json=_module("ahlan"))
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    assert [p["darija_latin"] for p in _pairs(resp.json())] == ["ahlan"]
+
+
+@pytest.mark.asyncio
+async def test_session_includes_completed_lesson_vocabulary(
+    client: AsyncClient, auth_headers: dict
+):
+    """Vocabulary from completed lessons is merged into word_match content."""
+    await client.post(LOAD_URL, json=_module())
+    lessons = (await client.get("/api/lessons/", headers=auth_headers)).json()
+    lesson = next(l for l in lessons["lessons"] if l["order"] == 1)
+
+    resp = await client.post(
+        f"/api/lessons/{lesson['id']}/complete",
+        json={"score": 1.0},
+        headers=auth_headers,
+    )
+    assert resp.status_code == 200
+
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    latin = {p["darija_latin"] for p in _pairs(resp.json())}
+    assert {"labas", "choukran", "bslama"} & latin
+
+
+@pytest.mark.asyncio
+async def test_session_targets_weaknesses(client: AsyncClient, auth_headers: dict):
+    """Skill areas with recorded errors get a targeted game in the session."""
+    await client.post(LOAD_URL, json=_module())
+    resp = await client.post(
+        "/api/games/fill_blank/submit",
+        json={"score": 0.0, "answers": [{"correct": False}, {"correct": False}]},
+        headers=auth_headers,
+    )
+    assert resp.status_code == 200
+
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    game_types = [g["game_type"] for g in resp.json()["games"]]
+    assert game_types[:3] == ["word_match", "conversation", "fill_blank"]
+
+
+@pytest.mark.asyncio
+async def test_submit_aggregates_weaknesses(client: AsyncClient, auth_headers: dict):
+    """Answers of repeated submissions accumulate in one row per skill area."""
+    answers = [{"correct": False}, {"correct": True}, {"correct": False}]
+    for _ in range(2):
+        resp = await client.post(
+            "/api/games/word_match/submit",
+            json={"score": 0.3, "answers": answers},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+
+    resp = await client.get("/api/progress/weaknesses", headers=auth_headers)
+    weaknesses = resp.json()
+    assert [(w["skill_area"], w["error_count"]) for w in weaknesses] == [
+        ("vocabulary", 4)
+    ]
+    assert weaknesses[0]["last_tested"] is not None
+
+
+@pytest.mark.asyncio
+async def test_submit_awards_badges_once(client: AsyncClient, auth_headers: dict):
+    """Met badge criteria are awarded together and never twice."""
+    payload = {"score": 1.0, "answers": []}
+    resp = await client.post(
+        "/api/games/word_match/submit", json=payload, headers=auth_headers
+    )
+    names = {b["name"] for b in resp.json()["badges_earned"]}
+    assert names == {"Game On", "Perfectionist"}
+
+    resp = await client.post(
+        "/api/games/word_match/submit", json=payload, headers=auth_headers
+    )
+    assert resp.json()["badges_earned"] == []
+
+
+@pytest.mark.asyncio
+async def test_session_pool_refills_and_invalidates(
+    client: AsyncClient, auth_headers: dict, monkeypatch
+):
+    """Pooled sessions are served first and dropped when weaknesses change."""
+    monkeypatch.setattr(settings, "SESSION_POOL_SIZE", 2)
+    await client.post(LOAD_URL, json=_module())
+
+    # Empty pool: generated synchronously, then refilled in the background
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    assert resp.status_code == 200
+    pool = next(iter(session_pool._pools.values()))
+    assert len(pool) == 2
+
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    assert resp.status_code == 200
+    assert len(pool) == 2  # popped one, topped back up
+
+    await client.post(
+        "/api/games/fill_blank/submit",
+        json={"score": 0.0, "answers": [{"correct": False}]},
+        headers=auth_headers,
+    )
+    assert not session_pool._pools and not session_pool._user_keys
+
+    resp = await client.get(SESSION_URL, headers=auth_headers)
+    game_types = [g["game_type"] for g in resp.json()["games"]]
+    assert "fill_blank" in game_types[:3]
+
+
+def test_conjugation_builders_use_compiled_tables():
+    """Conjugation questions always carry one correct and distinct options."""
+    verb = _module()["lessons"][0]["conjugation"][0]
+    conjugations = ConjugationSet([ConjugationTable([verb])])
+    assert len(conjugations) == 6
+
+    for config in (
+        _build_conjugation_quiz_config(conjugations, count=4),
+        _build_conjugation_fill_config(conjugations, count=3),
+    ):
+        for question in config["questions"]:
+            latin = [o["latin"] for o in question["options"]]
+            assert len(latin) == 4 and len(set(latin)) == 4
+            assert sum(o["correct"] for o in question["options"]) == 1
+
+
+def test_distractor_pool_sampling():
+    """Pools deduplicate answers, honour exclusions and prefer similar ones."""
+    pool = DistractorPool(["atay", "qahwa", "atay", "lma", "hlib", "aseer"])
+    assert len(pool) == 5
+
+    for _ in range(20):
+        picked = pool.sample(3, exclude=["atay"])
+        assert len(picked) == 3 and len(set(picked)) == 3
+        assert "atay" not in picked
+
+    # Only "aseer" shares the first letter of "atay"
+    similar = pool.sample(1, exclude=["atay"], similar_to="atay", similarity="initial")
+    assert similar == ["aseer"]
+
+    # Asking for more than the pool holds returns every answer once
+    assert sorted(pool.sample(10)) == sorted(set(pool.items))
+
+
+def test_similar_distractors_are_opt_in(monkeypatch):
+    """Levels keep random distractors unless SIMILAR_DISTRACTORS is set."""
+    assert [distractor_similarity(level) for level in ("a2", "b1", "b2")] == [
+        None,
+        None,
+        None,
+    ]
+    monkeypatch.setattr(settings, "SIMILAR_DISTRACTORS", True)
+    assert [distractor_similarity(level) for level in ("a2", "b1", "b2")] == [
+        None,
+        "length",
+        "initial",
+    ]
@@ -86,7 +86,13 @@ const useAuthStore = create((set, get) => ({
   updateProfile: async (data) => {
     try {
       const response = await authAPI.updateProfile(data);
-      const user = response.data;
+      const { tokens, ...user } = response.data;
+      // A level change reissues the tokens, which carry the level
+      if (tokens) {
+        localStorage.setItem('darijalingo_token', tokens.access_token);
+        localStorage.setItem('darijalingo_refresh_token', tokens.refresh_token);
+        set({ token: tokens.access_token });
+      }
       localStorage.setItem('darijalingo_user', JSON.stringify(user));
       set({ user });
       return user;
@@ -0,0 +1,9 @@
+-- Indexes used by GET /api/leaderboard/ (top-N per period and the current
+-- user's rank lookup).  Run this once against an existing database; new
+-- deployments get them automatically via SQLAlchemy's create_all().
+
+CREATE INDEX IF NOT EXISTS ix_leaderboard_entries_period_rank
+  ON leaderboard_entries (period, rank);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_entries_period_user
+  ON leaderboard_entries (period, user_id);
+CREATE INDEX IF NOT EXISTS ix_users_xp ON users (xp);
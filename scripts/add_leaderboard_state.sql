@@ -0,0 +1,21 @@
+-- Prepare an existing database for the leaderboard materializer
+-- (python -m app.cli materialize-leaderboard).  New deployments get the
+-- table and constraint automatically via SQLAlchemy's create_all().
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS leaderboard_state (
+  period VARCHAR(20) PRIMARY KEY,
+  window_start TIMESTAMPTZ,
+  watermark TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ
+);
+
+-- Entries are upserted per (period, user); the materializer rebuilds
+-- every period on its first run, so existing rows can be dropped.
+DELETE FROM leaderboard_entries;
+DROP INDEX IF EXISTS ix_leaderboard_entries_period_user;
+ALTER TABLE leaderboard_entries
+  ADD CONSTRAINT uq_leaderboard_entries_user UNIQUE (period, user_id);
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Store the XP awarded for each completed lesson, which the leaderboards
+-- sum (app.services.leaderboard.period_xp_query).  Run this once against
+-- an existing database; new deployments get the column via create_all().
+
+BEGIN;
+
+ALTER TABLE user_progress
+  ADD COLUMN IF NOT EXISTS xp_earned INTEGER NOT NULL DEFAULT 0;
+
+-- The streak and perfect-score bonuses of past lessons were not recorded;
+-- backfill the base XP they were ranked with until now.
+UPDATE user_progress
+  SET xp_earned = GREATEST(FLOOR(score * 50)::INTEGER, 1)
+  WHERE xp_earned = 0;
+
+-- Rebuild the materialized periods from the window start on the next run.
+DELETE FROM leaderboard_state;
+
+COMMIT;
@@ -0,0 +1,6 @@
+-- Add the token version used to revoke issued JWTs (see
+-- app.core.security.get_current_principal).  Run this once against an
+-- existing database; new deployments get the column via create_all().
+
+ALTER TABLE users
+  ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,33 @@
+-- Enforce one user_weaknesses row per (user_id, skill_area).
+-- Run this once against an existing database: duplicate rows (created by
+-- concurrent game submissions) are merged first, keeping the summed
+-- error_count and the latest last_tested.  New deployments get the
+-- constraint automatically via SQLAlchemy's create_all().
+
+BEGIN;
+
+WITH merged AS (
+  SELECT user_id, skill_area,
+         SUM(error_count) AS error_count,
+         MAX(last_tested) AS last_tested,
+         MIN(id::text)::uuid AS keep_id
+  FROM user_weaknesses
+  GROUP BY user_id, skill_area
+  HAVING COUNT(*) > 1
+)
+UPDATE user_weaknesses w
+SET error_count = m.error_count,
+    last_tested = m.last_tested
+FROM merged m
+WHERE w.id = m.keep_id;
+
+DELETE FROM user_weaknesses w
+USING user_weaknesses k
+WHERE w.user_id = k.user_id
+  AND w.skill_area = k.skill_area
+  AND w.id::text > k.id::text;
+
+ALTER TABLE user_weaknesses
+  ADD CONSTRAINT uq_user_weaknesses_skill UNIQUE (user_id, skill_area);
+
+COMMIT;
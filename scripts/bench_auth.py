@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark per-request JWT decoding overhead.
+
+Compares ``app.core.security.decode_token`` with an empty cache (every call
+verifies the signature) against the steady state where the same token is
+sent repeatedly, for each available verifier.
+
+Usage (from the project root):
+    python scripts/bench_auth.py [--iterations 20000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.core import security  # noqa: E402
+from app.core.config import settings  # noqa: E402
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = security.create_access_token(
+        "00000000-0000-0000-0000-000000000001",
+        extra_claims={"role": "student", "level": "a2", "tv": 0},
+    )
+    cache = security._token_cache
+
+    print(f"{'verifier':<10}{'uncached us/op':>16}{'cached us/op':>14}")
+    for name in security.TOKEN_VERIFIERS:
+        settings.JWT_VERIFIER = name
+
+        def cold():
+            cache.clear()
+            security.decode_token(token)
+
+        cache.clear()
+        uncached = _per_call_us(cold, args.iterations)
+        cached = _per_call_us(lambda: security.decode_token(token), args.iterations)
+        print(f"{name:<10}{uncached:>16.1f}{cached:>14.1f}")
+
+    print(f"cache stats: {security.token_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
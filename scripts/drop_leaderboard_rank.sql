@@ -0,0 +1,13 @@
+-- Leaderboard ranks are computed at read time from the (period, xp_total)
+-- index instead of being rewritten by every materializer run.  Run this
+-- once against an existing database; new deployments get the index via
+-- SQLAlchemy's create_all().
+
+BEGIN;
+
+DROP INDEX IF EXISTS ix_leaderboard_entries_period_rank;
+ALTER TABLE leaderboard_entries DROP COLUMN IF EXISTS rank;
+CREATE INDEX IF NOT EXISTS ix_leaderboard_entries_period_xp
+  ON leaderboard_entries (period, xp_total);
+
+COMMIT;
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Load test: concurrent learners talking to ``POST /api/ai/conversation``.
+
+``--users`` learners each play ``--turns`` turns of the same scripted
+scenario at once (a class starting an exercise together).  The first turn
+is the scenario's suggested reply, identical for everyone; later turns are
+unique.  Prints per-turn latency percentiles and throughput, plus the
+admission-control metrics of the worker.
+
+By default the app runs in-process on a temporary SQLite database with
+``LLM_PROVIDER=local`` (a deterministic stand-in answering after a
+log-normal latency), so runs are reproducible offline and cost no tokens.
+``--url`` targets a running deployment instead (whatever provider it uses).
+
+Usage (from the project root):
+    python scripts/load_test_conversation.py [--users 50] [--turns 3]
+        [--latency-ms 800] [--concurrency 8] [--no-cache]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+PASSWORD = "loadtest-pass-123"
+
+SCENARIO = {
+    "context": "You're ordering tea at a traditional Moroccan café.",
+    "scenario_prompt": "The student orders mint tea at a café in Fes.",
+    "target_vocabulary": ["atay (tea)", "3afak (please)", "chhal (how much)"],
+}
+OPENER = {"role": "assistant", "content": "Salam! Chnou bghiti tcherb? (What drink?)"}
+FIRST_MESSAGE = "Salam! Bghit wa7ed atay 3afak"
+
+
+def _percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    ms = sorted(s * 1000 for s in samples)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return (
+        f"n={len(ms):<5} p50={q[49]:7.1f} ms  p95={q[94]:7.1f} ms  "
+        f"p99={q[98]:7.1f} ms  max={ms[-1]:7.1f} ms"
+    )
+
+
+async def _run(client: httpx.AsyncClient, users: int, turns: int) -> None:
+    headers = []
+    for i in range(users):
+        email = f"convo{i}@example.com"
+        resp = await client.post(
+            "/api/auth/register",
+            json={"email": email, "password": PASSWORD, "display_name": email},
+        )
+        if resp.status_code != 201:
+            resp = await client.post(
+                "/api/auth/login", json={"email": email, "password": PASSWORD}
+            )
+        resp.raise_for_status()
+        headers.append({"Authorization": f"Bearer {resp.json()['access_token']}"})
+
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def learner(i: int) -> None:
+        history = [OPENER]
+        for turn in range(turns):
+            message = FIRST_MESSAGE if turn == 0 else f"Learner {i} says {turn}"
+            start = time.perf_counter()
+            resp = await client.post(
+                "/api/ai/conversation",
+                json={"message": message, "history": history, "scenario": SCENARIO},
+                headers=headers[i],
+            )
+            latencies.append(time.perf_counter() - start)
+            data = resp.json() if resp.status_code == 200 else {}
+            if resp.status_code != 200 or data.get("error"):
+                errors.append(data.get("error") or f"HTTP {resp.status_code}")
+            history = history + [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": f"{data.get('latin', '')}"},
+            ]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(learner(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+
+    total = users * turns
+    print(f"{users} learners x {turns} turns in {elapsed:.2f} s")
+    print(f"  throughput  {total / elapsed:.1f} turns/s, {len(errors)} errors")
+    print(f"  latency     {_percentiles(latencies)}")
+    if errors:
+        print(f"  first error {errors[0]}")
+
+
+async def _in_process(args) -> None:
+    db_path = Path(tempfile.mkdtemp()) / "load_test.db"
+    os.environ.update(
+        {
+            "DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+            "LLM_PROVIDER": "local",
+            "LLM_LOCAL_LATENCY_MS": str(args.latency_ms),
+            "LLM_LOCAL_LATENCY_SIGMA": str(args.sigma),
+            "LLM_LOCAL_ERROR_RATE": str(args.error_rate),
+            "BEDROCK_MAX_CONCURRENCY": str(args.concurrency),
+            "AI_RATE_LIMIT_PER_MINUTE": "0",
+            "BCRYPT_ROUNDS": "4",
+        }
+    )
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import app.models  # noqa: F401
+    from app.core.database import Base, engine
+    from app.main import application
+    from app.services import admission, response_cache
+    from app.services.llm import get_llm_provider
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test", timeout=120
+    ) as client:
+        await _run(client, args.users, args.turns)
+
+    metrics = admission.metrics()
+    gate = metrics["admission"]
+    print(
+        f"  model calls {get_llm_provider().calls} "
+        f"(coalesced {metrics['coalescing']['coalesced']}, "
+        f"cache hits {response_cache.stats()['hits']}, "
+        f"retries {metrics['retries']})"
+    )
+    print(
+        f"  queue wait  p50={gate['wait_seconds_p50'] * 1000:.1f} ms  "
+        f"p95={gate['wait_seconds_p95'] * 1000:.1f} ms  "
+        f"max={gate['wait_seconds_max'] * 1000:.1f} ms"
+    )
+
+
+async def _remote(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        await _run(client, args.users, args.turns)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--url", help="Target a running server instead")
+    local = parser.add_argument_group("in-process options (local provider)")
+    local.add_argument("--latency-ms", type=float, default=800)
+    local.add_argument("--sigma", type=float, default=0.4)
+    local.add_argument("--error-rate", type=float, default=0.0)
+    local.add_argument("--concurrency", type=int, default=8)
+    local.add_argument(
+        "--no-cache", action="store_true", help="Disable the response cache"
+    )
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(_remote(args))
+    else:
+        asyncio.run(_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
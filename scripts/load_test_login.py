@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Load test: a burst of logins vs. latency of other endpoints.
+
+Fires ``--logins`` concurrent ``POST /api/auth/login`` requests (a class
+logging in together) while probing ``GET /api/health`` every
+``--probe-interval`` seconds, then prints p50/p95/p99 latencies of both.
+
+By default the app runs in-process on a temporary SQLite database, so no
+server is needed; ``--url`` targets a running deployment instead (the test
+users are registered first).  ``--inline-bcrypt`` (in-process only) runs
+bcrypt on the event loop, as before hashing was moved to a thread pool,
+for comparison.
+
+Usage (from the project root):
+    python scripts/load_test_login.py [--logins 40] [--url http://localhost:8000]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+PASSWORD = "loadtest-pass-123"
+
+
+def _percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    ms = sorted(s * 1000 for s in samples)
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return (
+        f"n={len(ms):<5} p50={q[49]:7.1f} ms  p95={q[94]:7.1f} ms  "
+        f"p99={q[98]:7.1f} ms  max={ms[-1]:7.1f} ms"
+    )
+
+
+async def _run(client: httpx.AsyncClient, logins: int, interval: float) -> None:
+    emails = [f"loadtest{i}@example.com" for i in range(logins)]
+    for email in emails:
+        await client.post(
+            "/api/auth/register",
+            json={"email": email, "password": PASSWORD, "display_name": email},
+        )
+
+    probe_latencies: List[float] = []
+    login_latencies: List[float] = []
+    done = asyncio.Event()
+
+    async def probe():
+        # Latency is measured from when each probe was due, so a stalled
+        # event loop shows up instead of silently delaying the probes
+        due = time.perf_counter()
+        while not done.is_set():
+            await client.get("/api/health")
+            now = time.perf_counter()
+            probe_latencies.append(now - due)
+            due = max(due + interval, now)
+            await asyncio.sleep(max(0.0, due - now))
+
+    async def login(email: str):
+        start = time.perf_counter()
+        resp = await client.post(
+            "/api/auth/login", json={"email": email, "password": PASSWORD}
+        )
+        resp.raise_for_status()
+        login_latencies.append(time.perf_counter() - start)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(interval * 5)  # baseline samples before the burst
+    burst_start = time.perf_counter()
+    await asyncio.gather(*(login(email) for email in emails))
+    burst = time.perf_counter() - burst_start
+    done.set()
+    await prober
+
+    print(f"{logins} concurrent logins finished in {burst:.2f} s")
+    print(f"  login   {_percentiles(login_latencies)}")
+    print(f"  health  {_percentiles(probe_latencies)}")
+
+
+async def _in_process(args) -> None:
+    db_path = Path(tempfile.mkdtemp()) / "load_test.db"
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import app.models  # noqa: F401
+    from app.core import security
+    from app.core.database import Base, engine
+    from app.main import application
+
+    if args.inline_bcrypt:
+
+        async def inline(fn, *fn_args):
+            return fn(*fn_args)
+
+        security._run_bcrypt = inline
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        await _run(c, args.logins, args.probe_interval)
+
+
+async def _remote(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        await _run(client, args.logins, args.probe_interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--url", help="Target a running server instead")
+    parser.add_argument(
+        "--inline-bcrypt",
+        action="store_true",
+        help="Run bcrypt on the event loop (in-process only, for comparison)",
+    )
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(_remote(args))
+    else:
+        asyncio.run(_in_process(args))
+
+
+if __name__ == "__main__":
+    main()